@@ -6,6 +6,7 @@ Note that adding code to CommonServerUserPython can override functions in Common
 from __future__ import print_function
 
 import base64
+import io
 import json
 import logging
 import os
@@ -16,7 +17,7 @@ import time
 import traceback
 from random import randint
 import xml.etree.cElementTree as ET
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from abc import abstractmethod
 
@@ -48,6 +49,31 @@ _warnings_handler = WarningsHandler()
 # ignore warnings from logging as a result of not being setup
 logging.raiseExceptions = False
 
+
+class LazyModule(object):
+    """
+        A module which is imported on its first attribute access.
+        Used for heavy dependencies, so scripts which do not use them do not pay for importing them.
+
+        :type name: ``str``
+        :param name: The name of the module to import
+
+        :return: The lazy module
+        :rtype: ``LazyModule``
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if attr.startswith('__') or attr in ('_name', '_module'):
+            raise AttributeError(attr)
+        if self._module is None:
+            self._module = __import__(self._name)
+        return getattr(self._module, attr)
+
+
 # imports something that can be missed from docker image
 try:
     import requests
@@ -55,7 +81,8 @@ try:
     from urllib3.util import Retry
     from typing import Optional, Dict, List, Any, Union, Set
 
-    import dateparser
+    # dateparser takes hundreds of milliseconds to import, it is imported when first used
+    dateparser = LazyModule('dateparser')
     from datetime import timezone  # type: ignore
 except Exception:
     if sys.version_info[0] < 3:
@@ -63,6 +90,14 @@ except Exception:
         # for more info see https://cosmicpercolator.com/2016/01/13/exception-leaks-in-python-2-and-3/
         sys.exc_clear()
 
+# lxml's C parser is used for XML parsing when it is installed in the docker image
+try:
+    from lxml import etree as lxml_etree
+except Exception:
+    lxml_etree = None
+    if sys.version_info[0] < 3:
+        sys.exc_clear()
+
 CONTENT_RELEASE_VERSION = '0.0.0'
 CONTENT_BRANCH_NAME = 'master'
 IS_PY3 = sys.version_info[0] == 3
@@ -1053,6 +1088,7 @@ class IntegrationLogger(object):
       use LOG(<message>) to add a record to the logger (message can be any object with __str__)
       use LOG.print_log(verbose=True/False) to display all records in War-Room (if verbose) and server log.
       use add_replace_strs to add sensitive strings that should be replaced before going to the log.
+      only the last MAX_MESSAGES records are kept until the log is printed.
 
       :type message: ``str``
       :param message: The message to be logged
@@ -1061,20 +1097,31 @@ class IntegrationLogger(object):
       :rtype: ``None``
     """
 
+    MAX_MESSAGES = 10000
+
     def __init__(self, debug_logging=False):
-        self.messages = []  # type: list
+        self.messages = deque(maxlen=self.MAX_MESSAGES)  # type: deque
+        self.dropped_messages = 0
         self.write_buf = []  # type: list
-        self.replace_strs = []  # type: list
+        self._replace_strs = []  # type: list
+        # the sensitive params are added on the first use of replace_strs and not when the logger is created
+        self._params_scanned = False
         self.curl = []  # type: list
         self.buffering = True
         self.debug_logging = debug_logging
-        # if for some reason you don't want to auto add credentials.password to replace strings
-        # set the os env COMMON_SERVER_NO_AUTO_REPLACE_STRS. Either in CommonServerUserPython, or docker env
-        if (not os.getenv('COMMON_SERVER_NO_AUTO_REPLACE_STRS') and hasattr(demisto, 'getParam')):
-            # add common params
-            sensitive_params = ('key', 'private', 'password', 'secret', 'token', 'credentials')
-            if demisto.params():
-                self._iter_sensistive_dict_obj(demisto.params(), sensitive_params)
+
+    @property
+    def replace_strs(self):
+        if not self._params_scanned:
+            self._params_scanned = True
+            # if for some reason you don't want to auto add credentials.password to replace strings
+            # set the os env COMMON_SERVER_NO_AUTO_REPLACE_STRS. Either in CommonServerUserPython, or docker env
+            if (not os.getenv('COMMON_SERVER_NO_AUTO_REPLACE_STRS') and hasattr(demisto, 'getParam')):
+                # add common params
+                sensitive_params = ('key', 'private', 'password', 'secret', 'token', 'credentials')
+                if demisto.params():
+                    self._iter_sensistive_dict_obj(demisto.params(), sensitive_params)
+        return self._replace_strs
 
     def _iter_sensistive_dict_obj(self, dict_obj, sensitive_params):
         for (k, v) in dict_obj.items():
@@ -1103,10 +1150,15 @@ class IntegrationLogger(object):
             res = res.replace(s, '<XX_REPLACED>')
         return res
 
+    def _add_message(self, text):
+        if len(self.messages) == self.messages.maxlen:
+            self.dropped_messages += 1
+        self.messages.append(text)
+
     def __call__(self, message):
         text = self.encode(message)
         if self.buffering:
-            self.messages.append(text)
+            self._add_message(text)
             if self.debug_logging:
                 demisto.debug(text)
         else:
@@ -1136,14 +1188,18 @@ class IntegrationLogger(object):
 
     def print_log(self, verbose=False):
         if self.write_buf:
-            self.messages.append("".join(self.write_buf))
+            self._add_message("".join(self.write_buf))
         if self.messages:
-            text = 'Full Integration Log:\n' + '\n'.join(self.messages)
+            text = 'Full Integration Log:\n'
+            if self.dropped_messages:
+                text += '({} earlier records were dropped)\n'.format(self.dropped_messages)
+            text += '\n'.join(self.messages)
             if verbose:
                 demisto.log(text)
             if not self.debug_logging:  # we don't print out if in debug_logging as already all message where printed
                 demisto.info(text)
-            self.messages = []
+            self.messages.clear()
+            self.dropped_messages = 0
 
     def build_curl(self, text):
         """
@@ -1205,7 +1261,7 @@ class IntegrationLogger(object):
         if has_newline:
             text = "".join(self.write_buf)
             if self.buffering:
-                self.messages.append(text)
+                self._add_message(text)
             else:
                 demisto.info(text)
                 if is_debug_mode() and text.startswith('send:'):
@@ -1480,7 +1536,30 @@ def create_clickable_url(url):
     return '[{}]({})'.format(url, url)
 
 
-def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None, url_keys=None):
+def _md_table_cell(value, max_cell_length=None):
+    """
+       Formats and escapes a single markdown table cell, skipping the work for the common plain values
+    """
+    if value is None:
+        return ''
+    if isinstance(value, STRING_TYPES):
+        cell = value
+    elif type(value) is int:
+        # numbers and booleans need no formatting nor escaping
+        return str(value)
+    elif type(value) is bool:
+        return 'true' if value else 'false'
+    else:
+        cell = formatCell(value, False)
+    if max_cell_length and len(cell) > max_cell_length:
+        cell = cell[:max_cell_length] + '...'
+    if '|' in cell or '\n' in cell or '\r' in cell:
+        cell = stringEscapeMD(cell, True, True)
+    return cell
+
+
+def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None, url_keys=None,
+                    max_rows=None, max_cell_length=None):
     """
        Converts a demisto table in JSON form to a Markdown table
 
@@ -1506,26 +1585,40 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
        :type url_keys: ``list``
        :param url_keys: a list of keys in the given JSON table that should be turned in to clickable
 
+       :type max_rows: ``int``
+       :param max_rows: The maximum number of rows to render. The rest are summarized in a "N more rows" footer.
+            Default is to render all the rows.
+
+       :type max_cell_length: ``int``
+       :param max_cell_length: The maximum length of a cell, longer cells are truncated. Default is no limit.
+
        :return: A string representation of the markdown table
        :rtype: ``str``
     """
+    if not t or len(t) == 0:
+        t = []
+    elif not isinstance(t, list):
+        t = [t]
+
+    hidden_rows = 0
+    if max_rows is not None and len(t) > max_rows:
+        hidden_rows = len(t) - max_rows
+        t = t[:max_rows]
+
     # Turning the urls in the table to clickable
-    if url_keys:
+    if url_keys and t:
         t = url_to_clickable_markdown(t, url_keys)
 
-    mdResult = ''
+    md_lines = []
     if name:
-        mdResult = '### ' + name + '\n'
+        md_lines.append('### ' + name + '\n')
 
     if metadata:
-        mdResult += metadata + '\n'
+        md_lines.append(metadata + '\n')
 
-    if not t or len(t) == 0:
-        mdResult += '**No entries.**\n'
-        return mdResult
-
-    if not isinstance(t, list):
-        t = [t]
+    if not t:
+        md_lines.append('**No entries.**\n')
+        return ''.join(md_lines)
 
     if headers and isinstance(headers, STRING_TYPES):
         headers = [headers]
@@ -1535,7 +1628,7 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
         # should be only one header
         if headers and len(headers) > 0:
             header = headers[0]
-            t = map(lambda item: dict((h, item) for h in [header]), t)
+            t = [{header: item} for item in t]
         else:
             raise Exception("Missing headers param for tableToMarkdown. Example: headers=['Some Header']")
 
@@ -1545,41 +1638,38 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
         headers.sort()
 
     if removeNull:
-        headers_aux = headers[:]
-        for header in headers_aux:
-            if all(obj.get(header) in ('', None, [], {}) for obj in t):
-                headers.remove(header)
-
-    if t and len(headers) > 0:
-        newHeaders = []
+        # a single pass over the rows, until a value was found for every header
+        empty_headers = set(headers)
+        for obj in t:
+            if not empty_headers:
+                break
+            empty_headers.difference_update([h for h in empty_headers if obj.get(h) not in ('', None, [], {})])
+        headers = [h for h in headers if h not in empty_headers]
+
+    if len(headers) > 0:
         if headerTransform is None:  # noqa
             def headerTransform(s): return stringEscapeMD(s, True, True)  # noqa
-        for header in headers:
-            newHeaders.append(headerTransform(header))
-        mdResult += '|'
-        if len(newHeaders) == 1:
-            mdResult += newHeaders[0]
-        else:
-            mdResult += '|'.join(newHeaders)
-        mdResult += '|\n'
-        sep = '---'
-        mdResult += '|' + '|'.join([sep] * len(headers)) + '|\n'
+        md_lines.append('|' + '|'.join([headerTransform(header) for header in headers]) + '|\n')
+        md_lines.append('|' + '|'.join(['---'] * len(headers)) + '|\n')
         for entry in t:
-            vals = [stringEscapeMD((formatCell(entry.get(h, ''), False) if entry.get(h) is not None else ''),
-                                   True, True) for h in headers]
+            vals = [_md_table_cell(entry.get(h), max_cell_length) for h in headers]
             # this pipe is optional
-            mdResult += '| '
             try:
-                mdResult += ' | '.join(vals)
+                md_lines.append('| ' + ' | '.join(vals) + ' |\n')
             except UnicodeDecodeError:
                 vals = [str(v) for v in vals]
-                mdResult += ' | '.join(vals)
-            mdResult += ' |\n'
+                md_lines.append('| ' + ' | '.join(vals) + ' |\n')
+        if hidden_rows:
+            md_lines.append('\n**{} more rows.**\n'.format(hidden_rows))
 
     else:
-        mdResult += '**No entries.**\n'
+        md_lines.append('**No entries.**\n')
 
-    return mdResult
+    try:
+        return ''.join(md_lines)
+    except UnicodeDecodeError:
+        # python 2 - unicode rows mixed with a non ascii byte string name or metadata
+        return ''.join([line if isinstance(line, str) else line.encode('utf-8') for line in md_lines])
 
 
 tblToMd = tableToMarkdown
@@ -1865,6 +1955,9 @@ def elem_to_internal(elem, strip_ns=1, strip=1):
 
     # loop over subelements to merge them
     for subelem in elem:
+        if callable(subelem.tag):
+            # an unresolved entity reference left by lxml is not an element
+            continue
         v = elem_to_internal(subelem, strip_ns=strip_ns, strip=strip)
 
         tag = subelem.tag
@@ -1993,6 +2086,100 @@ def json2xml(json_data, factory=ET.Element):
     return ET.tostring(elem, encoding='utf-8')
 
 
+def _xml_fromstring(xmlstring):
+    """Parse an XML string into an Element, with lxml when it is installed."""
+    encoding = None
+    if not isinstance(xmlstring, bytes):
+        # text is parsed as utf-8 bytes, since lxml does not accept text with an encoding declaration
+        xmlstring = xmlstring.encode('utf-8')
+        encoding = 'utf-8'
+
+    if lxml_etree is None:
+        parser = ET.XMLParser(encoding=encoding)
+        parser.feed(xmlstring)
+        return parser.close()
+    # external entities and DTDs are not resolved, same as the built-in parser
+    return lxml_etree.fromstring(xmlstring, lxml_etree.XMLParser(encoding=encoding, remove_comments=True,
+                                                                 remove_pis=True, resolve_entities=False,
+                                                                 no_network=True))
+
+
+def xml2dict(xmlstring, strip_ns=1, strip=1):
+    """
+       Convert an XML string into a dictionary, without serializing it to a JSON string in between.
+       Uses the lxml parser when it is installed.
+
+       :type xmlstring: ``str``
+       :param xmlstring: The string to be converted (required)
+
+       :type strip_ns: ``int``
+       :param strip_ns: Whether to strip the namespaces from the tags
+
+       :type strip: ``int``
+       :param strip: Whether to strip the leading and trailing whitespace of the texts
+
+       :return: The converted dictionary, same as ``json.loads(xml2json(xmlstring))``
+       :rtype: ``dict``
+    """
+    return elem_to_internal(_xml_fromstring(xmlstring), strip_ns=strip_ns, strip=strip)
+
+
+def xml2dict_iter(source, tag, strip_ns=1, strip=1):
+    """
+       Convert the repeating elements of an XML document (e.g. log entries) into dictionaries one by one,
+       without building the whole tree. Every element is released once it is converted.
+       Uses the lxml parser when it is installed.
+
+       :type source: ``str`` or file object
+       :param source: The XML string or a file object opened in binary mode (required)
+
+       :type tag: ``str``
+       :param tag: The tag of the repeating elements, without a namespace (required)
+
+       :type strip_ns: ``int``
+       :param strip_ns: Whether to strip the namespaces from the tags
+
+       :type strip: ``int``
+       :param strip: Whether to strip the leading and trailing whitespace of the texts
+
+       :return: A generator of the converted elements, each as its value in ``xml2dict``.
+                Elements nested in an element of the same tag are part of the outer element.
+       :rtype: ``generator``
+    """
+    encoding = None
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif not hasattr(source, 'read'):
+        source = io.BytesIO(source.encode('utf-8'))
+        encoding = 'utf-8'
+
+    if lxml_etree is not None:
+        context = lxml_etree.iterparse(source, events=('start', 'end'), encoding=encoding, remove_comments=True,
+                                       remove_pis=True, resolve_entities=False, no_network=True)
+    elif IS_PY3:
+        context = ET.iterparse(source, events=('start', 'end'), parser=ET.XMLParser(encoding=encoding))
+    else:
+        # the python 2 iterparse does not accept a parser
+        context = ET.iterparse(source, events=('start', 'end'))
+
+    depth = 0
+    for event, elem in context:
+        if strip_tag(elem.tag) != tag:
+            continue
+        if event == 'start':
+            depth += 1
+            continue
+
+        depth -= 1
+        if depth == 0:
+            yield elem_to_internal(elem, strip_ns=strip_ns, strip=strip).popitem()[1]
+            elem.clear()
+            if lxml_etree is not None:
+                # lxml keeps the cleared elements in their parent, so the converted ones are removed from it
+                while elem.getprevious() is not None:
+                    del elem.getparent()[0]
+
+
 def get_hash_type(hash_file):
     """
        Checks the type of the given hash. Returns 'md5', 'sha1', 'sha256' or 'Unknown'.
@@ -4165,13 +4352,22 @@ class CommandResults:
     :type ignore_auto_extract: ``bool``
     :param ignore_auto_extract: must be a boolean, default value is False. Used to prevent AutoExtract on output.
 
+    :type table_max_rows: ``int``
+    :param table_max_rows: (Optional) The maximum number of rows in the table generated from the outputs when
+        readable_output is not set. The rest are summarized in a "N more rows" footer. Default is no limit.
+
+    :type table_max_cell_length: ``int``
+    :param table_max_cell_length: (Optional) The maximum length of a cell in the table generated from the outputs
+        when readable_output is not set. Longer cells are truncated. Default is no limit.
+
     :return: None
     :rtype: ``None``
     """
 
     def __init__(self, outputs_prefix=None, outputs_key_field=None, outputs=None, indicators=None, readable_output=None,
-                 raw_response=None, indicators_timeline=None, indicator=None, ignore_auto_extract=False):
-        # type: (str, object, object, list, str, object, IndicatorsTimeline, Common.Indicator, bool) -> None
+                 raw_response=None, indicators_timeline=None, indicator=None, ignore_auto_extract=False,
+                 table_max_rows=None, table_max_cell_length=None):
+        # type: (str, object, object, list, str, object, IndicatorsTimeline, Common.Indicator, bool, int, int) -> None
         if raw_response is None:
             raw_response = outputs
 
@@ -4201,17 +4397,17 @@ class CommandResults:
         self.readable_output = readable_output
         self.indicators_timeline = indicators_timeline
         self.ignore_auto_extract = ignore_auto_extract
+        self.table_max_rows = table_max_rows
+        self.table_max_cell_length = table_max_cell_length
 
-    def to_context(self):
-        outputs = {}  # type: dict
-        if self.readable_output:
-            human_readable = self.readable_output
-        else:
-            human_readable = None  # type: ignore[assignment]
-        raw_response = None  # type: ignore[assignment]
-        indicators_timeline = []  # type: ignore[assignment]
-        ignore_auto_extract = False  # type: bool
+    def indicators_to_context(self):
+        """
+        Returns the context of the indicators and their DBotScore, built in a single pass over the indicators.
 
+        :return: The context keys of the indicators, each with the list of the indicators values
+        :rtype: ``dict``
+        """
+        outputs = {}  # type: dict
         indicators = [self.indicator] if self.indicator else self.indicators
 
         if indicators:
@@ -4224,6 +4420,37 @@ class CommandResults:
 
                     outputs[key].append(value)
 
+        return outputs
+
+    def keeps_indicators_context(self):
+        """
+        Whether the entry context keeps the indicators context, which outputs without a prefix replace.
+
+        :return: True if the indicators context is part of the entry context
+        :rtype: ``bool``
+        """
+        return self.outputs is None or self.outputs == [] or bool(self.outputs_prefix)
+
+    def to_context(self, indicators_context=None):
+        """
+        Returns the war room entry of the results.
+
+        :type indicators_context: ``dict``
+        :param indicators_context: (Optional) The context of the indicators, if it was already built by
+            ``indicators_to_context``.
+
+        :return: The entry
+        :rtype: ``dict``
+        """
+        outputs = self.indicators_to_context() if indicators_context is None else indicators_context
+        if self.readable_output:
+            human_readable = self.readable_output
+        else:
+            human_readable = None  # type: ignore[assignment]
+        raw_response = None  # type: ignore[assignment]
+        indicators_timeline = []  # type: ignore[assignment]
+        ignore_auto_extract = False  # type: bool
+
         if self.raw_response:
             raw_response = self.raw_response
 
@@ -4236,7 +4463,8 @@ class CommandResults:
         if self.outputs is not None and self.outputs != []:
             if not self.readable_output:
                 # if markdown is not provided then create table by default
-                human_readable = tableToMarkdown('Results', self.outputs)
+                human_readable = tableToMarkdown('Results', self.outputs, max_rows=self.table_max_rows,
+                                                 max_cell_length=self.table_max_cell_length)
             if self.outputs_prefix and self._outputs_key_field:
                 # if both prefix and key field provided then create DT key
                 formatted_outputs_key = ' && '.join(['val.{0} == obj.{0}'.format(key_field)
@@ -4266,6 +4494,43 @@ class CommandResults:
         return return_entry
 
 
+def merge_indicators_context(results):
+    """
+    Converts a list of CommandResults to entries, in order. The indicators and DBotScore context of all the
+    results is merged in a single pass into the entry of the first result with indicators, so the server
+    merges it into the context once instead of once per result.
+    If converting a result fails, the entries before it are yielded and the error is raised.
+    The entries must not be sent before all of them are converted, as the merged context is added to them.
+
+    :type results: ``list``
+    :param results: The CommandResults to convert
+
+    :return: The entries of the results
+    :rtype: ``Iterator[dict]``
+    """
+    merged_context = None  # type: Optional[dict]
+    for result in results:
+        indicators_context = result.indicators_to_context()
+        if merged_context is None or not result.keeps_indicators_context():
+            entry = result.to_context(indicators_context)
+            if indicators_context and result.keeps_indicators_context():
+                merged_context = entry['EntryContext']
+            yield entry
+            continue
+
+        entry = result.to_context({})
+        for key, values in indicators_context.items():
+            if key in entry['EntryContext']:
+                # the outputs replace the indicators context, as in to_context
+                continue
+            if isinstance(merged_context.get(key, []), list):
+                merged_context.setdefault(key, []).extend(values)
+            else:
+                # the key is used by the outputs of the first entry, keep the values in their own entry
+                entry['EntryContext'][key] = values
+        yield entry
+
+
 def return_results(results):
     """
     This function wraps the demisto.results(), supports.
@@ -4282,8 +4547,25 @@ def return_results(results):
         return
 
     if results and isinstance(results, list) and len(results) > 0 and isinstance(results[0], CommandResults):
-        for result in results:
-            demisto.results(result.to_context())
+        # use `hasattr(demisto, 'startResultsBatch')` to ensure compatibility with engines that do not batch results
+        if not hasattr(demisto, 'startResultsBatch'):
+            for result in results:
+                demisto.results(result.to_context())
+            return
+
+        # all the results are converted before the first entry is sent, as the merged context is added to it
+        entries = []  # type: List[dict]
+        try:
+            for entry in merge_indicators_context(results):
+                entries.append(entry)
+        finally:
+            # each result is still a separate entry, the engine sends the entries of the batch in a single message
+            demisto.startResultsBatch()
+            try:
+                for entry in entries:
+                    demisto.results(entry)
+            finally:
+                demisto.flushResults()
         return
 
     if isinstance(results, CommandResults):
@@ -4932,20 +5214,29 @@ class DebugLogger(object):
         self.root_logger.addHandler(self.handler)
 
     def __del__(self):
+        self.stop()
+
+    def stop(self):
+        """
+        Restores the logging and http client state changed by the logger. Does nothing when already stopped.
+        """
         if self.handler:
             self.root_logger.setLevel(self.prev_log_level)
             self.root_logger.removeHandler(self.handler)
             self.handler.flush()
             self.handler.close()
+            self.handler = None
         if self.org_handlers:
             for h in self.org_handlers:
                 self.root_logger.addHandler(h)
+            self.org_handlers = None
         if self.http_client:
             self.http_client.HTTPConnection.debuglevel = 0
             if self.http_client_print:
                 setattr(self.http_client, 'print', self.http_client_print)
             else:
                 delattr(self.http_client, 'print')
+            self.http_client = None
             if self.int_logger.curl:
                 for curl in self.int_logger.curl:
                     demisto.info('cURL:\n' + curl)
@@ -4966,15 +5257,26 @@ class DebugLogger(object):
         self.int_logger.write(msg)
 
 
-_requests_logger = None
-try:
-    if is_debug_mode():
-        _requests_logger = DebugLogger()
-        _requests_logger.log_start_debug()
-except Exception as ex:
-    # Should fail silently so that if there is a problem with the logger it will
-    # not affect the execution of commands and playbooks
-    demisto.info('Failed initializing DebugLogger: {}'.format(ex))
+def _start_debug_logger():
+    """
+        Starts the requests debug logger when running in debug mode.
+
+        :return: The started logger, or None when not in debug mode
+        :rtype: ``DebugLogger``
+    """
+    try:
+        if is_debug_mode():
+            debug_logger = DebugLogger()
+            debug_logger.log_start_debug()
+            return debug_logger
+    except Exception as ex:
+        # Should fail silently so that if there is a problem with the logger it will
+        # not affect the execution of commands and playbooks
+        demisto.info('Failed initializing DebugLogger: {}'.format(ex))
+    return None
+
+
+_requests_logger = _start_debug_logger()
 
 
 def parse_date_string(date_string, date_format='%Y-%m-%dT%H:%M:%S'):
@@ -5493,6 +5795,69 @@ def batch(iterable, batch_size=1):
         not_batched = not_batched[batch_size:]
 
 
+def collect_concurrently(func, args_list, limit, max_workers=4, sort_key=None, reverse=False):
+    """Runs a function returning a list on each of the arguments in a bounded thread pool, and collects the lists in
+    the order of the arguments. Once limit items were collected, the arguments that were not started are skipped.
+    Only the function runs in the pool threads, so it should not call demisto functions.
+
+    :type func: ``Callable``
+    :param func: The function to run, gets a single argument and returns a list of items.
+
+    :type args_list: ``list``
+    :param args_list: The arguments, each passed to a single call of func.
+
+    :type limit: ``int``
+    :param limit: The maximum number of items to return.
+
+    :type max_workers: ``int``
+    :param max_workers: The maximum number of threads to run func in.
+
+    :type sort_key: ``Callable``
+    :param sort_key: (Optional) A function returning the value to sort the collected items by.
+        Items whose value is None are put last.
+
+    :type reverse: ``bool``
+    :param reverse: Whether to sort the items in descending order.
+
+    :rtype: ``list``
+    :return:: The first limit items, sorted by sort_key if it is given.
+    """
+    items = []  # type: list
+    if len(args_list) <= 1:
+        for args in args_list:
+            items.extend(func(args))
+    else:
+        import threading
+        from multiprocessing.pool import ThreadPool
+
+        stop = threading.Event()
+
+        def run(args):
+            if stop.is_set():
+                return []
+            return func(args)
+
+        pool = ThreadPool(min(max_workers, len(args_list)))
+        try:
+            for func_items in pool.imap(run, args_list):
+                items.extend(func_items)
+                if len(items) >= limit:
+                    break
+        finally:
+            stop.set()
+            pool.close()
+            pool.join()
+
+    items = items[:limit]
+    if sort_key is not None:
+        def item_sort_key(item):
+            value = sort_key(item)
+            return (value is not None, value) if reverse else (value is None, value)
+
+        items.sort(key=item_sort_key, reverse=reverse)
+    return items
+
+
 def dict_safe_get(dict_object, keys, default_return_value=None, return_type=None, raise_return_type=True):
     """Recursive safe get query (for nested dicts and lists), If keys found return value otherwise return None or default value.
     Example:
@@ -6616,3 +6981,36 @@ class IAMCommand:
                 client.handle_exception(user_profile, e, IAMActions.UPDATE_USER)
 
         return user_profile
+
+
+def reinitialize_module_state():
+    """
+        Re-creates the module state that depends on the executed script context (the ``demisto`` params and
+        debug mode). Used by the docker python loop when it reuses an already executed CommonServerPython
+        namespace for a new execution instead of running this module again.
+
+        :return: No data returned
+        :rtype: ``None``
+    """
+    global LOG, _requests_logger
+    # the logger of a previous execution holds its secrets, and must not log the requests of this one
+    reset_module_state()
+    LOG = IntegrationLogger(debug_logging=is_debug_mode())
+    _requests_logger = _start_debug_logger()
+
+
+def reset_module_state():
+    """
+        Stops the requests debug logger of the executed script, restoring the logging and http client state.
+        Used by the docker python loop when an execution ends, before its namespace is reused.
+
+        :return: No data returned
+        :rtype: ``None``
+    """
+    global _requests_logger
+    if _requests_logger:
+        _requests_logger.stop()
+    _requests_logger = None
+
+
+# END OF COMMONSERVERPYTHON
@@ -8,6 +8,8 @@ from base64 import b64decode
 
 import email.utils
 from email.parser import HeaderParser
+from email.generator import Generator
+import quopri
 import traceback
 import tempfile
 import sys
@@ -44,6 +46,13 @@ sys.setdefaultencoding('utf8')  # pylint: disable=no-member
 
 MAX_DEPTH_CONST = 3
 
+# when set, attachments are enumerated as LazyAttachment descriptors after the headers and bodies are parsed,
+# and are streamed to file entries as long as their total size is within MAX_ATTACHMENTS_SIZE (bytes)
+LAZY_ATTACHMENTS = False
+MAX_ATTACHMENTS_SIZE = None
+ATTACHMENTS_SIZE_SAVED = 0
+ATTACHMENT_CHUNK_SIZE = 64 * 1024
+
 """
 https://github.com/vikramarsid/msg_parser
 
@@ -2665,11 +2674,14 @@ class Message(object):
      Class to store Message properties
     """
 
-    def __init__(self, directory_entries, parent_directory_path=None):
+    def __init__(self, directory_entries, parent_directory_path=None, msg_file_path=None):
 
         if parent_directory_path is None:
             parent_directory_path = []
 
+        # when set, attachments data is not read, it is streamed from the msg file when the attachment is saved
+        self._msg_file_path = msg_file_path
+
         self._streams = self._process_directory_entries(directory_entries)
         self.embedded_messages = []  # type: list
         self._data_model = DataModel()
@@ -2690,11 +2702,13 @@ class Message(object):
 
         return names
 
-    def get_all_attachments(self):
+    def get_all_attachments(self, max_depth=None):
         attachments = self.attachments
 
-        for embedded_message in self.embedded_messages:
-            attachments.extend(embedded_message.get_all_attachments())
+        if max_depth is None or max_depth > 1:
+            for embedded_message in self.embedded_messages:
+                attachments.extend(embedded_message.get_all_attachments(
+                    None if max_depth is None else max_depth - 1))
 
         return attachments
 
@@ -2883,7 +2897,8 @@ class Message(object):
                     if kids:
                         embedded_message = Message(
                             property_entry.kids_dict,
-                            self._parent_directory_path + [directory_name, property_entry.name]
+                            self._parent_directory_path + [directory_name, property_entry.name],
+                            self._msg_file_path
                         )
 
                         directory_values["EmbeddedMessage"] = {
@@ -2925,6 +2940,11 @@ class Message(object):
         if not property_type:
             return None
 
+        if self._msg_file_path and property_name == 'AttachDataObject' and not directory_entry.kids:
+            return {property_name: LazyAttachment(
+                directory_entry.size, write_ole_stream(self._msg_file_path, stream_name)
+            )}
+
         try:
             raw_content = ole_file.openstream(stream_name).read()
         except IOError:
@@ -3092,7 +3112,7 @@ class MsOxMessage(object):
      Base class for Microsoft Message Object
     """
 
-    def __init__(self, msg_file_path):
+    def __init__(self, msg_file_path, lazy=False):
         self.msg_file_path = msg_file_path
         self.include_attachment_data = False
 
@@ -3107,7 +3127,7 @@ class MsOxMessage(object):
             ole_root = ole_file.root
             kids_dict = ole_root.kids_dict
 
-            self._message = Message(kids_dict)
+            self._message = Message(kids_dict, msg_file_path=msg_file_path if lazy else None)
 
         finally:
             if ole_file is not None:
@@ -3137,8 +3157,8 @@ class MsOxMessage(object):
 
         return True
 
-    def get_all_attachments(self):
-        return self._message.get_all_attachments()
+    def get_all_attachments(self, max_depth=None):
+        return self._message.get_all_attachments(max_depth)
 
 
 def format_size(num, suffix='B'):
@@ -3324,10 +3344,236 @@ def data_to_md(email_data, email_file_name=None, parent_email_file=None, print_o
     return md
 
 
+class AttachmentsSizeExceeded(Exception):
+    pass
+
+
+class AttachmentFile(object):
+    """
+     File wrapper counting the bytes written to an attachment file against the attachments size budget
+    """
+
+    def __init__(self, f):
+        self._file = f
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if MAX_ATTACHMENTS_SIZE is not None and ATTACHMENTS_SIZE_SAVED + self.size > MAX_ATTACHMENTS_SIZE:
+            raise AttachmentsSizeExceeded()
+        self._file.write(data)
+
+
+class LazyAttachment(object):
+    """
+     Attachment descriptor, the attachment content is decoded only when it is streamed to a file entry
+    """
+
+    def __init__(self, size, write_content, name=None, content_type=None):
+        self.size = size  # size of the encoded content, the decoded size is known only once it is saved
+        self.name = name
+        self.content_type = content_type
+        self._write_content = write_content
+
+    def __len__(self):
+        return self.size or 0
+
+    def save(self, name=None):
+        """
+        Streams the attachment content to a file entry, if it is not empty and within the attachments size budget.
+        Returns the path of the saved file, or None if the attachment was not saved.
+        """
+        global ATTACHMENTS_SIZE_SAVED
+        name = name or self.name or ''
+        file_id = demisto.uniqueFile()
+        file_path = demisto.investigation()['id'] + '_' + file_id
+        attachment_file = None
+        try:
+            with open(file_path, 'wb') as f:
+                attachment_file = AttachmentFile(f)
+                self._write_content(attachment_file)
+        except AttachmentsSizeExceeded:
+            demisto.debug('Skipping attachment {} as the attachments size exceeded {} bytes'.format(
+                name, MAX_ATTACHMENTS_SIZE))
+            os.remove(file_path)
+            return None
+        except Exception:
+            os.remove(file_path)
+            raise
+
+        if not attachment_file.size:
+            os.remove(file_path)
+            return None
+
+        ATTACHMENTS_SIZE_SAVED += attachment_file.size
+        demisto.results({
+            'Contents': '',
+            'ContentsFormat': formats['text'],
+            'Type': entryTypes['file'],
+            'File': name,
+            'FileID': file_id
+        })
+        return file_path
+
+
+def write_ole_stream(msg_file_path, stream_name):
+    def write_content(f):
+        ole_file = OleFileIO(msg_file_path)
+        try:
+            stream = ole_file.openstream(stream_name)
+            chunk = stream.read(ATTACHMENT_CHUNK_SIZE)
+            while chunk:
+                f.write(chunk)
+                chunk = stream.read(ATTACHMENT_CHUNK_SIZE)
+        finally:
+            ole_file.close()
+
+    return write_content
+
+
+def iter_lines(text):
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        end = len(text) if end == -1 else end + 1
+        yield text[start:end]
+        start = end
+
+
+def write_decoded_payload(part):
+    """
+    Returns a function streaming the decoded payload of a mime part to a file, chunk by chunk,
+    instead of decoding the whole payload at once with get_payload(decode=True)
+    """
+    def write_content(f):
+        payload = part.get_payload()
+        if not isinstance(payload, basestring):
+            Generator(f, mangle_from_=False).flatten(part)
+            return
+
+        encoding = part.get('Content-Transfer-Encoding', '').lower()
+        if 'base64' in encoding:
+            chunk = []
+            size = 0
+            for line in iter_lines(payload):
+                line = ''.join(line.split())
+                chunk.append(line)
+                size += len(line)
+                if size >= ATTACHMENT_CHUNK_SIZE:
+                    data = ''.join(chunk)
+                    end = size - size % 4
+                    f.write(b64decode(data[:end]))
+                    chunk = [data[end:]]
+                    size = len(chunk[0])
+            data = ''.join(chunk)
+            if data:
+                try:
+                    f.write(b64decode(data + '=' * (-len(data) % 4)))
+                except TypeError:
+                    demisto.debug('Failed decoding the last base64 chunk of attachment {}'.format(part.get_filename()))
+
+        elif 'quoted-printable' in encoding:
+            chunk = []
+            size = 0
+            for line in iter_lines(payload):
+                chunk.append(line)
+                size += len(line)
+                if size >= ATTACHMENT_CHUNK_SIZE:
+                    f.write(quopri.decodestring(''.join(chunk)))
+                    chunk = []
+                    size = 0
+            f.write(quopri.decodestring(''.join(chunk)))
+
+        else:
+            for start in range(0, len(payload), ATTACHMENT_CHUNK_SIZE):
+                f.write(payload[start:start + ATTACHMENT_CHUNK_SIZE])
+
+    return write_content
+
+
+def get_lazy_eml_attachment(part, attachment_file_name):
+    """
+    Creates a lazy attachment descriptor of an eml attachment part, without decoding its content
+    """
+    payload = part.get_payload()
+    if "message/rfc822" in part.get("Content-Type", "") and isinstance(payload, list) and len(payload) > 0:
+        if attachment_file_name is None or attachment_file_name == "" or attachment_file_name == 'None':
+            # in case there is no filename for the eml we will try to use mail subject as file name
+            attachment_name = payload[0].get('Subject', "no_name_mail_attachment")
+            attachment_file_name = convert_to_unicode(attachment_name) + '.eml'
+
+        if "base64" in part.get("Content-Transfer-Encoding", ""):
+            def write_content(f):
+                file_content = payload[0].as_string()
+                try:
+                    file_content = b64decode(file_content)
+                except TypeError:
+                    pass
+                f.write(file_content)
+        else:
+            def write_content(f):
+                Generator(f).flatten(payload[0])
+        size = None
+    else:
+        write_content = write_decoded_payload(part)
+        size = len(payload) if isinstance(payload, basestring) else None
+
+    return LazyAttachment(size, write_content, attachment_file_name, part.get_content_type())
+
+
+def save_lazy_eml_attachments(eml, attachments, file_name, max_depth):
+    """
+    Streams the lazy attachments of an eml to file entries, and parses the attached emails up to max_depth
+    """
+    attached_emails = []
+    for attachment in attachments:
+        name_lower = (attachment.name or '').lower()
+        if name_lower.endswith('.p7s'):
+            continue
+
+        saved_file_path = attachment.save()
+        if not saved_file_path or max_depth - 1 <= 0:
+            continue
+
+        if "message/rfc822" in attachment.content_type or name_lower.endswith('.eml'):
+            inner_eml, inner_attached_emails = handle_eml(file_path=saved_file_path, file_name=attachment.name,
+                                                          max_depth=max_depth - 1)
+            attached_emails.append(inner_eml)
+            attached_emails.extend(inner_attached_emails)
+            # if we are outter email is a singed attachment it is a wrapper and we don't return the output of
+            # this inner email as it will be returned as part of the main result
+            if 'multipart/signed' not in eml.get_content_type():
+                return_outputs(readable_output=data_to_md(inner_eml, attachment.name, file_name), outputs=None)
+
+        elif name_lower.endswith('.msg'):
+            inner_msg, inner_attached_emails = handle_msg(saved_file_path, attachment.name, False, max_depth - 1)
+            attached_emails.append(inner_msg)
+            attached_emails.extend(inner_attached_emails)
+            return_outputs(readable_output=data_to_md(inner_msg, attachment.name, file_name), outputs=None)
+
+    return attached_emails
+
+
 def save_attachments(attachments, root_email_file_name, max_depth):
     attached_emls = []
     for attachment in attachments:
-        if attachment.data is not None:
+        if isinstance(attachment.data, LazyAttachment):
+            display_name = attachment.DisplayName if attachment.DisplayName else attachment.AttachFilename
+            display_name = display_name if display_name else ''
+            saved_file_path = attachment.data.save(display_name)
+            name_lower = display_name.lower()
+            if saved_file_path and max_depth > 0 and (name_lower.endswith(".eml") or name_lower.endswith('.p7m')):
+                inner_eml, attached_inner_emails = handle_eml(saved_file_path, file_name=root_email_file_name,
+                                                              max_depth=max_depth)
+                if inner_eml:
+                    return_outputs(
+                        readable_output=data_to_md(inner_eml, attachment.DisplayName, root_email_file_name),
+                        outputs=None)
+                    attached_emls.append(inner_eml)
+                if attached_inner_emails:
+                    attached_emls.extend(attached_inner_emails)
+
+        elif attachment.data is not None:
             display_name = attachment.DisplayName if attachment.DisplayName else attachment.AttachFilename
             display_name = display_name if display_name else ''
             demisto.results(fileResult(display_name, attachment.data))
@@ -3404,7 +3650,7 @@ def handle_msg(file_path, file_name, parse_only_headers=False, max_depth=3):
     if max_depth == 0:
         return None, []
 
-    msg = MsOxMessage(file_path)
+    msg = MsOxMessage(file_path, lazy=LAZY_ATTACHMENTS)
     if not msg:
         raise Exception("Could not parse msg file!")
 
@@ -3429,7 +3675,8 @@ def handle_msg(file_path, file_name, parse_only_headers=False, max_depth=3):
     if parse_only_headers:
         return {"HeadersMap": email_data.get("HeadersMap")}, []
 
-    attached_emails_emls = save_attachments(msg.get_all_attachments(), file_name, max_depth - 1)
+    attachments = msg.get_all_attachments(max_depth if LAZY_ATTACHMENTS else None)
+    attached_emails_emls = save_attachments(attachments, file_name, max_depth - 1)
     # add eml attached emails
 
     attached_emails_msg = msg.get_attached_emails_hierarchy(max_depth - 1)
@@ -3526,6 +3773,7 @@ def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, m
         attachment_names = []
 
         attached_emails = []
+        lazy_attachments = []
         parts = [eml]
 
         while parts:
@@ -3542,7 +3790,14 @@ def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, m
                     if os.path.isabs(attachment_file_name):
                         attachment_file_name = os.path.basename(attachment_file_name)
 
-                if "message/rfc822" in part.get("Content-Type", "") \
+                if LAZY_ATTACHMENTS and ("message/rfc822" in part.get("Content-Type", "") or not part.is_multipart()):
+                    # attachments are saved after all the parts are parsed, DSN parts are saved as they are parsed
+                    lazy_attachment = get_lazy_eml_attachment(part, attachment_file_name)
+                    attachment_file_name = lazy_attachment.name
+                    lazy_attachments.append(lazy_attachment)
+                    attachment_names.append(attachment_file_name)
+
+                elif "message/rfc822" in part.get("Content-Type", "") \
                         or ("application/octet-stream" in part.get("Content-Type", "")
                             and attachment_file_name.endswith(".eml")):
 
@@ -3649,6 +3904,8 @@ def handle_eml(file_path, b64=False, file_name=None, parse_only_headers=False, m
 
             elif part.get_content_type() == 'text/plain':
                 text = get_utf_string(decode_content(part), 'TEXT')
+
+        attached_emails.extend(save_lazy_eml_attachments(eml, lazy_attachments, file_name, max_depth))
         email_data = None
         # if we are parsing a signed attachment there can be one of two options:
         # 1. it is 'multipart/signed' so it is probably a wrapper and we can ignore the outer "email"
@@ -3711,6 +3968,12 @@ def main():
         return_error('Minimum max_depth is 1, the script will parse just the top email')
 
     parse_only_headers = demisto.args().get('parse_only_headers', 'false').lower() == 'true'
+
+    global LAZY_ATTACHMENTS, MAX_ATTACHMENTS_SIZE, ATTACHMENTS_SIZE_SAVED
+    LAZY_ATTACHMENTS = demisto.args().get('lazy_attachments', 'false').lower() == 'true'
+    max_attachments_size = demisto.args().get('max_attachments_size')
+    MAX_ATTACHMENTS_SIZE = int(max_attachments_size) * 1024 * 1024 if LAZY_ATTACHMENTS and max_attachments_size else None
+    ATTACHMENTS_SIZE_SAVED = 0
     try:
         result = demisto.executeCommand('getFilePath', {'id': entry_id})
         if is_error(result):
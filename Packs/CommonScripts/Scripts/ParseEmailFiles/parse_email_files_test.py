@@ -924,3 +924,84 @@ def test_pkcs7_mime(mocker):
     assert len(results) == 1
     assert results[0]['Type'] == entryTypes['note']
     assert results[0]['EntryContext']['Email']['Subject'] == 'Testing signed multipart email'
+
+
+def get_file_entries(results, investigation_id):
+    file_entries = []
+    for call in results.call_args_list:
+        entry = call[0][0]
+        if isinstance(entry, dict) and entry.get('Type') == entryTypes['file']:
+            with open(investigation_id + '_' + entry['FileID'], 'rb') as f:
+                file_entries.append((entry['File'], f.read()))
+    return sorted(file_entries)
+
+
+@pytest.mark.parametrize('email_file, info', [
+    ('DONT_OPEN-MALICIOUS.eml', 'news or mail text, ASCII text'),
+    ('ParseEmailFiles-test-emls.eml', 'news or mail text, ASCII text'),
+    ('eml_contains_base64_eml.eml', 'news or mail text, ASCII text'),
+    ('eml_contains_base64_eml2.eml', 'news or mail text, ASCII text'),
+    ('eml_contains_htm_attachment.eml', 'news or mail text, ASCII text'),
+    ('eml_contains_emptytxt_htm_file.eml', 'news or mail text, ASCII text'),
+    ('new-line-in-parts.eml', 'news or mail text, ASCII text'),
+    ('html_attachment.msg', 'CDFV2 Microsoft Outlook Message'),
+    ('smime-p7s.msg', 'CDFV2 Microsoft Outlook Message'),
+])
+def test_lazy_attachments(mocker, tmpdir, email_file, info):
+    """
+    Given:
+     - An email file with attachments from the test data corpus.
+
+    When:
+     - Parsing the email with and without lazy attachments.
+
+    Then:
+     - Ensure the same emails are parsed and the same attachments are saved as file entries.
+    """
+    investigation_id = str(tmpdir.join('investigation'))
+    mocker.patch.object(demisto, 'investigation', return_value={'id': investigation_id})
+    mocker.patch.object(demisto, 'executeCommand', side_effect=exec_command_for_file(email_file, info=info))
+    mocker.patch.object(demisto, 'results')
+
+    outputs = []
+    file_entries = []
+    for lazy_attachments in ('false', 'true'):
+        mocker.patch.object(demisto, 'args', return_value={'entryid': 'test', 'lazy_attachments': lazy_attachments})
+        demisto.results.reset_mock()
+        main()
+        emails = demisto.results.call_args[0][0]['EntryContext']['Email']
+        if isinstance(emails, list):
+            # lazy attachments are parsed after the email parts, so the attached emails order may differ
+            emails = [emails[0]] + sorted(emails[1:], key=repr)
+        outputs.append(emails)
+        file_entries.append(get_file_entries(demisto.results, investigation_id))
+
+    assert file_entries[1]
+    assert file_entries[0] == file_entries[1]
+    assert outputs[0] == outputs[1]
+
+
+def test_lazy_attachments_max_size(mocker, tmpdir):
+    """
+    Given:
+     - An email with attachments.
+     - Attachments size budget smaller than the attachments size.
+
+    When:
+     - Parsing the email with lazy attachments.
+
+    Then:
+     - Ensure the email is parsed and its attachments are listed, but not saved as file entries.
+    """
+    investigation_id = str(tmpdir.join('investigation'))
+    mocker.patch.object(demisto, 'investigation', return_value={'id': investigation_id})
+    mocker.patch.object(demisto, 'executeCommand',
+                        side_effect=exec_command_for_file('eml_contains_htm_attachment.eml',
+                                                          info='news or mail text, ASCII text'))
+    mocker.patch.object(demisto, 'args', return_value={'entryid': 'test', 'lazy_attachments': 'true',
+                                                       'max_attachments_size': '0'})
+    mocker.patch.object(demisto, 'results')
+    main()
+    assert not get_file_entries(demisto.results, investigation_id)
+    assert demisto.results.call_args[0][0]['EntryContext']['Email']['AttachmentNames']
+    assert not tmpdir.listdir()
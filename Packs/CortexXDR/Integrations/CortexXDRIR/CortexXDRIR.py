@@ -10,7 +10,9 @@ import dateparser
 import urllib3
 import traceback
 from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor
 import copy
+import threading
 
 # Disable insecure warnings
 urllib3.disable_warnings()
@@ -54,6 +56,19 @@ XSOAR_RESOLVED_STATUS_TO_XDR = {
     'False Positive': 'resolved_false_positive'
 }
 
+# the extra data of fetched incidents is retrieved concurrently, at a bounded rate to stay under the XDR API rate limit
+EXTRA_DATA_MAX_WORKERS = 5
+EXTRA_DATA_REQUESTS_PER_SECOND = 5
+EXTRA_DATA_RATE_LIMIT_RETRIES = 3
+
+# modified incidents are tracked for mirroring in the integration context, as an index of
+# incident ID -> [modification time, alert count, time the alert count last changed]
+MODIFIED_INCIDENTS_PAGE_SIZE = 100
+MODIFIED_INCIDENTS_MAX_PAGES = 100
+# fetch-incidents runs every minute, so it only advances the index by a few pages per run
+MODIFIED_INCIDENTS_FETCH_MAX_PAGES = 5
+MODIFIED_INCIDENTS_RETENTION_MILLISECONDS = 7 * 24 * 60 * 60 * 1000
+
 MIRROR_DIRECTION = {
     'None': None,
     'Incoming': 'In',
@@ -111,6 +126,45 @@ def clear_trailing_whitespace(res):
     return res
 
 
+class TokenBucket:
+    """
+    A thread safe token bucket, allowing bursts of up to `capacity` requests and `rate` requests per second on average.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """
+        Blocks until a token is available, and takes it
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+    def drain(self):
+        """
+        Empties the bucket, so all the callers back off after a request was rejected for exceeding the rate limit
+        """
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0)
+
+
 class Client(BaseClient):
 
     def __init__(self, base_url: str, headers: dict, timeout: int = 120, proxy: bool = False, verify: bool = False):
@@ -126,7 +180,8 @@ class Client(BaseClient):
 
     def get_incidents(self, incident_id_list=None, lte_modification_time=None, gte_modification_time=None,
                       lte_creation_time=None, gte_creation_time=None, sort_by_modification_time=None,
-                      sort_by_creation_time=None, page_number=0, limit=100, gte_creation_time_milliseconds=0):
+                      sort_by_creation_time=None, page_number=0, limit=100, gte_creation_time_milliseconds=0,
+                      gte_modification_time_milliseconds=0):
         """
         Filters and returns incidents
 
@@ -140,6 +195,7 @@ class Client(BaseClient):
         :param page_number: page number
         :param limit: maximum number of incidents to return per page
         :param gte_creation_time_milliseconds: greater than time in milliseconds
+        :param gte_modification_time_milliseconds: greater than modification time in milliseconds
         :return:
         """
         search_from = page_number * limit
@@ -207,6 +263,13 @@ class Client(BaseClient):
                 'value': gte_creation_time_milliseconds
             })
 
+        if gte_modification_time_milliseconds > 0:
+            filters.append({
+                'field': 'modification_time',
+                'operator': 'gte',
+                'value': gte_modification_time_milliseconds
+            })
+
         if len(filters) > 0:
             request_data['filters'] = filters
 
@@ -1131,14 +1194,99 @@ class Client(BaseClient):
         )
         return reply
 
-    def save_modified_incidents_to_integration_context(self):
-        last_modified_incidents = self.get_incidents(limit=100, sort_by_modification_time='desc')
-        modified_incidents_context = {}
-        for incident in last_modified_incidents:
-            incident_id = incident.get('incident_id')
-            modified_incidents_context[incident_id] = incident.get('modification_time')
+    def get_modified_incidents(self, gte_modification_time_milliseconds, max_pages=MODIFIED_INCIDENTS_MAX_PAGES):
+        """
+        Pages through the incidents modified since the given time, in ascending modification time.
+        Every page starts from the modification time of the previous page's last incident, so incidents that are
+        modified during the scan do not shift the pages.
+
+        :param gte_modification_time_milliseconds: greater than modification time in milliseconds
+        :param max_pages: the maximal number of pages to scan. As the pages are in ascending modification time, a scan
+            that stops at the limit can be continued from the last modification time it returned.
+        :return: the modified incidents
+        """
+        modified_incidents: Dict[str, dict] = {}
+        page_number = 0
+        for _ in range(max_pages):
+            incidents = self.get_incidents(gte_modification_time_milliseconds=gte_modification_time_milliseconds,
+                                           sort_by_modification_time='asc', page_number=page_number,
+                                           limit=MODIFIED_INCIDENTS_PAGE_SIZE)
+            for incident in incidents:
+                modified_incidents[incident.get('incident_id')] = incident
+
+            if len(incidents) < MODIFIED_INCIDENTS_PAGE_SIZE:
+                break
+
+            last_modification_time = incidents[-1].get('modification_time')
+            if last_modification_time == gte_modification_time_milliseconds:
+                # a full page of incidents sharing the same modification time
+                page_number += 1
+            else:
+                gte_modification_time_milliseconds = last_modification_time
+                page_number = 0
+        else:
+            demisto.debug(f'Reached the maximum of {max_pages} pages of modified incidents')
+
+        return list(modified_incidents.values())
 
-        set_integration_context({'modified_incidents': modified_incidents_context})
+    def save_modified_incidents_to_integration_context(self, modified_incidents=None,
+                                                       max_pages=MODIFIED_INCIDENTS_MAX_PAGES):
+        """
+        Updates the modified incidents index in the integration context.
+
+        :param modified_incidents: incidents that are known to be modified. If not given, the incidents modified since
+            the last update of the index are scanned.
+        :param max_pages: the maximal number of pages to scan when modified_incidents is not given. The rest of the
+            incidents are scanned by the next update, from the last modification time saved to the index.
+        """
+        integration_context = get_integration_context()
+        modified_incidents_index = integration_context.get('modified_incidents', {})
+        last_modification_time = integration_context.get('modified_incidents_last_modification_time')
+
+        if modified_incidents is None:
+            if last_modification_time:
+                modified_incidents = self.get_modified_incidents(last_modification_time, max_pages)
+            else:
+                modified_incidents = self.get_incidents(limit=MODIFIED_INCIDENTS_PAGE_SIZE,
+                                                        sort_by_modification_time='desc')
+
+        for incident in modified_incidents:
+            update_modified_incidents_index(modified_incidents_index, incident)
+            last_modification_time = max(last_modification_time or 0, incident.get('modification_time') or 0)
+
+        if last_modification_time:
+            retention_start = last_modification_time - MODIFIED_INCIDENTS_RETENTION_MILLISECONDS
+            modified_incidents_index = {
+                incident_id: entry for incident_id, entry in modified_incidents_index.items()
+                if get_index_modification_time(entry) >= retention_start
+            }
+
+        integration_context['modified_incidents'] = modified_incidents_index
+        integration_context['modified_incidents_last_modification_time'] = last_modification_time
+        set_integration_context(integration_context)
+
+
+def get_index_modification_time(entry):
+    """
+    Returns the modification time of a modified incidents index entry, of either the current or the legacy format
+    """
+    return int(str(entry[0] if isinstance(entry, list) else entry))
+
+
+def update_modified_incidents_index(modified_incidents_index, incident):
+    """
+    Updates the index entry of a modified incident. The time the alert count of the incident last changed is kept, so
+    mirroring only retrieves the alerts and artifacts of incidents that have new alerts.
+    """
+    incident_id = incident.get('incident_id')
+    modification_time = incident.get('modification_time')
+    alert_count = incident.get('alert_count')
+    previous_entry = modified_incidents_index.get(incident_id)
+    if isinstance(previous_entry, list) and previous_entry[1] == alert_count:
+        alerts_modification_time = previous_entry[2]
+    else:
+        alerts_modification_time = modification_time
+    modified_incidents_index[incident_id] = [modification_time, alert_count, alerts_modification_time]
 
 
 def get_incidents_command(client, args):
@@ -1342,7 +1490,7 @@ def get_indicators_context(incident):
 
 def check_if_incident_was_modified_in_xdr(incident_id, last_mirrored_in_time_timestamp, last_modified_incidents_dict):
     if incident_id in last_modified_incidents_dict:  # search the incident in the dict of modified incidents
-        incident_modification_time_in_xdr = int(str(last_modified_incidents_dict[incident_id]))
+        incident_modification_time_in_xdr = get_index_modification_time(last_modified_incidents_dict[incident_id])
 
         demisto.debug(f"XDR incident {incident_id}\n"
                       f"modified time:         {incident_modification_time_in_xdr}\n"
@@ -1355,6 +1503,19 @@ def check_if_incident_was_modified_in_xdr(incident_id, last_mirrored_in_time_tim
         return False
 
 
+def check_if_only_incident_fields_were_modified_in_xdr(incident_id, last_mirrored_in_time_timestamp,
+                                                       last_modified_incidents_dict):
+    """
+    Whether the incident was modified in XDR since it was last mirrored in, without any change to its alerts
+    """
+    entry = last_modified_incidents_dict.get(incident_id)
+    if not isinstance(entry, list):  # unknown or legacy entry, the alerts might have changed
+        return False
+
+    modification_time, _, alerts_modification_time = entry
+    return alerts_modification_time <= last_mirrored_in_time_timestamp < modification_time
+
+
 def get_last_mirrored_in_time(args):
     demisto_incidents = demisto.get_incidents()  # type: ignore
 
@@ -1372,6 +1533,21 @@ def get_last_mirrored_in_time(args):
     return last_mirrored_in_timestamp
 
 
+def parse_incident_extra_data(raw_incident):
+    """
+    Splits a get_incident_extra_data reply into the incident, its alerts, file artifacts and network artifacts
+    """
+    incident = raw_incident.get('incident')
+    raw_alerts = raw_incident.get('alerts').get('data')
+    context_alerts = clear_trailing_whitespace(raw_alerts)
+    for alert in context_alerts:
+        alert['host_ip_list'] = alert.get('host_ip').split(',') if alert.get('host_ip') else []
+    file_artifacts = raw_incident.get('file_artifacts').get('data')
+    network_artifacts = raw_incident.get('network_artifacts').get('data')
+
+    return incident, context_alerts, file_artifacts, network_artifacts
+
+
 def get_incident_extra_data_command(client, args):
     incident_id = args.get('incident_id')
     alerts_limit = int(args.get('alerts_limit', 1000))
@@ -1390,14 +1566,8 @@ def get_incident_extra_data_command(client, args):
     demisto.debug(f"Performing extra-data request on incident: {incident_id}")
     raw_incident = client.get_incident_extra_data(incident_id, alerts_limit)
 
-    incident = raw_incident.get('incident')
+    incident, context_alerts, file_artifacts, network_artifacts = parse_incident_extra_data(raw_incident)
     incident_id = incident.get('incident_id')
-    raw_alerts = raw_incident.get('alerts').get('data')
-    context_alerts = clear_trailing_whitespace(raw_alerts)
-    for alert in context_alerts:
-        alert['host_ip_list'] = alert.get('host_ip').split(',') if alert.get('host_ip') else []
-    file_artifacts = raw_incident.get('file_artifacts').get('data')
-    network_artifacts = raw_incident.get('network_artifacts').get('data')
 
     readable_output = [tableToMarkdown('Incident {}'.format(incident_id), incident)]
 
@@ -2268,7 +2438,8 @@ def get_modified_remote_data_command(client, args):
     last_update_utc = dateparser.parse(last_update, settings={'TIMEZONE': 'UTC'})  # convert to utc format
     last_update_without_ms = last_update_utc.isoformat().split('.')[0]
 
-    raw_incidents = client.get_incidents(gte_modification_time=last_update_without_ms, limit=100)
+    raw_incidents = client.get_modified_incidents(date_to_timestamp(last_update_without_ms, TIME_FORMAT))
+    client.save_modified_incidents_to_integration_context(raw_incidents)
 
     modified_incident_ids = list()
     for raw_incident in raw_incidents:
@@ -2284,10 +2455,20 @@ def get_remote_data_command(client, args):
 
     incident_data = {}
     try:
-        incident_data = get_incident_extra_data_command(client, {"incident_id": remote_args.remote_incident_id,
-                                                                 "alerts_limit": 1000,
-                                                                 "return_only_updated_incident": True,
-                                                                 "last_update": remote_args.last_update})
+        last_mirrored_in_time = get_last_mirrored_in_time({'last_update': remote_args.last_update})
+        last_modified_incidents_dict = get_integration_context().get('modified_incidents', {})
+        if check_if_only_incident_fields_were_modified_in_xdr(remote_args.remote_incident_id, last_mirrored_in_time,
+                                                              last_modified_incidents_dict):
+            # no new alerts - the alerts and artifacts are not requested again
+            demisto.debug(f"Performing incident fields request on incident: {remote_args.remote_incident_id}")
+            raw_incidents = client.get_incidents(incident_id_list=[remote_args.remote_incident_id])
+            incident_data = ('', {}, {'incident': raw_incidents[0]}) if raw_incidents else \
+                ('The incident was not modified in XDR since the last mirror in.', {}, {})
+        else:
+            incident_data = get_incident_extra_data_command(client, {"incident_id": remote_args.remote_incident_id,
+                                                                     "alerts_limit": 1000,
+                                                                     "return_only_updated_incident": True,
+                                                                     "last_update": remote_args.last_update})
         if 'The incident was not modified' not in incident_data[0]:
             demisto.debug(f"Updating XDR incident {remote_args.remote_incident_id}")
 
@@ -2420,6 +2601,38 @@ def update_remote_system_command(client, args):
         return remote_args.remote_incident_id
 
 
+def get_incidents_extra_data(client, incident_ids, alerts_limit=1000):
+    """
+    Requests the extra data of the incidents concurrently, at a rate limited by a token bucket.
+    A request rejected for exceeding the XDR rate limit is retried after the bucket drains, instead of failing.
+
+    :return: a dict of incident ID to a future of its get_incident_extra_data reply
+    """
+    bucket = TokenBucket(EXTRA_DATA_REQUESTS_PER_SECOND, EXTRA_DATA_MAX_WORKERS)
+
+    def get_extra_data(incident_id):
+        for attempt in range(EXTRA_DATA_RATE_LIMIT_RETRIES + 1):
+            bucket.acquire()
+            try:
+                return client.get_incident_extra_data(incident_id, alerts_limit)
+            except Exception as e:
+                if "Rate limit exceeded" not in str(e) or attempt == EXTRA_DATA_RATE_LIMIT_RETRIES:
+                    raise
+                bucket.drain()
+
+    with ThreadPoolExecutor(max_workers=EXTRA_DATA_MAX_WORKERS) as executor:
+        return {incident_id: executor.submit(get_extra_data, incident_id) for incident_id in incident_ids}
+
+
+def find_owner_by_email(email, owners_by_email):
+    """
+    Finds the XSOAR username of the user with the email, memoizing the result in owners_by_email
+    """
+    if email not in owners_by_email:
+        owners_by_email[email] = (demisto.findUser(email=email) or {}).get('username')
+    return owners_by_email[email]
+
+
 def fetch_incidents(client, first_fetch_time, integration_instance, last_run: dict = None, max_fetch: int = 10):
     # Get the last fetch time, if exists
     last_fetch = last_run.get('time') if isinstance(last_run, dict) else None
@@ -2436,57 +2649,63 @@ def fetch_incidents(client, first_fetch_time, integration_instance, last_run: di
         raw_incidents = client.get_incidents(gte_creation_time_milliseconds=last_fetch,
                                              limit=max_fetch, sort_by_creation_time='asc')
 
-    # save the last 100 modified incidents to the integration context - for mirroring purposes
-    client.save_modified_incidents_to_integration_context()
+    # update the modified incidents index in the integration context - for mirroring purposes
+    client.save_modified_incidents_to_integration_context(max_pages=MODIFIED_INCIDENTS_FETCH_MAX_PAGES)
 
+    extra_data_futures = get_incidents_extra_data(client, [raw_incident.get('incident_id')
+                                                           for raw_incident in raw_incidents])
     # maintain a list of non created incidents in a case of a rate limit exception
-    non_created_incidents: list = raw_incidents.copy()
+    non_created_incidents: list = []
+    owners_by_email: Dict[str, str] = {}
     next_run = dict()
-    try:
-        for raw_incident in raw_incidents:
-            incident_id = raw_incident.get('incident_id')
+    for raw_incident in raw_incidents:
+        incident_id = raw_incident.get('incident_id')
+        try:
+            raw_extra_data = extra_data_futures[incident_id].result()
 
-            incident_data = get_incident_extra_data_command(client, {"incident_id": incident_id,
-                                                                     "alerts_limit": 1000})[2].get('incident')
+        except Exception as e:
+            if "Rate limit exceeded" in str(e):
+                non_created_incidents.append(raw_incident)
+                continue
 
-            sort_all_list_incident_fields(incident_data)
+            raise
 
-            incident_data['mirror_direction'] = MIRROR_DIRECTION.get(demisto.params().get('mirror_direction', 'None'),
-                                                                     None)
-            incident_data['mirror_instance'] = integration_instance
-            incident_data['last_mirrored_in'] = int(datetime.now().timestamp() * 1000)
-
-            description = raw_incident.get('description')
-            occurred = timestamp_to_datestring(raw_incident['creation_time'], TIME_FORMAT + 'Z')
-            incident = {
-                'name': f'#{incident_id} - {description}',
-                'occurred': occurred,
-                'rawJSON': json.dumps(incident_data),
-            }
+        incident_data, alerts, file_artifacts, network_artifacts = parse_incident_extra_data(raw_extra_data)
+        incident_data.update({
+            'alerts': alerts,
+            'file_artifacts': file_artifacts,
+            'network_artifacts': network_artifacts
+        })
 
-            if demisto.params().get('sync_owners') and incident_data.get('assigned_user_mail'):
-                incident['owner'] = demisto.findUser(email=incident_data.get('assigned_user_mail')).get('username')
+        sort_all_list_incident_fields(incident_data)
 
-            # Update last run and add incident if the incident is newer than last fetch
-            if raw_incident['creation_time'] > last_fetch:
-                last_fetch = raw_incident['creation_time']
+        incident_data['mirror_direction'] = MIRROR_DIRECTION.get(demisto.params().get('mirror_direction', 'None'),
+                                                                 None)
+        incident_data['mirror_instance'] = integration_instance
+        incident_data['last_mirrored_in'] = int(datetime.now().timestamp() * 1000)
 
-            incidents.append(incident)
-            non_created_incidents.remove(raw_incident)
+        description = raw_incident.get('description')
+        occurred = timestamp_to_datestring(raw_incident['creation_time'], TIME_FORMAT + 'Z')
+        incident = {
+            'name': f'#{incident_id} - {description}',
+            'occurred': occurred,
+            'rawJSON': json.dumps(incident_data),
+        }
 
-    except Exception as e:
-        if "Rate limit exceeded" in str(e):
-            demisto.info(f"Cortex XDR - rate limit exceeded, number of non created incidents is: "
-                         f"'{len(non_created_incidents)}'.\n The incidents will be created in the next fetch")
+        if demisto.params().get('sync_owners') and incident_data.get('assigned_user_mail'):
+            incident['owner'] = find_owner_by_email(incident_data.get('assigned_user_mail'), owners_by_email)
 
-        else:
-            raise
+        # Update last run and add incident if the incident is newer than last fetch
+        if raw_incident['creation_time'] > last_fetch:
+            last_fetch = raw_incident['creation_time']
+
+        incidents.append(incident)
 
     if non_created_incidents:
-        next_run['incidents_from_previous_run'] = non_created_incidents
-    else:
-        next_run['incidents_from_previous_run'] = []
+        demisto.info(f"Cortex XDR - rate limit exceeded, number of non created incidents is: "
+                     f"'{len(non_created_incidents)}'.\n The incidents will be created in the next fetch")
 
+    next_run['incidents_from_previous_run'] = non_created_incidents
     next_run['time'] = last_fetch + 1
 
     return next_run, incidents
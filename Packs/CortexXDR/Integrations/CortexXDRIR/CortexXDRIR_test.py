@@ -74,18 +74,17 @@ def test_fetch_incidents(requests_mock, mocker):
 
 
 def return_extra_data_result(*args):
-    if args[1].get('incident_id') == '2':
+    if args[0] == '2':
         raise Exception("Rate limit exceeded")
     else:
-        incident_from_extra_data_command = load_test_data('./test_data/incident_example_from_extra_data_command.json')
-        return {}, {}, {"incident": incident_from_extra_data_command}
+        return load_test_data('./test_data/get_incident_extra_data.json')['reply']
 
 
 @freeze_time("1993-06-17 11:00:00 GMT")
 def test_fetch_incidents_with_rate_limit_error(requests_mock, mocker):
     """
     Given:
-        - a Rate limit error occurs in the second call for 'get_extra_data_command'
+        - a Rate limit error occurs in every extra data request of the second incident
     When
         - running fetch_incidents command
     Then
@@ -106,7 +105,8 @@ def test_fetch_incidents_with_rate_limit_error(requests_mock, mocker):
     requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incidents/', json=get_incidents_list_response)
     requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incident_extra_data/', json=raw_incident)
 
-    mocker.patch('CortexXDRIR.get_incident_extra_data_command', side_effect=return_extra_data_result)
+    mocker.patch.object(Client, 'get_incident_extra_data', side_effect=return_extra_data_result)
+    mocker.patch('CortexXDRIR.EXTRA_DATA_RATE_LIMIT_RETRIES', 0)
 
     mocker.patch.object(demisto, 'params', return_value={"extra_data": True, "mirror_direction": "Incoming"})
 
@@ -114,6 +114,9 @@ def test_fetch_incidents_with_rate_limit_error(requests_mock, mocker):
         base_url=f'{XDR_URL}/public_api/v1', headers={}
     )
 
+    modified_raw_incident.get('alerts')[0]['host_ip_list'] = \
+        modified_raw_incident.get('alerts')[0].get('host_ip').split(',')
+
     next_run, incidents = fetch_incidents(client, '3 month', 'MyInstance')
     sort_all_list_incident_fields(modified_raw_incident)
 
@@ -129,6 +132,83 @@ def test_fetch_incidents_with_rate_limit_error(requests_mock, mocker):
     assert incidents[0]['rawJSON'] == json.dumps(modified_raw_incident)
 
 
+def test_get_incidents_extra_data_retries_on_rate_limit(mocker):
+    """
+    Given:
+        - a Rate limit error occurs in the first extra data request of an incident
+    When
+        - requesting the extra data of the fetched incidents
+    Then
+        - the request is retried after the token bucket drains, and the extra data of all the incidents is returned
+    """
+    from CortexXDRIR import get_incidents_extra_data, Client
+    client = Client(
+        base_url=f'{XDR_URL}/public_api/v1', headers={}
+    )
+    rate_limited = []
+
+    def get_incident_extra_data(incident_id, alerts_limit):
+        if incident_id == '2' and not rate_limited:
+            rate_limited.append(incident_id)
+            raise Exception("Rate limit exceeded")
+        return {'incident': {'incident_id': incident_id}}
+
+    mocker.patch.object(client, 'get_incident_extra_data', side_effect=get_incident_extra_data)
+    futures = get_incidents_extra_data(client, ['1', '2', '3'])
+
+    assert rate_limited == ['2']
+    assert [futures[incident_id].result()['incident']['incident_id'] for incident_id in ['1', '2', '3']] == \
+        ['1', '2', '3']
+
+
+def test_token_bucket_bounds_rate(mocker):
+    """
+    Given:
+        - a token bucket with a capacity of 2 and a rate of 10 tokens per second
+    When
+        - acquiring 3 tokens
+    Then
+        - the first 2 are acquired immediately, and the third waits for the bucket to refill
+    """
+    from CortexXDRIR import TokenBucket
+    sleep = mocker.patch('CortexXDRIR.time.sleep', side_effect=lambda seconds: None)
+    mocker.patch('CortexXDRIR.time.monotonic', side_effect=[0, 0, 0, 0, 0.1])
+    bucket = TokenBucket(rate=10, capacity=2)
+    for _ in range(3):
+        bucket.acquire()
+
+    assert sleep.call_count == 1
+    assert sleep.call_args[0][0] == pytest.approx(0.1)
+
+
+@freeze_time("1993-06-17 11:00:00 GMT")
+def test_fetch_incidents_sync_owners_finds_each_user_once(requests_mock, mocker):
+    """
+    Given:
+        - two fetched incidents assigned to the same user, with owner sync enabled
+    When
+        - running fetch_incidents command
+    Then
+        - the XSOAR user is looked up once and set as the owner of both incidents
+    """
+    from CortexXDRIR import fetch_incidents, Client
+    get_incidents_list_response = load_test_data('./test_data/get_incidents_list.json')
+    raw_incident = load_test_data('./test_data/get_incident_extra_data.json')
+    raw_incident['reply']['incident']['assigned_user_mail'] = 'user@example.com'
+    requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incidents/', json=get_incidents_list_response)
+    requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incident_extra_data/', json=raw_incident)
+    mocker.patch.object(demisto, 'params', return_value={"sync_owners": True, "mirror_direction": "Incoming"})
+    find_user = mocker.patch.object(demisto, 'findUser', return_value={'username': 'user'})
+    client = Client(
+        base_url=f'{XDR_URL}/public_api/v1', headers={}
+    )
+
+    _, incidents = fetch_incidents(client, '3 month', 'MyInstance')
+
+    assert [incident['owner'] for incident in incidents] == ['user', 'user']
+    find_user.assert_called_once_with(email='user@example.com')
+
+
 def test_get_incident_extra_data(requests_mock):
     from CortexXDRIR import get_incident_extra_data_command, Client
 
@@ -1271,7 +1351,7 @@ def test_retrieve_files_command(requests_mock):
     assert raw_response == {'action_id': 1773}
 
 
-def test_retrieve_file_details_command(requests_mock):
+def test_retrieve_file_details_command(requests_mock, mocker, tmp_path):
     """
     Given:
         - action_id
@@ -1281,6 +1361,8 @@ def test_retrieve_file_details_command(requests_mock):
         - Assert the returned markdown, file result are as expected.
     """
     from CortexXDRIR import retrieve_file_details_command, Client
+    # write the file result into a temporary directory rather than the working directory
+    mocker.patch.object(demisto, 'investigation', return_value={'id': str(tmp_path / 'investigation')})
 
     data = load_test_data('./test_data/retrieve_file_details.json')
     data1 = 'test_file'
@@ -1728,3 +1810,118 @@ def test_get_modified_remote_data_command(requests_mock):
     response = get_modified_remote_data_command(client, args)
 
     assert response.modified_incident_ids == ['1', '2']
+
+
+def test_get_modified_incidents_pages_by_modification_time(mocker):
+    """
+    Given:
+        - 5 incidents modified since the last update, with a page size of 2
+    When
+        - scanning the modified incidents
+    Then
+        - every page starts from the modification time of the previous page's last incident, moving to the next page
+          number only when a full page shares the same modification time, and every incident is returned once
+    """
+    from CortexXDRIR import Client
+    mocker.patch('CortexXDRIR.MODIFIED_INCIDENTS_PAGE_SIZE', 2)
+    client = Client(
+        base_url=f'{XDR_URL}/public_api/v1', headers={}
+    )
+    pages = {
+        (100, 0): [{'incident_id': '1', 'modification_time': 100}, {'incident_id': '2', 'modification_time': 200}],
+        (200, 0): [{'incident_id': '2', 'modification_time': 200}, {'incident_id': '3', 'modification_time': 200}],
+        (200, 1): [{'incident_id': '4', 'modification_time': 200}, {'incident_id': '5', 'modification_time': 300}],
+        (300, 0): [{'incident_id': '5', 'modification_time': 300}],
+    }
+    get_incidents = mocker.patch.object(client, 'get_incidents', side_effect=lambda **kwargs: pages[
+        (kwargs['gte_modification_time_milliseconds'], kwargs['page_number'])])
+
+    incidents = client.get_modified_incidents(100)
+
+    assert [incident['incident_id'] for incident in incidents] == ['1', '2', '3', '4', '5']
+    assert get_incidents.call_count == 4
+
+    # a scan bounded to 2 pages stops after the incidents of the first 2 pages
+    get_incidents.reset_mock()
+    incidents = client.get_modified_incidents(100, max_pages=2)
+
+    assert [incident['incident_id'] for incident in incidents] == ['1', '2', '3']
+    assert get_incidents.call_count == 2
+
+
+def test_save_modified_incidents_to_integration_context(mocker):
+    """
+    Given:
+        - a modified incidents index with a watermark, an entry of the legacy format, and an incident whose alert count
+          did not change
+    When
+        - updating the index with the incidents modified since the watermark
+    Then
+        - the time the alert count last changed is kept for unchanged alert counts, other integration context keys are
+          kept, and entries older than the retention are dropped
+    """
+    from CortexXDRIR import Client, MODIFIED_INCIDENTS_RETENTION_MILLISECONDS
+    client = Client(
+        base_url=f'{XDR_URL}/public_api/v1', headers={}
+    )
+    now = 10 * MODIFIED_INCIDENTS_RETENTION_MILLISECONDS
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={
+        'modified_incidents': {'1': [now - 10, 2, now - 20], '2': now - 10, '3': 1},
+        'modified_incidents_last_modification_time': now - 10,
+        'other': 'value'
+    })
+    set_context = mocker.patch.object(demisto, 'setIntegrationContext')
+    get_modified_incidents = mocker.patch.object(client, 'get_modified_incidents', return_value=[
+        {'incident_id': '1', 'modification_time': now, 'alert_count': 2},
+        {'incident_id': '2', 'modification_time': now, 'alert_count': 1},
+    ])
+
+    client.save_modified_incidents_to_integration_context(max_pages=5)
+
+    get_modified_incidents.assert_called_once_with(now - 10, 5)
+    assert set_context.call_args[0][0] == {
+        'modified_incidents': {'1': [now, 2, now - 20], '2': [now, 1, now]},
+        'modified_incidents_last_modification_time': now,
+        'other': 'value'
+    }
+
+
+@pytest.mark.parametrize('entry, expected', [
+    ([300, 2, 100], True),  # only the incident fields were modified since the last mirror
+    ([300, 3, 250], False),  # new alerts since the last mirror
+    ([150, 2, 100], False),  # not modified since the last mirror
+    (300, False),  # legacy entry
+])
+def test_check_if_only_incident_fields_were_modified_in_xdr(entry, expected):
+    from CortexXDRIR import check_if_only_incident_fields_were_modified_in_xdr
+    assert check_if_only_incident_fields_were_modified_in_xdr('1', 200, {'1': entry}) is expected
+
+
+def test_get_remote_data_command_only_incident_fields_modified(requests_mock, mocker):
+    """
+    Given:
+        - an incident that was modified in XDR since the last mirror, without new alerts
+    When
+        - running get_remote_data_command
+    Then
+        - the incident fields are mirrored without requesting the alerts and artifacts
+    """
+    from CortexXDRIR import get_remote_data_command, Client
+    client = Client(
+        base_url=f'{XDR_URL}/public_api/v1', headers={}
+    )
+    get_incidents_list_response = load_test_data('./test_data/get_incidents_list.json')
+    get_incidents_list_response['reply']['incidents'] = get_incidents_list_response['reply']['incidents'][:1]
+    requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incidents/', json=get_incidents_list_response)
+    extra_data_request = requests_mock.post(f'{XDR_URL}/public_api/v1/incidents/get_incident_extra_data/', json={})
+    mocker.patch('CortexXDRIR.get_last_mirrored_in_time', return_value=1575813875000)
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={
+        'modified_incidents': {'1': [1575813875168, 1, 1575806909185]}
+    })
+
+    response = get_remote_data_command(client, {'id': '1', 'lastUpdate': 0})
+
+    assert not extra_data_request.called
+    assert response.mirrored_object['id'] == '1'
+    assert 'alerts' not in response.mirrored_object
+    assert 'creation_time' not in response.mirrored_object
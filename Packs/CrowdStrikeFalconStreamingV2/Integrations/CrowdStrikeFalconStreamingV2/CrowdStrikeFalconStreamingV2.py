@@ -4,10 +4,11 @@ from CommonServerUserPython import *  # noqa: E402 lgtm [py/polluting-import]
 
 import requests
 import traceback
-from asyncio import Event, create_task, sleep, run, wait_for, TimeoutError
+import time
+from asyncio import Event, Queue, create_task, sleep, run, wait_for, TimeoutError
 from contextlib import asynccontextmanager
 from aiohttp import ClientSession, TCPConnector, ClientTimeout
-from typing import Dict, AsyncGenerator, AsyncIterator
+from typing import Dict, List, AsyncGenerator, AsyncIterator
 from collections import deque
 from random import uniform
 
@@ -437,6 +438,118 @@ async def init_refresh_token(
     task.cancel()
 
 
+class IncidentsBatch:
+    """Micro batch of incidents created from stream events.
+
+    The incidents in the batch are created in a single call, and only then the offset is checkpointed in the
+    integration context, so a crash before the checkpoint leads to the batch events being fetched again.
+
+    Args:
+        offset (int): Stream offset to checkpoint before any batch is created.
+        incident_type (str): Type of incident to create.
+        max_size (int): Maximal number of incidents in a batch.
+        max_latency (float): Maximal number of seconds an event waits in the batch before it is created.
+        store_samples (bool): Whether to store sample events in the integration context or not.
+
+    Returns:
+        None: No data returned.
+    """
+    def __init__(
+            self,
+            offset: int,
+            incident_type: str,
+            max_size: int = 1,
+            max_latency: float = 1,
+            store_samples: bool = False,
+    ) -> None:
+        self.offset: int = offset
+        self.incident_type: str = incident_type
+        self.max_size: int = max_size
+        self.max_latency: float = max_latency
+        self.store_samples: bool = store_samples
+        self.incidents: List[Dict] = []
+        self.pending_offset: int = offset
+        self.started_at: float = 0
+        self.sample_events_to_store = deque(maxlen=20)  # type: ignore[var-annotated]
+        self.new_sample_events: bool = False
+
+    def __len__(self) -> int:
+        return len(self.incidents)
+
+    def add(self, event: Dict) -> None:
+        """Adds a stream event to the batch as an incident.
+
+        Args:
+            event (Dict): The stream event.
+
+        Returns:
+            None: No data returned.
+        """
+        event_metadata = event.get('metadata', {})
+        event_type = event_metadata.get('eventType', '')
+        event_offset = event_metadata.get('offset', '')
+        demisto.info(f'Fetching event with offset: {event_offset}')
+        event_creation_time = event_metadata.get('eventCreationTime', 0)
+        occurred = datetime.fromtimestamp(event_creation_time / 1000).strftime('%Y-%m-%dT%H:%M:%SZ')
+        event_dump = json.dumps(event)
+        if not self.incidents:
+            self.started_at = time.monotonic()
+        self.incidents.append({
+            'name': f'{event_type} - offset {event_offset}',
+            'details': event_dump,
+            'rawJSON': event_dump,
+            'type': self.incident_type,
+            'occurred': occurred
+        })
+        self.pending_offset = int(event_offset) + 1
+        if self.store_samples:
+            try:
+                event_obj_size = sys.getsizeof(event)
+                if event_obj_size <= 1000000:  # storing events of size up to 1MB
+                    self.sample_events_to_store.append(event)
+                    self.new_sample_events = True
+                else:
+                    demisto.debug(f'Skipping event {event_offset} storage due to size {event_obj_size}')
+            except Exception as e:
+                demisto.error(f'Failed storing sample events - {e}')
+
+    def time_left(self) -> float:
+        """Returns the number of seconds left until the batch should be created."""
+        if not self.incidents:
+            return self.max_latency
+        return max(self.started_at + self.max_latency - time.monotonic(), 0)
+
+    def is_ready(self) -> bool:
+        """Returns whether the batch is full or its oldest event waited for the maximal latency."""
+        return len(self.incidents) >= self.max_size or self.time_left() <= 0
+
+    def flush(self) -> None:
+        """Creates the batch incidents and then checkpoints the offset of the batch in the integration context.
+
+        Returns:
+            None: No data returned.
+        """
+        if not self.incidents:
+            return
+        demisto.debug(f'Creating {len(self.incidents)} incidents')
+        demisto.createIncidents(self.incidents)
+        self.incidents = []
+        self.offset = self.pending_offset
+        integration_context = get_integration_context()
+        integration_context['offset'] = self.offset
+        if self.new_sample_events:
+            try:
+                demisto.debug(f'Storing new {len(self.sample_events_to_store)} sample events')
+                sample_events = deque(json.loads(integration_context.get('sample_events', '[]')), maxlen=20)
+                sample_events += self.sample_events_to_store
+                integration_context['sample_events'] = list(sample_events)
+                self.new_sample_events = False
+            except Exception as e:
+                demisto.error(f'Failed storing sample events - {e}')
+        demisto.debug(f'Storing offset {self.offset}')
+        set_to_integration_context_with_retries(integration_context)
+
+
 async def long_running_loop(
         base_url: str,
         client_id: str,
@@ -450,9 +563,14 @@ async def long_running_loop(
         first_fetch_time: datetime,
         store_samples: bool = False,
         sock_read: int = 120,
+        batch_size: int = 1,
+        batch_latency: float = 1,
 ) -> None:
     """Connects to a CrowdStrike Falcon stream and fetches events from it in a loop.
 
+    Events are read from the stream into micro batches of incidents, each batch is created once it is full or once
+    its oldest event waited for the maximal batch latency.
+
     Args:
         base_url (str): CrowdStrike Falcon Cloud base URL.
         client_id (str): CrowdStrike Falcon application ID.
@@ -466,58 +584,52 @@ async def long_running_loop(
         store_samples (bool): Whether to store sample events in the integration context or not.
         first_fetch_time (datetime): The start time to fetch from retroactively for the first fetch.
         sock_read (int) Client session sock read timeout.
+        batch_size (int): Maximal number of incidents to create in a single batch.
+        batch_latency (float): Maximal number of seconds an event waits in a batch before it is created.
 
     Returns:
         None: No data returned.
     """
+    batch = IncidentsBatch(offset, incident_type, batch_size, batch_latency, store_samples)
+    events: Queue = Queue(maxsize=batch_size)
+    producer = None
     try:
-        offset_to_store = offset
-        sample_events_to_store = deque(maxlen=20)  # type: ignore[var-annotated]
         async with init_refresh_token(base_url, client_id, client_secret, verify_ssl, proxy) as refresh_token:
             stream.set_refresh_token(refresh_token)
             demisto.debug('Finished initializing refresh token, starting fetch events loop')
-            async for event in stream.fetch_event(
-                    first_fetch_time=first_fetch_time, initial_offset=offset, event_type=event_type, sock_read=sock_read
-            ):
-                event_metadata = event.get('metadata', {})
-                event_type = event_metadata.get('eventType', '')
-                event_offset = event_metadata.get('offset', '')
-                demisto.info(f'Fetching event with offset: {event_offset}')
-                incident_name = f'{event_type} - offset {event_offset}'
-                event_creation_time = event_metadata.get('eventCreationTime', 0)
-                occurred = datetime.fromtimestamp(event_creation_time / 1000).strftime('%Y-%m-%dT%H:%M:%SZ')
-                event_dump = json.dumps(event)
-                incident = [{
-                    'name': incident_name,
-                    'details': event_dump,
-                    'rawJSON': event_dump,
-                    'type': incident_type,
-                    'occurred': occurred
-                }]
-                demisto.createIncidents(incident)
-                offset_to_store = int(event_offset) + 1
-                integration_context = get_integration_context()
-                integration_context['offset'] = offset_to_store
-                if store_samples:
-                    try:
-                        event_obj_size = sys.getsizeof(event)
-                        if event_obj_size <= 1000000:  # storing events of size up to 1MB
-                            sample_events_to_store.append(event)
-                            demisto.debug(f'Storing new {len(sample_events_to_store)} sample events')
-                            sample_events = deque(json.loads(integration_context.get('sample_events', '[]')), maxlen=20)
-                            sample_events += sample_events_to_store
-                            integration_context['sample_events'] = list(sample_events)
-                        else:
-                            demisto.debug(f'Skipping event {event_offset} storage due to size {event_obj_size}')
-                    except Exception as e:
-                        demisto.error(f'Failed storing sample events - {e}')
-                demisto.debug(f'Storing offset {offset_to_store}')
-                set_to_integration_context_with_retries(integration_context)
+
+            async def read_events() -> None:
+                async for event in stream.fetch_event(
+                        first_fetch_time=first_fetch_time, initial_offset=offset, event_type=event_type,
+                        sock_read=sock_read
+                ):
+                    await events.put(event)
+
+            producer = create_task(read_events())
+            while not (producer.done() and events.empty()):
+                try:
+                    event = await wait_for(events.get(), timeout=batch.time_left())
+                except TimeoutError:
+                    batch.flush()
+                    continue
+                batch.add(event)
+                if batch.is_ready():
+                    batch.flush()
+            batch.flush()
+            # raise the stream error, if any
+            producer.result()
     except Exception as e:
         demisto.error(f'An error occurred in the long running loop: {e}')
     finally:
-        # store latest fetched event offset in case the loop crashes and we did not store it
-        set_to_integration_context_with_retries({'offset': offset_to_store})
+        if producer:
+            producer.cancel()
+        try:
+            # create the incidents of events already read from the stream
+            batch.flush()
+        except Exception as e:
+            demisto.error(f'Failed creating the last incidents batch: {e}')
+        # store latest created event offset in case the loop crashes and we did not store it
+        set_to_integration_context_with_retries({'offset': batch.offset})
 
 
 async def test_module(base_url: str, client_id: str, client_secret: str, verify_ssl: bool, proxy: bool) -> None:
@@ -603,6 +715,10 @@ def main():
     if not re.match(r'^[A-Za-z0-9]{0,32}$', app_id):
         raise ValueError('App ID is invalid: Must be a max. of 32 alphanumeric characters (a-z, A-Z, 0-9).')
     sock_read = int(params.get('sock_read_timeout', 120))
+    batch_size = int(params.get('incidents_batch_size') or 50)
+    batch_latency = float(params.get('incidents_batch_latency') or 1)
+    if batch_size < 1 or batch_latency <= 0:
+        raise ValueError('Incidents batch size and maximal batch latency must be positive numbers.')
 
     stream = EventStream(base_url=base_url, app_id=app_id, verify_ssl=verify_ssl, proxy=proxy)
 
@@ -614,7 +730,7 @@ def main():
         elif demisto.command() == 'long-running-execution':
             run(long_running_loop(
                 base_url, client_id, client_secret, stream, offset, event_type, verify_ssl, proxy, incident_type,
-                first_fetch_time, store_samples, sock_read
+                first_fetch_time, store_samples, sock_read, batch_size, batch_latency
             ))
         elif demisto.command() == 'fetch-incidents':
             fetch_samples()
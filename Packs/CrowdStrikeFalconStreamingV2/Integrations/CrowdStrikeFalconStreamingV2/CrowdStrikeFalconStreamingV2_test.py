@@ -1,9 +1,13 @@
 import json
+from asyncio import sleep
+from contextlib import asynccontextmanager
+from datetime import datetime
 
 from pytest import mark
 
 import demistomock as demisto
-from CrowdStrikeFalconStreamingV2 import (get_sample_events,
+import CrowdStrikeFalconStreamingV2
+from CrowdStrikeFalconStreamingV2 import (get_sample_events, long_running_loop,
                                           merge_integration_context)
 
 
@@ -169,3 +173,93 @@ def test_merge_integration_context(mocker, current_integration_context, updated_
     else:
         # Case C
         assert not demisto.setIntegrationContext.called
+
+
+class MockStream:
+    """Simulated event stream, yielding events with the given offsets and sleeping for the given delays."""
+    def __init__(self, events, error=None):
+        self.events = events
+        self.error = error
+
+    def set_refresh_token(self, refresh_token):
+        pass
+
+    async def fetch_event(self, first_fetch_time, initial_offset, event_type, sock_read):
+        for offset, delay in self.events:
+            await sleep(delay)
+            yield {'metadata': {'eventType': 'DetectionSummaryEvent', 'offset': offset, 'eventCreationTime': 0}}
+        if self.error:
+            raise self.error
+
+
+@asynccontextmanager
+async def mock_init_refresh_token(*args):
+    yield None
+
+
+def mock_long_running_environment(mocker, create_incidents_side_effect=None):
+    integration_context = {}
+    checkpoints = []
+
+    def set_to_integration_context_with_retries(context, *args, **kwargs):
+        checkpoints.append(context['offset'])
+        integration_context.update(context)
+
+    mocker.patch.object(CrowdStrikeFalconStreamingV2, 'init_refresh_token', side_effect=mock_init_refresh_token)
+    mocker.patch.object(CrowdStrikeFalconStreamingV2, 'get_integration_context',
+                        side_effect=lambda: dict(integration_context))
+    mocker.patch.object(CrowdStrikeFalconStreamingV2, 'set_to_integration_context_with_retries',
+                        side_effect=set_to_integration_context_with_retries)
+    mocker.patch.object(demisto, 'createIncidents', side_effect=create_incidents_side_effect)
+    mocker.patch.object(demisto, 'error')
+    return checkpoints
+
+
+@mark.asyncio
+async def test_long_running_loop_batches(mocker):
+    """
+    Given:
+     - A stream of 5 events arriving at once, followed by an event arriving after the batch latency.
+     - Incidents batch size of 2.
+
+    When:
+     - Running the long running loop.
+
+    Then:
+     - Ensure incidents are created in batches of up to 2 incidents, including the last partial batch.
+     - Ensure the offset is checkpointed once per batch, after the batch is created.
+    """
+    stream = MockStream([(0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (5, 0.3)])
+    checkpoints = mock_long_running_environment(mocker)
+    await long_running_loop('', '', '', stream, 0, '', False, False, 'type', datetime.now(), batch_size=2, batch_latency=0.1)
+    batches = [[incident['name'] for incident in call[0][0]] for call in demisto.createIncidents.call_args_list]
+    assert batches == [
+        ['DetectionSummaryEvent - offset 0', 'DetectionSummaryEvent - offset 1'],
+        ['DetectionSummaryEvent - offset 2', 'DetectionSummaryEvent - offset 3'],
+        ['DetectionSummaryEvent - offset 4'],
+        ['DetectionSummaryEvent - offset 5'],
+    ]
+    # the last checkpoint is the one stored when the loop exits
+    assert checkpoints == [2, 4, 5, 6, 6]
+
+
+@mark.asyncio
+async def test_long_running_loop_crash_does_not_skip_events(mocker):
+    """
+    Given:
+     - A stream of 3 events.
+     - Incident creation failing for the second batch.
+
+    When:
+     - Running the long running loop.
+
+    Then:
+     - Ensure the offset stored is the one of the last created batch, so the failed batch events are fetched again.
+    """
+    stream = MockStream([(0, 0), (1, 0), (2, 0)])
+    checkpoints = mock_long_running_environment(
+        mocker, create_incidents_side_effect=[None, Exception('error'), Exception('error')]
+    )
+    await long_running_loop('', '', '', stream, 0, '', False, False, 'type', datetime.now(), batch_size=2, batch_latency=5)
+    assert demisto.createIncidents.call_count == 3
+    assert checkpoints == [2, 2]
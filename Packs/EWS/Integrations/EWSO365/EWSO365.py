@@ -64,6 +64,8 @@ warnings.filterwarnings("ignore")
 APP_NAME = "ms-ews-o365"
 FOLDER_ID_LEN = 120
 MAX_INCIDENTS_PER_FETCH = 50
+FETCH_ID_PAGE_SIZE = 100
+SEARCH_MAX_WORKERS = 4
 
 # move results
 MOVED_TO_MAILBOX = "movedToMailbox"
@@ -1161,13 +1163,14 @@ def search_items_in_mailbox(
         selected_fields="all",
 ):
     """
-    Search items in mailbox
+    Search items in mailboxes. The folders of all the mailboxes are searched concurrently until limit items
+    were found, and the results are sorted by their received time, newest first.
     :param client: EWS Client
     :param (Optional) query: query to execute
     :param (Optional) message_id: message ids to search
     :param (Optional) folder_path: folder path to search
     :param (Optional) limit: max amount of items to fetch
-    :param (Optional) target_mailbox: mailbox containing the items
+    :param (Optional) target_mailbox: comma separated list of mailboxes containing the items
     :param (Optional) is_public: is the targeted folder public
     :param (Optional) selected_fields: Selected fields
     :return: Output tuple
@@ -1178,17 +1181,8 @@ def search_items_in_mailbox(
     if message_id and message_id[0] != "<" and message_id[-1] != ">":
         message_id = "<{}>".format(message_id)
 
-    account = client.get_account(target_mailbox)
+    mailboxes = argToList(target_mailbox) or [None]
     limit = int(limit)
-    if folder_path.lower() == "inbox":
-        folders = [account.inbox]
-    elif folder_path:
-        is_public = client.is_default_folder(folder_path, is_public)
-        folders = [client.get_folder_by_path(folder_path, account, is_public)]
-    else:
-        folders = account.inbox.parent.walk()  # pylint: disable=E1101
-
-    items = []  # type: ignore
     selected_all_fields = selected_fields == "all"
 
     if selected_all_fields:
@@ -1196,19 +1190,35 @@ def search_items_in_mailbox(
     else:
         restricted_fields = set(argToList(selected_fields))  # type: ignore
         restricted_fields.update(["id", "message_id"])  # type: ignore
+    # the received time is needed to sort the results of the different folders
+    query_fields = set(restricted_fields) | {"datetime_received"}
+
+    def get_account_folders(mailbox):
+        account = client.get_account(mailbox)
+        if folder_path.lower() == "inbox":
+            folders = [account.inbox]
+        elif folder_path:
+            is_public_folder = client.is_default_folder(folder_path, is_public)
+            folders = [client.get_folder_by_path(folder_path, account, is_public_folder)]
+        else:
+            folders = account.inbox.parent.walk()  # pylint: disable=E1101
+        return [(account, folder) for folder in folders if Message in folder.supported_item_models]
 
-    for folder in folders:
-        if Message not in folder.supported_item_models:
-            continue
+    def search_folder(account_folder):
+        account, folder = account_folder
         if query:
-            items_qs = folder.filter(query).only(*restricted_fields)
+            items_qs = folder.filter(query)
         else:
-            items_qs = folder.filter(message_id=message_id).only(*restricted_fields)
-        items += get_limited_number_of_messages_from_qs(items_qs, limit)
-        if len(items) >= limit:
-            break
+            items_qs = folder.filter(message_id=message_id)
+        # newest first, so that the items taken from each folder are its newest ones
+        items_qs = items_qs.only(*query_fields).order_by("-datetime_received")
+        return [(account, item) for item in get_limited_number_of_messages_from_qs(items_qs, limit)]
+
+    # the accounts and folders are resolved on the main thread, only the folder searches run in the thread pool
+    account_folders = [account_folder for mailbox in mailboxes for account_folder in get_account_folders(mailbox)]
+    items = collect_concurrently(search_folder, account_folders, limit, max_workers=SEARCH_MAX_WORKERS,
+                                 sort_key=lambda account_item: account_item[1].datetime_received, reverse=True)
 
-    items = items[:limit]
     searched_items_result = [
         parse_item_as_dict(
             item,
@@ -1216,7 +1226,7 @@ def search_items_in_mailbox(
             camel_case=True,
             compact_fields=selected_all_fields,
         )
-        for item in items
+        for account, item in items
     ]
 
     if not selected_all_fields:
@@ -2179,30 +2189,42 @@ def fetch_last_emails(
         client: EWSClient, folder_name="Inbox", since_datetime=None, exclude_ids=None
 ):
     """
-    Fetches last emails
+    Fetches last emails in two phases. First, only the item ids, message ids and received times are paged
+    through and deduped against exclude_ids, then a bulk GetItem is sent for the first max_fetch new emails.
     :param client: EWS client
     :param (Optional) folder_name: folder name to pull from
     :param (Optional) since_datetime: items will be searched after this datetime
     :param (Optional) exclude_ids: exclude ids from fetch
     :return: list of exchangelib.Items
     """
-    qs = client.get_folder_by_path(folder_name, is_public=client.is_public_folder)
+    folder = client.get_folder_by_path(folder_name, is_public=client.is_public_folder)
     if since_datetime:
-        qs = qs.filter(datetime_received__gte=since_datetime)
+        qs = folder.filter(datetime_received__gte=since_datetime)
     else:
         last_10_min = EWSDateTime.now(tz=EWSTimeZone.timezone("UTC")) - timedelta(
             minutes=10
         )
-        qs = qs.filter(last_modified_time__gte=last_10_min)
-    qs = qs.filter().only(*[x.name for x in Message.FIELDS])
+        qs = folder.filter(last_modified_time__gte=last_10_min)
+    qs = qs.filter().only("message_id", "datetime_received")
     qs = qs.filter().order_by("datetime_received")
+    qs.page_size = FETCH_ID_PAGE_SIZE
+
+    exclude_ids = set(exclude_ids or [])
+    item_ids = []
+    for item in qs.iterator():
+        if not isinstance(item, Message) or not item.message_id or item.message_id in exclude_ids:
+            continue
+        item_ids.append((item.id, item.changekey))
+        if len(item_ids) >= client.max_fetch:
+            break
 
-    result = qs.all()
-    result = [x for x in result if isinstance(x, Message)]
-    if exclude_ids and len(exclude_ids) > 0:
-        exclude_ids = set(exclude_ids)
-        result = [x for x in result if x.message_id not in exclude_ids]
-    return result
+    if not item_ids:
+        return []
+    account = client.get_account()
+    result = account.fetch(
+        ids=item_ids, folder=folder, only_fields=[x.name for x in Message.FIELDS]
+    )
+    return [x for x in result if isinstance(x, Message)]
 
 
 def test_module(client: EWSClient, max_fetch):
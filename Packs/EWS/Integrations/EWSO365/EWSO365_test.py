@@ -1,5 +1,6 @@
 import base64
 import json
+import threading
 import pytest
 
 from EWSO365 import (
@@ -11,6 +12,8 @@ from EWSO365 import (
     add_additional_headers,
     handle_transient_files,
     handle_html,
+    fetch_last_emails,
+    search_items_in_mailbox,
 )
 
 with open("test_data/commands_outputs.json", "r") as f:
@@ -258,3 +261,169 @@ def test_handle_html(mocker, html_input, expected_output):
     import EWSO365 as ewso365
     mocker.patch.object(ewso365, 'random_word_generator', return_value='abcd1234')
     assert handle_html(html_input) == expected_output
+
+
+class MockQuerySet:
+    def __init__(self, items):
+        self.items = items
+        self.consumed = 0
+        self.only_fields = None
+        self.page_size = None
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def only(self, *fields):
+        self.only_fields = fields
+        return self
+
+    def order_by(self, *fields):
+        return self
+
+    def iterator(self):
+        for item in self.items:
+            self.consumed += 1
+            yield item
+
+
+class MockAccount:
+    def __init__(self):
+        self.fetched_ids = []
+
+    def fetch(self, ids, folder=None, only_fields=None, chunk_size=None):
+        from exchangelib.items import Message
+        self.fetched_ids.extend(ids)
+        return [Message(id=item_id, changekey=changekey, message_id=f"<{item_id}>") for item_id, changekey in ids]
+
+
+class MockFetchClient:
+    def __init__(self, items, max_fetch):
+        self.qs = MockQuerySet(items)
+        self.account = MockAccount()
+        self.max_fetch = max_fetch
+        self.is_public_folder = False
+
+    def get_folder_by_path(self, path, account=None, is_public=False):
+        return self.qs
+
+    def get_account(self, target_mailbox=None, access_type=None):
+        return self.account
+
+
+def test_fetch_last_emails_only_gets_new_emails():
+    """
+    Given:
+        - A folder with 200 emails, 2 of them already fetched in the last run
+    When:
+        - Fetching the last emails with max_fetch of 5
+    Then:
+        - Only the lightweight fields are requested while paging the folder
+        - Paging stops as soon as 5 new emails are found
+        - Only the 5 new emails are requested with a GetItem call
+    """
+    from exchangelib.items import Message
+    items = [Message(id=f"id{i}", changekey=f"ck{i}", message_id=f"<id{i}>") for i in range(200)]
+    client = MockFetchClient(items, max_fetch=5)
+
+    emails = fetch_last_emails(client, "Inbox", "2021-01-01T00:00:00Z", exclude_ids=["<id0>", "<id2>"])
+
+    assert client.qs.only_fields == ("message_id", "datetime_received")
+    assert client.qs.consumed == 7
+    assert client.account.fetched_ids == [("id1", "ck1"), ("id3", "ck3"), ("id4", "ck4"), ("id5", "ck5"), ("id6", "ck6")]
+    assert [email.message_id for email in emails] == ["<id1>", "<id3>", "<id4>", "<id5>", "<id6>"]
+
+
+def test_fetch_last_emails_no_new_emails():
+    """
+    Given:
+        - A folder where all the emails were already fetched in the last run
+    When:
+        - Fetching the last emails
+    Then:
+        - No GetItem call is made
+    """
+    from exchangelib.items import Message
+    items = [Message(id="id0", changekey="ck0", message_id="<id0>")]
+    client = MockFetchClient(items, max_fetch=5)
+
+    assert fetch_last_emails(client, "Inbox", "2021-01-01T00:00:00Z", exclude_ids=["<id0>"]) == []
+    assert client.account.fetched_ids == []
+
+
+class MockSearchFolder:
+    def __init__(self, items):
+        from exchangelib.items import Message
+        self.items = items
+        self.supported_item_models = [Message]
+        self.only_fields = None
+        self.ordering = None
+
+    def filter(self, *args, **kwargs):
+        return self
+
+    def only(self, *fields):
+        self.only_fields = fields
+        return self
+
+    def order_by(self, *fields):
+        self.ordering = fields
+        return self
+
+    def __iter__(self):
+        return iter(sorted(self.items, key=lambda item: item.datetime_received, reverse=True))
+
+
+class MockSearchAccount:
+    def __init__(self, primary_smtp_address, folders):
+        self.primary_smtp_address = primary_smtp_address
+        self.inbox = self
+        self.parent = self
+        self.folders = folders
+
+    def walk(self):
+        return self.folders
+
+
+class MockSearchClient:
+    def __init__(self, accounts):
+        self.accounts = accounts
+        self.account_threads = []
+
+    def get_account(self, target_mailbox=None):
+        self.account_threads.append(threading.current_thread())
+        return self.accounts[target_mailbox]
+
+
+def test_search_items_in_mailboxes():
+    """
+    Given:
+        - Two mailboxes with two folders each
+    When:
+        - Searching all the folders of both mailboxes with a limit of 3
+    Then:
+        - The accounts are resolved on the main thread
+        - Only the selected fields and the received time are requested, newest first
+        - The search stops at the folder in which 3 items were found, and the items are sorted newest first
+    """
+    from exchangelib import EWSDateTime, EWSTimeZone
+    from exchangelib.items import Message
+
+    def message(item_id, day):
+        return Message(id=item_id, message_id=f"<{item_id}>", subject=item_id,
+                       datetime_received=EWSDateTime(2021, 1, day, tzinfo=EWSTimeZone("UTC")))
+
+    folders = {
+        "a@test.com": [MockSearchFolder([message("a1", 1), message("a5", 5)]), MockSearchFolder([message("a3", 3)])],
+        "b@test.com": [MockSearchFolder([message("b2", 2)]), MockSearchFolder([message("b4", 4), message("b6", 6)])],
+    }
+    client = MockSearchClient({mailbox: MockSearchAccount(mailbox, mailbox_folders)
+                               for mailbox, mailbox_folders in folders.items()})
+
+    _, _, results = search_items_in_mailbox(client, query="subject:test", limit=3, target_mailbox="a@test.com,b@test.com",
+                                            selected_fields="subject")
+
+    assert client.account_threads == [threading.main_thread()] * 2
+    folder = folders["a@test.com"][0]
+    assert set(folder.only_fields) == {"subject", "id", "message_id", "datetime_received"}
+    assert folder.ordering == ("-datetime_received",)
+    assert [(result["itemId"], result["subject"]) for result in results] == [("a5", "a5"), ("a3", "a3"), ("a1", "a1")]
@@ -106,6 +106,7 @@ SERVER_BUILD = ""
 MARK_AS_READ = demisto.params().get('markAsRead', False)
 MAX_FETCH = min(50, int(demisto.params().get('maxFetch', 50)))
 LAST_RUN_IDS_QUEUE_SIZE = 500
+SEARCH_MAX_WORKERS = 4
 
 START_COMPLIANCE = """
 [CmdletBinding()]
@@ -1507,17 +1508,8 @@ def search_items_in_mailbox(query=None, message_id=None, folder_path='', limit=1
     if message_id and message_id[0] != '<' and message_id[-1] != '>':
         message_id = '<{}>'.format(message_id)
 
-    account = get_account(target_mailbox or ACCOUNT_EMAIL)
+    mailboxes = argToList(target_mailbox) or [ACCOUNT_EMAIL]
     limit = int(limit)
-    if folder_path.lower() == 'inbox':
-        folders = [account.inbox]
-    elif folder_path:
-        is_public = is_default_folder(folder_path, is_public)
-        folders = [get_folder_by_path(account, folder_path, is_public)]
-    else:
-        folders = account.inbox.parent.walk()  # pylint: disable=E1101
-
-    items = []  # type: ignore
     selected_all_fields = (selected_fields == 'all')
 
     if selected_all_fields:
@@ -1525,22 +1517,38 @@ def search_items_in_mailbox(query=None, message_id=None, folder_path='', limit=1
     else:
         restricted_fields = set(argToList(selected_fields))  # type: ignore
         restricted_fields.update(['id', 'message_id'])  # type: ignore
+    # the received time is needed to sort the results of the different folders
+    query_fields = set(restricted_fields) | {'datetime_received'}
+
+    def get_account_folders(mailbox):
+        account = get_account(mailbox)
+        if folder_path.lower() == 'inbox':
+            folders = [account.inbox]
+        elif folder_path:
+            is_public_folder = is_default_folder(folder_path, is_public)
+            folders = [get_folder_by_path(account, folder_path, is_public_folder)]
+        else:
+            folders = account.inbox.parent.walk()  # pylint: disable=E1101
+        return [(account, folder) for folder in folders if Message in folder.supported_item_models]
 
-    for folder in folders:
-        if Message not in folder.supported_item_models:
-            continue
+    def search_folder(account_folder):
+        account, folder = account_folder
         if query:
-            items_qs = folder.filter(query).only(*restricted_fields)
+            items_qs = folder.filter(query)
         else:
-            items_qs = folder.filter(message_id=message_id).only(*restricted_fields)
-        items += get_limited_number_of_messages_from_qs(items_qs, limit)
-        if len(items) >= limit:
-            break
-
-    items = items[:limit]
-    searched_items_result = map(
-        lambda item: parse_item_as_dict(item, account.primary_smtp_address, camel_case=True,
-                                        compact_fields=selected_all_fields), items)
+            items_qs = folder.filter(message_id=message_id)
+        # newest first, so that the items taken from each folder are its newest ones
+        items_qs = items_qs.only(*query_fields).order_by('-datetime_received')
+        return [(account, item) for item in get_limited_number_of_messages_from_qs(items_qs, limit)]
+
+    # get_account uses the integration context, so the accounts and folders are resolved on the main thread
+    # and only the folder searches run in the thread pool
+    account_folders = [account_folder for mailbox in mailboxes for account_folder in get_account_folders(mailbox)]
+    items = collect_concurrently(search_folder, account_folders, limit, max_workers=SEARCH_MAX_WORKERS,
+                                 sort_key=lambda account_item: account_item[1].datetime_received, reverse=True)
+
+    searched_items_result = [parse_item_as_dict(item, account.primary_smtp_address, camel_case=True,
+                                                compact_fields=selected_all_fields) for account, item in items]
 
     if not selected_all_fields:
         searched_items_result = [
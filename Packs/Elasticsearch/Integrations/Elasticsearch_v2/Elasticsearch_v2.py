@@ -43,6 +43,9 @@ FETCH_INDEX = demisto.params().get('fetch_index', '')
 FETCH_QUERY = demisto.params().get('fetch_query', '')
 FETCH_TIME = demisto.params().get('fetch_time', '3 days')
 FETCH_SIZE = int(demisto.params().get('fetch_size', 50))
+FETCH_MAX_PAGES = int(demisto.params().get('fetch_max_pages') or 1)
+TIEBREAKER_FIELD = demisto.params().get('tiebreaker_field')
+PIT_KEEP_ALIVE = '1m'
 INSECURE = not demisto.params().get('insecure', False)
 TIME_METHOD = demisto.params().get('time_method', 'Simple-Date')
 
@@ -210,6 +213,92 @@ def get_total_results(response_dict):
     return total_dict, total_results
 
 
+def parse_search_after(search_after):
+    """Parses the sort values of the last hit of a previous page into a search_after cursor.
+
+    Args:
+        search_after(str/list): a JSON list (e.g. [1572502640000, "doc_id"]) or a comma separated list of values.
+
+    Returns:
+        (list).The search_after cursor, or None if no cursor was given.
+    """
+    if not search_after:
+        return None
+
+    if isinstance(search_after, list):
+        return search_after
+
+    try:
+        cursor = json.loads(search_after)
+
+    except ValueError:
+        cursor = argToList(search_after)
+
+    return cursor if isinstance(cursor, list) else [cursor]
+
+
+def open_point_in_time(es, index, keep_alive=PIT_KEEP_ALIVE):
+    """Opens a point in time (PIT) on the given index, when both the client and the server support it.
+
+    Notes:
+        Point in time is only available from Elasticsearch 7.10, for older servers the search_after paging is done
+        without it.
+
+    Args:
+        es(Elasticsearch): an Elasticsearch object.
+        index(str): the index (or CSV of indexes) to open the point in time on.
+        keep_alive(str): how long to keep the point in time alive between requests, e.g. 1m.
+
+    Returns:
+        (str).The point in time ID, or None if a point in time could not be opened.
+    """
+    if not hasattr(es, 'open_point_in_time'):
+        return None
+
+    try:
+        return es.open_point_in_time(index=index, keep_alive=keep_alive).get('id')
+
+    except Exception as e:
+        demisto.debug('Could not open a point in time on {}, paging without it: {}'.format(index, str(e)))
+        return None
+
+
+def close_point_in_time(es, pit_id):
+    """Closes a point in time, failing silently as an unclosed point in time expires by itself.
+
+    Args:
+        es(Elasticsearch): an Elasticsearch object.
+        pit_id(str): the point in time ID.
+    """
+    if not pit_id:
+        return
+
+    try:
+        es.close_point_in_time(body={'id': pit_id})
+
+    except Exception as e:
+        demisto.debug('Could not close point in time: {}'.format(str(e)))
+
+
+def get_tiebreaker(pit_id=None):
+    """Returns the field to break ties between hits with the same sort value when paging with search_after.
+
+    Notes:
+        Sorting on _id is deprecated in Elasticsearch 7 and disabled by default in Elasticsearch 8, so it is never
+        used implicitly. Inside a point in time the _shard_doc field is used, outside of one a field must be configured.
+
+    Args:
+        pit_id(str): the point in time the search is performed in, if any.
+
+    Returns:
+        (str).The tiebreaker field, or None if there is no tiebreaker to page with.
+    """
+    if TIEBREAKER_FIELD:
+        return TIEBREAKER_FIELD
+
+    return '_shard_doc' if pit_id else None
+
+
 def search_command(proxies):
     """Performs a search in Elasticsearch."""
     index = demisto.args().get('index')
@@ -220,11 +309,31 @@ def search_command(proxies):
     size = int(demisto.args().get('size'))
     sort_field = demisto.args().get('sort-field')
     sort_order = demisto.args().get('sort-order')
+    search_after = parse_search_after(demisto.args().get('search_after'))
+    pit_id = demisto.args().get('pit_id')
+    pit_keep_alive = demisto.args().get('pit_keep_alive')
 
     es = elasticsearch_builder(proxies)
 
+    if pit_keep_alive and not pit_id:
+        pit_id = open_point_in_time(es, index, pit_keep_alive)
+
     que = QueryString(query=query)
-    search = Search(using=es, index=index).query(que)[base_page:base_page + size]
+    if pit_id:
+        # a search over a point in time must not specify the index
+        search = Search(using=es).query(que).extra(pit={'id': pit_id, 'keep_alive': pit_keep_alive or PIT_KEEP_ALIVE})
+
+    else:
+        search = Search(using=es, index=index).query(que)
+
+    cursor_paging = search_after is not None or bool(pit_id)
+    if cursor_paging:
+        # search_after pages are always read from the start of the cursor
+        base_page = 0
+        if search_after is not None:
+            search = search.extra(search_after=search_after)
+
+    search = search[base_page:base_page + size]
     if explain:
         # if 'explain parameter is set to 'true' - adds explanation section to search results
         search = search.extra(explain=True)
@@ -233,14 +342,29 @@ def search_command(proxies):
         fields = fields.split(',')
         search = search.source(fields)
 
+    sort = []
     if sort_field is not None:
-        search = search.sort({sort_field: {'order': sort_order}})
+        sort.append({sort_field: {'order': sort_order}})
+
+    tiebreaker = get_tiebreaker(pit_id) if cursor_paging else None
+    if tiebreaker:
+        # search_after requires a unique sort, so documents sharing a sort value are not skipped between pages
+        sort.append({tiebreaker: {'order': sort_order or 'asc'}})
+
+    if sort:
+        search = search.sort(*sort)
 
     response = search.execute().to_dict()
 
     total_dict, total_results = get_total_results(response)
     search_context, meta_headers, hit_tables, hit_headers = results_to_context(index, query, base_page,
                                                                                size, total_dict, response)
+    if cursor_paging:
+        hits = response.get('hits', {}).get('hits') or []
+        search_context['SearchAfter'] = hits[-1].get('sort') if hits else search_after
+        search_context['PitId'] = response.get('pit_id', pit_id)
+        meta_headers.extend(['SearchAfter', 'PitId'])
+
     search_human_readable = tableToMarkdown('Search Metadata:', search_context, meta_headers, removeNull=True)
     hits_human_readable = tableToMarkdown('Hits:', hit_tables, hit_headers, removeNull=True)
     total_human_readable = search_human_readable + '\n' + hits_human_readable
@@ -470,13 +594,15 @@ def incident_label_maker(source):
     return labels
 
 
-def results_to_incidents_timestamp(response, last_fetch):
+def results_to_incidents_timestamp(response, last_fetch, strict_time_filter=True):
     """Converts the current results into incidents.
 
     Args:
         response(dict): the raw search results from Elasticsearch.
         last_fetch(num): the date or timestamp of the last fetch before this fetch
         - this will hold the last date of the incident brought by this fetch.
+        strict_time_filter(bool): whether to drop hits that are not later than last_fetch. Should be False when
+        the hits were paged with search_after, as hits sharing the last fetch time were not fetched yet.
 
     Returns:
         (list).The incidents.
@@ -494,7 +620,7 @@ def results_to_incidents_timestamp(response, last_fetch):
                 last_fetch = hit_timestamp
 
             # avoid duplication due to weak time query
-            if hit_timestamp > current_fetch:
+            if hit_timestamp > current_fetch or not strict_time_filter:
                 inc = {
                     'name': 'Elasticsearch: Index: ' + str(hit.get('_index')) + ", ID: " + str(hit.get('_id')),
                     'rawJSON': json.dumps(hit),
@@ -506,13 +632,15 @@ def results_to_incidents_timestamp(response, last_fetch):
     return incidents, last_fetch
 
 
-def results_to_incidents_datetime(response, last_fetch):
+def results_to_incidents_datetime(response, last_fetch, strict_time_filter=True):
     """Converts the current results into incidents.
 
     Args:
         response(dict): the raw search results from Elasticsearch.
         last_fetch(datetime): the date or timestamp of the last fetch before this fetch
         - this will hold the last date of the incident brought by this fetch.
+        strict_time_filter(bool): whether to drop hits that are not later than last_fetch. Should be False when
+        the hits were paged with search_after, as hits sharing the last fetch time were not fetched yet.
 
     Returns:
         (list).The incidents.
@@ -532,7 +660,7 @@ def results_to_incidents_datetime(response, last_fetch):
                 last_fetch_timestamp = hit_timestamp
 
             # avoid duplication due to weak time query
-            if hit_timestamp > current_fetch:
+            if hit_timestamp > current_fetch or not strict_time_filter:
                 inc = {
                     'name': 'Elasticsearch: Index: ' + str(hit.get('_index')) + ", ID: " + str(hit.get('_id')),
                     'rawJSON': json.dumps(hit),
@@ -593,27 +721,90 @@ def fetch_incidents(proxies):
     es = elasticsearch_builder(proxies)
 
     query = QueryString(query=FETCH_QUERY + " AND " + TIME_FIELD + ":*")
+    # the sort values of the last fetched hit - hits sharing its time are paged with search_after and not dropped.
+    # only kept across fetches for a configured tiebreaker, as _shard_doc values are bound to their point in time.
+    sort_cursor = last_run.get('sort') if TIEBREAKER_FIELD else None
     # Elastic search can use epoch timestamps (in milliseconds) as date representation regardless of date format.
-    search = Search(using=es, index=FETCH_INDEX).filter({'range': {TIME_FIELD: {'gt': last_fetch_timestamp}}})
-    search = search.sort({TIME_FIELD: {'order': 'asc'}})[0:FETCH_SIZE].query(query)
-    response = search.execute().to_dict()
-    _, total_results = get_total_results(response)
+    time_range = {'gte': last_fetch_timestamp} if sort_cursor else {'gt': last_fetch_timestamp}
 
+    pit_id = open_point_in_time(es, FETCH_INDEX) if FETCH_MAX_PAGES > 1 else None
+    # without a tiebreaker the fetch is a single page sorted by the time field only, as before paging was added
+    tiebreaker = get_tiebreaker(pit_id)
     incidents = []  # type: List
+    try:
+        for _ in range(FETCH_MAX_PAGES if tiebreaker else 1):
+            search = fetch_search_builder(es, query, time_range, sort_cursor, tiebreaker, pit_id)
+            response = search.execute().to_dict()
+            pit_id = response.get('pit_id', pit_id)
+            hits = response.get('hits', {}).get('hits') or []
+            if not hits:
+                break
+
+            if 'Timestamp' in TIME_METHOD:
+                page_incidents, last_fetch = results_to_incidents_timestamp(response, last_fetch,
+                                                                            strict_time_filter=not sort_cursor)
 
-    if total_results > 0:
+            else:
+                page_incidents, last_fetch = results_to_incidents_datetime(response, last_fetch,
+                                                                           strict_time_filter=not sort_cursor)
+                last_fetch = parse(last_fetch)
+
+            incidents.extend(page_incidents)
+            sort_cursor = hits[-1].get('sort')
+            if len(hits) < FETCH_SIZE:
+                break
+
+    finally:
+        close_point_in_time(es, pit_id)
+
+    if incidents:
         if 'Timestamp' in TIME_METHOD:
-            incidents, last_fetch = results_to_incidents_timestamp(response, last_fetch)
-            demisto.setLastRun({'time': last_fetch})
+            next_run = {'time': last_fetch}
 
         else:
-            incidents, last_fetch = results_to_incidents_datetime(response, last_fetch)
-            demisto.setLastRun({'time': str(last_fetch)})
+            next_run = {'time': format_to_iso(last_fetch.isoformat())}
+
+        if TIEBREAKER_FIELD:
+            next_run['sort'] = sort_cursor
+
+        demisto.setLastRun(next_run)
 
         demisto.info('extract {} incidents'.format(len(incidents)))
     demisto.incidents(incidents)
 
 
+def fetch_search_builder(es, query, time_range, sort_cursor, tiebreaker=None, pit_id=None):
+    """Builds the search for a single page of the fetch.
+
+    Args:
+        es(Elasticsearch): an Elasticsearch object.
+        query(QueryString): the fetch query.
+        time_range(dict): the range filter on the time field.
+        sort_cursor(list): the sort values of the last fetched hit, None on the first fetch.
+        tiebreaker(str): the field to break ties on the time field with, None to sort by the time field only.
+        pit_id(str): a point in time to search in, if one was opened.
+
+    Returns:
+        (Search).The search for the next page of the fetch.
+    """
+    if pit_id:
+        search = Search(using=es).extra(pit={'id': pit_id, 'keep_alive': PIT_KEEP_ALIVE})
+
+    else:
+        search = Search(using=es, index=FETCH_INDEX)
+
+    search = search.filter({'range': {TIME_FIELD: time_range}})
+    sort = [{TIME_FIELD: {'order': 'asc'}}]
+    if tiebreaker:
+        sort.append({tiebreaker: {'order': 'asc'}})
+
+    search = search.sort(*sort)
+    if sort_cursor:
+        search = search.extra(search_after=sort_cursor)
+
+    return search[0:FETCH_SIZE].query(query)
+
+
 def parse_subtree(my_map):
     """
     param: my_map - tree element for the schema
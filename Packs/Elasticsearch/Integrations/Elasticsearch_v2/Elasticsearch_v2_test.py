@@ -614,6 +614,154 @@ def test_elasticsearch_parse_subtree():
     assert str(sub_tree) == str(MOCK_ES7_SCHEMA_OUTPUT)
 
 
+def _timestamp_hit(doc_id, timestamp):
+    return {'_index': 'customer', '_type': 'doc', '_id': doc_id, '_score': None,
+            '_source': {'Date': str(timestamp)}, 'sort': [timestamp, doc_id]}
+
+
+def _hits_response(hits):
+    return {'took': 1, 'timed_out': False, 'hits': {'total': {'value': len(hits), 'relation': 'eq'},
+                                                    'max_score': None, 'hits': hits}}
+
+
+@patch("Elasticsearch_v2.TIME_METHOD", 'Timestamp-Seconds')
+@patch("Elasticsearch_v2.TIME_FIELD", 'Date')
+@patch("Elasticsearch_v2.FETCH_INDEX", "customer")
+@patch("Elasticsearch_v2.FETCH_QUERY", "*")
+@patch("Elasticsearch_v2.FETCH_SIZE", 2)
+@patch("Elasticsearch_v2.FETCH_MAX_PAGES", 3)
+def test_fetch_incidents_search_after_pages(mocker):
+    """
+    Given:
+        - A backlog of 3 hits, two of them sharing the same timestamp across a page boundary.
+    When:
+        - Fetching incidents with a page size of 2 and up to 3 pages per fetch.
+    Then:
+        - All the hits are fetched in a single cycle, sorted with the _shard_doc tiebreaker of the point in time,
+          and the pages after the first use the sort cursor of the previous page.
+        - The cursor is not saved to the last run, as it is bound to the point in time.
+    """
+    import Elasticsearch_v2
+    from elasticsearch_dsl import Search
+    pages = [
+        _hits_response([_timestamp_hit('1', 1572502634), _timestamp_hit('2', 1572502640)]),
+        _hits_response([_timestamp_hit('3', 1572502640)]),
+    ]
+    requests_sent = []
+
+    def execute(search):
+        requests_sent.append(search.to_dict())
+        return mocker.Mock(to_dict=mocker.Mock(return_value=pages[len(requests_sent) - 1]))
+
+    es = mocker.Mock()
+    es.open_point_in_time.return_value = {'id': 'pit_id'}
+    mocker.patch.object(Elasticsearch_v2, 'elasticsearch_builder', return_value=es)
+    mocker.patch.object(Search, 'execute', autospec=True, side_effect=execute)
+    mocker.patch.object(Elasticsearch_v2.demisto, 'getLastRun', return_value={'time': 1572502000})
+    set_last_run = mocker.patch.object(Elasticsearch_v2.demisto, 'setLastRun')
+    incidents = mocker.patch.object(Elasticsearch_v2.demisto, 'incidents')
+
+    Elasticsearch_v2.fetch_incidents(None)
+
+    assert len(requests_sent) == 2
+    assert 'search_after' not in requests_sent[0]
+    assert requests_sent[1]['search_after'] == [1572502640, '2']
+    assert requests_sent[1]['pit'] == {'id': 'pit_id', 'keep_alive': '1m'}
+    assert requests_sent[0]['sort'] == [{'Date': {'order': 'asc'}}, {'_shard_doc': {'order': 'asc'}}]
+    assert [inc['name'] for inc in incidents.call_args[0][0]] == [
+        'Elasticsearch: Index: customer, ID: 1',
+        'Elasticsearch: Index: customer, ID: 2',
+        'Elasticsearch: Index: customer, ID: 3',
+    ]
+    assert set_last_run.call_args[0][0] == {'time': 1572502640}
+    es.close_point_in_time.assert_called_once_with(body={'id': 'pit_id'})
+
+
+@patch("Elasticsearch_v2.TIME_METHOD", 'Timestamp-Seconds')
+@patch("Elasticsearch_v2.TIME_FIELD", 'Date')
+@patch("Elasticsearch_v2.FETCH_INDEX", "customer")
+@patch("Elasticsearch_v2.FETCH_QUERY", "*")
+@patch("Elasticsearch_v2.TIEBREAKER_FIELD", "doc_id")
+def test_fetch_incidents_resumes_from_sort_cursor(mocker):
+    """
+    Given:
+        - A configured tiebreaker field.
+        - A last run with a sort cursor.
+    When:
+        - Fetching incidents.
+    Then:
+        - Hits sharing the last fetch time are not filtered out, and the search continues after the cursor.
+    """
+    import Elasticsearch_v2
+    from elasticsearch_dsl import Search
+    requests_sent = []
+
+    def execute(search):
+        requests_sent.append(search.to_dict())
+        return mocker.Mock(to_dict=mocker.Mock(return_value=_hits_response([_timestamp_hit('3', 1572502640)])))
+
+    mocker.patch.object(Elasticsearch_v2, 'elasticsearch_builder', return_value=mocker.Mock())
+    mocker.patch.object(Search, 'execute', autospec=True, side_effect=execute)
+    mocker.patch.object(Elasticsearch_v2.demisto, 'getLastRun',
+                        return_value={'time': 1572502640, 'sort': [1572502640, '2']})
+    mocker.patch.object(Elasticsearch_v2.demisto, 'setLastRun')
+    incidents = mocker.patch.object(Elasticsearch_v2.demisto, 'incidents')
+
+    Elasticsearch_v2.fetch_incidents(None)
+
+    assert requests_sent[0]['search_after'] == [1572502640, '2']
+    assert requests_sent[0]['query']['bool']['filter'] == [{'range': {'Date': {'gte': 1572502640}}}]
+    assert requests_sent[0]['sort'] == [{'Date': {'order': 'asc'}}, {'doc_id': {'order': 'asc'}}]
+    assert len(incidents.call_args[0][0]) == 1
+
+
+@patch("Elasticsearch_v2.TIME_METHOD", 'Timestamp-Seconds')
+@patch("Elasticsearch_v2.TIME_FIELD", 'Date')
+@patch("Elasticsearch_v2.FETCH_INDEX", "customer")
+@patch("Elasticsearch_v2.FETCH_QUERY", "*")
+def test_fetch_incidents_single_page_without_tiebreaker(mocker):
+    """
+    Given:
+        - The default single page fetch, with no tiebreaker field configured.
+    When:
+        - Fetching incidents.
+    Then:
+        - The search is sorted by the time field only (no _id sort, which Elasticsearch 8 rejects), without a
+          point in time or search_after, and no cursor is saved to the last run.
+    """
+    import Elasticsearch_v2
+    from elasticsearch_dsl import Search
+    requests_sent = []
+
+    def execute(search):
+        requests_sent.append(search.to_dict())
+        return mocker.Mock(to_dict=mocker.Mock(return_value=_hits_response([_timestamp_hit('3', 1572502640)])))
+
+    es = mocker.Mock()
+    mocker.patch.object(Elasticsearch_v2, 'elasticsearch_builder', return_value=es)
+    mocker.patch.object(Search, 'execute', autospec=True, side_effect=execute)
+    mocker.patch.object(Elasticsearch_v2.demisto, 'getLastRun', return_value={'time': 1572502000})
+    set_last_run = mocker.patch.object(Elasticsearch_v2.demisto, 'setLastRun')
+    mocker.patch.object(Elasticsearch_v2.demisto, 'incidents')
+
+    Elasticsearch_v2.fetch_incidents(None)
+
+    assert len(requests_sent) == 1
+    assert requests_sent[0]['sort'] == [{'Date': {'order': 'asc'}}]
+    assert 'search_after' not in requests_sent[0]
+    assert 'pit' not in requests_sent[0]
+    assert not es.open_point_in_time.called
+    assert set_last_run.call_args[0][0] == {'time': 1572502640}
+
+
+def test_parse_search_after():
+    from Elasticsearch_v2 import parse_search_after
+    assert parse_search_after(None) is None
+    assert parse_search_after('[1572502640000, "doc_id"]') == [1572502640000, 'doc_id']
+    assert parse_search_after('1572502640000,doc_id') == ['1572502640000', 'doc_id']
+    assert parse_search_after('1572502640000') == [1572502640000]
+
+
 # This is the class we want to test
 '''
 The get-mapping-fields command perform a GET /<index name>/_mapping http command
@@ -2,7 +2,6 @@ import demistomock as demisto  # noqa
 
 from typing import Tuple, List
 from math import floor
-from functools import reduce
 
 import ExpanseGenerateIssueMapWidgetScript
 
@@ -173,22 +172,42 @@ def test_latlon_to_yx():
         assert ry <= y + 1
 
 
-def test_calc_clusters(mocker):
+def test_geolocations_to_points():
     """
     Given:
-        - list of issue coordinates
+        - list of coordinates (lat, lon)
+    When
+        - projecting all the coordinates at once
+    Then
+        - image x/y match the ones from lat_to_y/lon_to_x
+        - coordinates outside of the map are dropped
+    """
+    from ExpanseGenerateIssueMapWidgetScript import geolocations_to_points, lat_to_y, lon_to_x
+
+    geolocations = [(3.14, 14.3), (-33.9, 151.2), (40.7, -74.0), (89, 10), (51.5, 190)]
+    points = geolocations_to_points(geolocations)
+
+    assert points.tolist() == [[lon_to_x(lon), lat_to_y(lat)] for lat, lon in geolocations if lat_to_y(lat) is not None]
+    assert geolocations_to_points([]).shape == (0, 2)
+
+
+def test_calc_clusters():
+    """
+    Given:
+        - list of issue points
     When
         - calculating grouping of points in clusters
     Then
-        - points are grouped in clusters
+        - points are grouped in clusters, one per grid cell
+        - clusters are placed in the centroid of their points
     """
-    mocker.patch('ExpanseGenerateIssueMapWidgetScript.lat_to_y', side_effect=lambda y: y)
-    mocker.patch('ExpanseGenerateIssueMapWidgetScript.lon_to_x', side_effect=lambda x: x)
+    import numpy as np
 
-    points = [(0, 0), (4, 4), (300, 300), (320, 320), (280, 280)]
-    clusters = reduce(ExpanseGenerateIssueMapWidgetScript.calc_clusters, points, [])
+    points = np.array([(0, 0), (4, 4), (300, 300), (320, 320), (350, 310), (250, 250)])
+    clusters = ExpanseGenerateIssueMapWidgetScript.calc_clusters(points)
 
-    assert clusters == [[(0, 0), (4, 4)], [(300, 300), (320, 320), (280, 280)]]
+    assert clusters == [(2.0, 2.0, 2), (250.0, 250.0, 1), (970 / 3, 310.0, 3)]
+    assert ExpanseGenerateIssueMapWidgetScript.calc_clusters(np.empty((0, 2))) == []
 
 
 def test_extract_geolocation(mocker):
@@ -216,9 +235,6 @@ def test_extract_geolocation(mocker):
 
         return EXAMPLE_INCIDENT
 
-    mocker.patch('ExpanseGenerateIssueMapWidgetScript.lat_to_y', side_effect=lambda y: y)
-    mocker.patch('ExpanseGenerateIssueMapWidgetScript.lon_to_x', side_effect=lambda x: x)
-
     ec_mock = mocker.patch.object(demisto, 'executeCommand', side_effect=executeCommand)  # this keeps mypy happy
     result = ExpanseGenerateIssueMapWidgetScript.extract_geolocation("from-date", "to-date")
 
@@ -245,3 +261,22 @@ def test_generate_map_command(mocker):
     assert eg_mock.call_args[0][0] == "fake-from"
     assert eg_mock.call_args[0][1] == "fake-to"
     assert result.startswith('### Map of Open Incidents On Prem')
+
+
+def test_generate_map_command_render(mocker):
+    """
+    Given:
+        - geolocations of incidents
+    When
+        - generating the map
+    Then
+        - the map is rendered from the geolocations of the incidents
+    """
+    geolocations = [(3.14, 14.3), (40.7, -74.0)]
+    mocker.patch('ExpanseGenerateIssueMapWidgetScript.extract_geolocation', return_value=geolocations)
+    render_mock = mocker.patch('ExpanseGenerateIssueMapWidgetScript.render_map', return_value='aW1hZ2U=')
+
+    result = ExpanseGenerateIssueMapWidgetScript.generate_map_command({'from': "fake-from", "to": "fake-to"})
+
+    assert render_mock.call_args[0][0] == [(3.14, 14.3), (40.7, -74.0)]
+    assert '![Issue Map](data:image/png;base64,aW1hZ2U=)' in result
@@ -6,7 +6,9 @@ from CommonServerUserPython import *
 from elasticsearch import Elasticsearch, RequestsHttpConnection
 from elasticsearch_dsl import Search
 from elasticsearch_dsl.query import QueryString
+import queue
 import requests
+import threading
 import warnings
 
 # Disable insecure warnings
@@ -26,6 +28,9 @@ HTTP_ERRORS = {
 
 '''VARIABLES FOR FETCH INDICATORS'''
 FETCH_SIZE = 50
+INDICATORS_BATCH_SIZE = 2000
+SCAN_QUEUE_SIZE = 5000
+CHECKPOINT_EVERY_BATCHES = 10
 API_KEY_PREFIX = '_api_key_id:'
 MODULE_TO_FEEDMAP_KEY = 'moduleToFeedMap'
 FEED_TYPE_GENERIC = 'Generic Feed'
@@ -36,7 +41,7 @@ FEED_TYPE_CORTEX_MT = 'Cortex XSOAR MT Shared Feed'
 class ElasticsearchClient:
     def __init__(self, insecure=None, server=None, username=None, password=None, api_key=None, api_id=None,
                  time_field=None, time_method=None, fetch_index=None, fetch_time=None, query=None, tags=None,
-                 tlp_color=None):
+                 tlp_color=None, scan_slices=1):
         self._insecure = insecure
         self._proxy = handle_proxy()
         # _elasticsearch_builder expects _proxy to be None if empty
@@ -54,6 +59,7 @@ class ElasticsearchClient:
         self.es = self._elasticsearch_builder()
         self.tags = tags
         self.tlp_color = tlp_color
+        self.scan_slices = scan_slices
 
     def _elasticsearch_builder(self):
         """Builds an Elasticsearch obj with the necessary credentials, proxy settings and secure connection."""
@@ -197,37 +203,180 @@ def get_demisto_indicators(search, tags, tlp_color):
 
 
 def fetch_indicators_command(client, feed_type, src_val, src_type, default_type, last_fetch):
-    """Implements fetch-indicators command"""
+    """Implements fetch-indicators command
+
+    The hits are streamed from a sliced scroll into bounded indicator batches, so memory does not grow with the
+    size of the index. When the index has a time field, the fetch is checkpointed periodically so a fetch that
+    fails mid-scan resumes from the checkpoint instead of restarting.
+    """
     last_fetch_timestamp = get_last_fetch_timestamp(last_fetch, client.time_method, client.fetch_time)
     now = datetime.now()
-    ioc_lst: list = []
-    ioc_enrch_lst: list = []
     if FEED_TYPE_GENERIC not in feed_type:
         # Insight is the name of the indicator object as it's saved into the database
         search = get_scan_insight_format(client, now, last_fetch_timestamp, feed_type)
-        for hit in search.scan():
-            hit_lst, hit_enrch_lst = extract_indicators_from_insight_hit(hit, tags=client.tags,
-                                                                         tlp_color=client.tlp_color)
-            ioc_lst.extend(hit_lst)
-            ioc_enrch_lst.extend(hit_enrch_lst)
+
+        def hit_to_indicators(hit):
+            return extract_indicators_from_insight_hit(hit, tags=client.tags, tlp_color=client.tlp_color)
     else:
         search = get_scan_generic_format(client, now, last_fetch_timestamp)
-        for hit in search.scan():
-            ioc_lst.extend(extract_indicators_from_generic_hit(hit, src_val, src_type, default_type, client.tags,
-                                                               client.tlp_color))
-
-    if ioc_lst:
-        for b in batch(ioc_lst, batch_size=2000):
-            demisto.createIndicators(b)
-    if ioc_enrch_lst:
-        ioc_enrch_batches = create_enrichment_batches(ioc_enrch_lst)
-        for enrch_batch in ioc_enrch_batches:
-            # ensure batch sizes don't exceed 2000
-            for b in batch(enrch_batch, batch_size=2000):
-                demisto.createIndicators(b)
+
+        def hit_to_indicators(hit):
+            return extract_indicators_from_generic_hit(hit, src_val, src_type, default_type, client.tags,
+                                                       client.tlp_color), []
+
+    indicators_batcher = IndicatorsBatcher(client.scan_slices, client.time_method, last_fetch)
+    for slice_id, hit in scan_hits(search, client.scan_slices, client.time_field):
+        if hit is None:
+            indicators_batcher.slice_done(slice_id)
+            continue
+        hit_lst, hit_enrch_lst = hit_to_indicators(hit)
+        indicators_batcher.add(slice_id, get_hit_sort_value(hit), hit_lst, hit_enrch_lst)
+    indicators_batcher.flush()
     demisto.setLastRun({'time': now.timestamp() * 1000})
 
 
+class IndicatorsBatcher:
+    """Creates indicators and enrichments in batches of at most INDICATORS_BATCH_SIZE as hits are streamed in.
+
+    Enrichments that come from the same indicator are kept in different batches (see create_enrichment_batches), which
+    are created in order, so the i-th enrichment of an indicator is always created before its (i+1)-th one. Indicators
+    are always created before the enrichments that were collected with them.
+    """
+
+    def __init__(self, slices, time_method, last_fetch):
+        self._time_method = time_method or ''
+        self._indicators: list = []
+        self._enrichment_batches: list = []
+        self._batches_created = 0
+        self._last_checkpoint = last_fetch
+        # the sort value of the last hit added from every slice
+        self._sort_values: dict = {slice_id: None for slice_id in range(max(slices, 1))}
+        self._done_slices: set = set()
+
+    def add(self, slice_id, sort_value, ioc_lst, ioc_enrch_lst):
+        self._indicators.extend(ioc_lst)
+        for i, enrch_batch in enumerate(create_enrichment_batches(ioc_enrch_lst)):
+            if i == len(self._enrichment_batches):
+                self._enrichment_batches.append([])
+            self._enrichment_batches[i].extend(enrch_batch)
+        if sort_value is not None:
+            self._sort_values[slice_id] = sort_value
+
+        if len(self._indicators) >= INDICATORS_BATCH_SIZE:
+            self._create_indicators()
+        for i, enrch_batch in enumerate(self._enrichment_batches):
+            if len(enrch_batch) >= INDICATORS_BATCH_SIZE:
+                self._create_indicators()
+                # the earlier batches may hold earlier enrichments of the indicators in this batch
+                for j in range(i + 1):
+                    self._create_enrichments(j)
+        if self._batches_created >= CHECKPOINT_EVERY_BATCHES:
+            self.flush()
+            self._checkpoint()
+            self._batches_created = 0
+
+    def slice_done(self, slice_id):
+        self._done_slices.add(slice_id)
+
+    def flush(self):
+        self._create_indicators()
+        for i in range(len(self._enrichment_batches)):
+            self._create_enrichments(i)
+
+    def _create_indicators(self):
+        if self._indicators:
+            demisto.createIndicators(self._indicators)
+            self._indicators = []
+            self._batches_created += 1
+
+    def _create_enrichments(self, i):
+        if self._enrichment_batches[i]:
+            demisto.createIndicators(self._enrichment_batches[i])
+            self._enrichment_batches[i] = []
+            self._batches_created += 1
+
+    def _checkpoint(self):
+        """Saves the time up to which all the hits of all the slices were created to the last run.
+
+        Every slice is scanned in ascending time order, so all the hits of a slice before its last added hit are
+        already created. Hits that share the time of the last added hit might not be, so the checkpoint is set
+        just before it.
+        """
+        active_sort_values = [sort_value for slice_id, sort_value in self._sort_values.items()
+                              if slice_id not in self._done_slices]
+        if not active_sort_values or None in active_sort_values:
+            return
+        checkpoint = min(active_sort_values) - 1
+        if 'Timestamp - Seconds' in self._time_method:
+            checkpoint *= 1000
+        if not self._last_checkpoint or checkpoint > self._last_checkpoint:
+            demisto.debug(f'Checkpointing fetch indicators at {checkpoint}')
+            demisto.setLastRun({'time': checkpoint})
+            self._last_checkpoint = checkpoint
+
+
+def scan_hits(search, slices=1, time_field=None):
+    """Scans the search, yielding (slice ID, hit) tuples as the hits arrive.
+
+    When slices is more than 1, every slice of the scroll is scanned by its own worker thread, and the hits are
+    handed over through a bounded queue, so at most SCAN_QUEUE_SIZE hits are held in memory. A (slice ID, None)
+    tuple is yielded once a slice is exhausted. When a time field is given, every slice is scanned in ascending
+    time order so its progress can be checkpointed. A sorted scroll costs more on the server than the default _doc
+    order, as every shard sorts its matches and every scroll page is merged by the sort, but memory still stays bounded.
+    """
+    if time_field:
+        search = search.sort({time_field: {'order': 'asc'}}).params(preserve_order=True)
+    if slices <= 1:
+        for hit in search.scan():
+            yield 0, hit
+        yield 0, None
+        return
+
+    hits_queue: queue.Queue = queue.Queue(maxsize=SCAN_QUEUE_SIZE)
+    stop_event = threading.Event()
+
+    def put(item):
+        while not stop_event.is_set():
+            try:
+                hits_queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_slice(slice_id):
+        try:
+            for slice_hit in search.extra(slice={'id': slice_id, 'max': slices}).scan():
+                if not put((slice_id, slice_hit)):
+                    return
+            put((slice_id, None))
+        except Exception as e:
+            put((slice_id, e))
+
+    workers = [threading.Thread(target=scan_slice, args=(slice_id,), daemon=True) for slice_id in range(slices)]
+    for worker in workers:
+        worker.start()
+    try:
+        done_slices = 0
+        while done_slices < slices:
+            slice_id, hit = hits_queue.get()
+            if isinstance(hit, Exception):
+                raise hit
+            if hit is None:
+                done_slices += 1
+            yield slice_id, hit
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+
+
+def get_hit_sort_value(hit):
+    """Gets the value the hit was sorted by in a time sorted scan, if it was"""
+    sort_values = getattr(hit.meta, 'sort', None)
+    return sort_values[0] if sort_values else None
+
+
 def get_last_fetch_timestamp(last_fetch, time_method, fetch_time):
     """Get the last fetch timestamp"""
     if last_fetch:
@@ -364,9 +513,10 @@ def main():
         fetch_index = params.get('fetch_index')
         fetch_time = params.get('fetch_time', '3 days')
         query = params.get('es_query')
+        scan_slices = int(params.get('scan_slices') or 1)
         api_id, api_key = extract_api_from_username_password(username, password)
         client = ElasticsearchClient(insecure, server, username, password, api_key, api_id, time_field, time_method,
-                                     fetch_index, fetch_time, query, tags, tlp_color)
+                                     fetch_index, fetch_time, query, tags, tlp_color, scan_slices)
         src_val = params.get('src_val')
         src_type = params.get('src_type')
         default_type = params.get('default_type')
@@ -219,6 +219,92 @@ def test_create_enrichment_batches_mult_indicators():
     assert ioc_enrch_lst_of_lsts[3] == [9]
 
 
+def test_indicators_batcher_batches_and_checkpoints(mocker):
+    """
+    Given:
+        - Hits streamed from 2 time sorted slices, with enrichments.
+    When:
+        - Adding them to the batcher with a batch size of 2 and a checkpoint every 2 batches.
+    Then:
+        - Indicators are created in bounded batches before their enrichments, enrichments of the same indicator are
+          in different batches, and the checkpoint is just before the lowest time of the active slices.
+    """
+    import FeedElasticsearch as esf
+    mocker.patch.object(esf, 'INDICATORS_BATCH_SIZE', 2)
+    mocker.patch.object(esf, 'CHECKPOINT_EVERY_BATCHES', 2)
+    create_indicators = mocker.patch.object(esf.demisto, 'createIndicators')
+    set_last_run = mocker.patch.object(esf.demisto, 'setLastRun')
+    batcher = esf.IndicatorsBatcher(2, 'Simple-Date', None)
+
+    batcher.add(0, 100, [{'value': 'a'}], [['a1', 'a2']])
+    batcher.add(1, 200, [{'value': 'b'}], [])
+    assert create_indicators.call_args_list == [mocker.call([{'value': 'a'}, {'value': 'b'}])]
+    batcher.add(0, 300, [{'value': 'c'}], [['c1']])
+    # a full enrichment batch creates the pending indicators first, and the third batch triggers a flush of all the
+    # pending enrichments and a checkpoint
+    assert create_indicators.call_args_list[1:] == [mocker.call([{'value': 'c'}]), mocker.call(['a1', 'c1']),
+                                                    mocker.call(['a2'])]
+    set_last_run.assert_called_once_with({'time': 199})
+
+    batcher.slice_done(1)
+    batcher.add(0, 400, [{'value': 'd'}], [])
+    batcher.flush()
+    assert create_indicators.call_args_list[-1] == mocker.call([{'value': 'd'}])
+
+
+def test_indicators_batcher_enrichments_order(mocker):
+    """
+    Given:
+        - Enrichments of the same indicator split over several enrichment batches, with a later batch getting full
+          while an earlier one still holds an earlier enrichment of the same indicator.
+    When:
+        - Adding them to the batcher with a batch size of 2.
+    Then:
+        - The earlier enrichment batch is created before the full later one, so the enrichments of every indicator
+          are created in order.
+    """
+    import FeedElasticsearch as esf
+    mocker.patch.object(esf, 'INDICATORS_BATCH_SIZE', 2)
+    create_indicators = mocker.patch.object(esf.demisto, 'createIndicators')
+    batcher = esf.IndicatorsBatcher(1, 'Simple-Date', None)
+
+    batcher.add(0, None, [], [['a1', 'a2']])
+    batcher.add(0, None, [], [['b1']])
+    batcher.add(0, None, [], [['c1', 'c2']])
+    batcher.flush()
+    created = [item for call in create_indicators.call_args_list for item in call[0][0]]
+    assert created == ['a1', 'b1', 'c1', 'a2', 'c2']
+
+
+class MockSlicedSearch:
+    def __init__(self, hits_by_slice, slice_id=0):
+        self.hits_by_slice = hits_by_slice
+        self.slice_id = slice_id
+
+    def extra(self, **kwargs):
+        return MockSlicedSearch(self.hits_by_slice, kwargs['slice']['id'])
+
+    def scan(self):
+        return iter(self.hits_by_slice[self.slice_id])
+
+
+def test_scan_hits_sliced():
+    """
+    Given:
+        - A search with 3 slices.
+    When:
+        - Scanning it with 3 workers.
+    Then:
+        - All the hits of all the slices are yielded with their slice ID, followed by a done marker per slice.
+    """
+    import FeedElasticsearch as esf
+    hits_by_slice = {0: ['a', 'b'], 1: [], 2: ['c']}
+    scanned = list(esf.scan_hits(MockSlicedSearch(hits_by_slice), slices=3))
+    assert sorted(hit for _, hit in scanned if hit) == ['a', 'b', 'c']
+    assert sorted(slice_id for slice_id, hit in scanned if hit is None) == [0, 1, 2]
+    assert [slice_id for slice_id, hit in scanned if hit in ('a', 'b')] == [0, 0]
+
+
 def test_elasticsearch_builder_called_with_username_password(mocker):
     from elasticsearch import Elasticsearch
     import FeedElasticsearch as esf
@@ -22,7 +22,10 @@ from email.header import Header
 import mimetypes
 import random
 import string
+import time
+from multiprocessing.pool import ThreadPool
 from apiclient import discovery
+from apiclient.errors import HttpError
 from oauth2client import service_account
 import itertools as it
 
@@ -37,6 +40,10 @@ FETCH_TIME = demisto.params().get('fetch_time', '1 days')
 
 SEND_AS_SMTP_FIELDS = ['host', 'port', 'username', 'password', 'securitymode']
 DATE_FORMAT = '%Y-%m-%d'  # sample - 2020-08-23
+SEARCH_ALL_MAILBOXES_MAX_WORKERS = 10
+GET_MAIL_BATCH_SIZE = 50
+MAX_QUOTA_RETRIES = 5
+QUOTA_ERROR_REASONS = ('rateLimitExceeded', 'userRateLimitExceeded')
 
 ''' HELPER FUNCTIONS '''
 
@@ -147,6 +154,29 @@ def get_service(serviceName, version, additional_scopes=None, delegated_user=Non
     return discovery.build(serviceName, version, credentials=credentials)
 
 
+def is_quota_error(error):
+    if error.resp.status == 429:
+        return True
+    return error.resp.status == 403 and any(reason in str(error.content) for reason in QUOTA_ERROR_REASONS)
+
+
+def quota_backoff(attempt):
+    time.sleep(min(2 ** attempt, 32) + random.random())
+
+
+def execute_with_backoff(request):
+    """
+    Executes a Google API request, retrying with an exponential backoff when the user quota is exceeded.
+    """
+    for attempt in range(MAX_QUOTA_RETRIES):
+        try:
+            return request.execute()
+        except HttpError as e:
+            if not is_quota_error(e) or attempt == MAX_QUOTA_RETRIES - 1:
+                raise
+            quota_backoff(attempt)
+
+
 def parse_mail_parts(parts):
     body = u''
     html = u''
@@ -1035,28 +1065,38 @@ def get_user_tokens(user_id):
     return result.get('items', [])
 
 
-def search_all_mailboxes():
-    next_page_token = None
-    service = get_service('admin', 'directory_v1')
-    while True:
-        command_args = {
-            'maxResults': 100,
-            'domain': ADMIN_EMAIL.split('@')[1],  # type: ignore
-            'pageToken': next_page_token
-        }
-
-        result = service.users().list(**command_args).execute()
-        next_page_token = result.get('nextPageToken')
-
-        entries = [search_command(user['primaryEmail']) for user in result['users']]
+def list_users_page(service, page_token=None):
+    command_args = {
+        'maxResults': 100,
+        'domain': ADMIN_EMAIL.split('@')[1],  # type: ignore
+        'pageToken': page_token
+    }
+    return execute_with_backoff(service.users().list(**command_args))
 
-        # if these are the final result push - return them
-        if next_page_token is None:
-            entries.append("Search completed")
-            return entries
 
-        # return midway results
-        demisto.results(entries)
+def search_all_mailboxes():
+    service = get_service('admin', 'directory_v1')
+    pool = ThreadPool(SEARCH_ALL_MAILBOXES_MAX_WORKERS)
+    try:
+        result = list_users_page(service)
+        while True:
+            # search the mailboxes of the current page while the next page of users is listed
+            async_entries = pool.map_async(search_command, [user['primaryEmail'] for user in result['users']])
+            next_page_token = result.get('nextPageToken')
+            if next_page_token is not None:
+                result = list_users_page(service, next_page_token)
+            entries = async_entries.get()
+
+            # if these are the final result push - return them
+            if next_page_token is None:
+                entries.append("Search completed")
+                return entries
+
+            # return midway results
+            demisto.results(entries)
+    finally:
+        pool.close()
+        pool.join()
 
 
 def search_command(mailbox=None):
@@ -1124,9 +1164,9 @@ def search(user_id, subject='', _from='', to='', before='', after='', filename='
         'v1',
         ['https://www.googleapis.com/auth/gmail.readonly'],
         command_args['userId'])
-    result = service.users().messages().list(**command_args).execute()
+    result = execute_with_backoff(service.users().messages().list(**command_args))
 
-    return [get_mail(user_id, mail['id'], 'full') for mail in result.get('messages', [])], q
+    return get_mails_batch(service, user_id, [mail['id'] for mail in result.get('messages', [])], 'full'), q
 
 
 def get_mail_command():
@@ -1156,6 +1196,43 @@ def get_mail(user_id, _id, _format):
     return result
 
 
+def get_mails_batch(service, user_id, ids, _format):
+    """
+    Gets the mails in Google batch HTTP requests of up to GET_MAIL_BATCH_SIZE mails each.
+    Mails that exceeded the user quota are retried with an exponential backoff.
+    """
+    mails = {}  # type: dict
+    pending_ids = list(ids)
+    for attempt in range(MAX_QUOTA_RETRIES):
+        quota_errors = {}  # type: dict
+        errors = []  # type: list
+
+        def callback(request_id, response, exception):
+            if exception is None:
+                mails[request_id] = response
+            elif isinstance(exception, HttpError) and is_quota_error(exception):
+                quota_errors[request_id] = exception
+            else:
+                errors.append(exception)
+
+        for i in range(0, len(pending_ids), GET_MAIL_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for _id in pending_ids[i:i + GET_MAIL_BATCH_SIZE]:
+                batch.add(service.users().messages().get(userId=user_id, id=_id, format=_format), request_id=_id)
+            batch.execute()
+
+        if errors:
+            raise errors[0]
+        if not quota_errors:
+            break
+        if attempt == MAX_QUOTA_RETRIES - 1:
+            raise quota_errors.values()[0]
+        pending_ids = [_id for _id in pending_ids if _id in quota_errors]
+        quota_backoff(attempt)
+
+    return [mails[_id] for _id in ids]
+
+
 def get_attachments_command():
     args = demisto.args()
     user_id = args.get('user-id')
@@ -176,3 +176,92 @@ def test_dict_keys_snake_to_camelcase():
         'user_id': '2'
     }
     assert dict_keys_snake_to_camelcase(dictionary) == {'userName': 'user1', 'userId': '2'}
+
+
+class MockBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        from Gmail import HttpError
+        self.service.batches.append(self.requests)
+        for request_id in self.requests:
+            if request_id in self.service.quota_exceeded_ids:
+                self.service.quota_exceeded_ids.remove(request_id)
+                response = type('Response', (dict,), {'status': 429, 'reason': 'Too Many Requests'})()
+                self.callback(request_id, None, HttpError(response, b'userRateLimitExceeded'))
+            else:
+                self.callback(request_id, {'id': request_id}, None)
+
+
+class MockGmailService:
+    def __init__(self, quota_exceeded_ids=()):
+        self.batches = []
+        self.quota_exceeded_ids = set(quota_exceeded_ids)
+
+    def new_batch_http_request(self, callback):
+        return MockBatch(self, callback)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def get(self, **kwargs):
+        return kwargs
+
+
+def test_get_mails_batch(mocker):
+    """
+    Given:
+        - 120 mails to get, 2 of them exceeding the user quota on the first attempt
+    When:
+        - Getting the mails
+    Then:
+        - The mails are requested in batches of up to 50 mails
+        - Only the mails that exceeded the quota are retried
+        - The mails are returned in the requested order
+    """
+    import Gmail
+    sleep = mocker.patch.object(Gmail.time, 'sleep')
+    ids = [str(i) for i in range(120)]
+    service = MockGmailService(quota_exceeded_ids=['3', '70'])
+
+    mails = Gmail.get_mails_batch(service, 'user@test.com', ids, 'full')
+
+    assert [len(batch) for batch in service.batches] == [50, 50, 20, 2]
+    assert service.batches[-1] == ['3', '70']
+    assert sleep.call_count == 1
+    assert [mail['id'] for mail in mails] == ids
+
+
+def test_search_all_mailboxes(mocker):
+    """
+    Given:
+        - A domain with two pages of users
+    When:
+        - Searching all the mailboxes
+    Then:
+        - The results of the first page are returned midway
+        - The results of the last page are returned at the end
+    """
+    import Gmail
+    mocker.patch.object(Gmail, 'ADMIN_EMAIL', 'admin@test.com')
+    mocker.patch.object(Gmail, 'get_service')
+    mocker.patch.object(Gmail, 'list_users_page', side_effect=[
+        {'users': [{'primaryEmail': 'a@test.com'}, {'primaryEmail': 'b@test.com'}], 'nextPageToken': 'token'},
+        {'users': [{'primaryEmail': 'c@test.com'}]},
+    ])
+    mocker.patch.object(Gmail, 'search_command', side_effect=lambda mailbox: 'results of ' + mailbox)
+    results = mocker.patch.object(Gmail.demisto, 'results')
+
+    entries = Gmail.search_all_mailboxes()
+
+    results.assert_called_once_with(['results of a@test.com', 'results of b@test.com'])
+    assert entries == ['results of c@test.com', 'Search completed']
@@ -12,7 +12,8 @@ from CommonServerPython import *
 
 
 class Email(object):
-    def __init__(self, message_bytes: bytes, include_raw_body: bool, save_file: bool, id_: int) -> None:
+    def __init__(self, message_bytes: bytes, include_raw_body: bool, save_file: bool, id_: int,
+                 skip_attachments: bool = False) -> None:
         """
         Initialize Email class with all relevant data
         Args:
@@ -20,6 +21,7 @@ class Email(object):
             message_bytes: The raw email bytes
             include_raw_body: Whether to include the raw body of the mail in the incident's body
             save_file: Whether to save the .eml file of the incident's mail
+            skip_attachments: Whether to skip the attachments of the mail, used for truncated mails
         """
         email_object = parse_from_bytes(message_bytes)
         self.id = id_
@@ -27,7 +29,7 @@ class Email(object):
         self.to = [mail_addresses for _, mail_addresses in email_object.to]
         self.cc = [mail_addresses for _, mail_addresses in email_object.cc]
         self.bcc = [mail_addresses for _, mail_addresses in email_object.bcc]
-        self.attachments = email_object.attachments
+        self.attachments = [] if skip_attachments else email_object.attachments
         self.from_ = [mail_addresses for _, mail_addresses in email_object.from_][0]
         self.format = email_object.message.get_content_type()
         self.html = email_object.text_html[0] if email_object.text_html else ''
@@ -160,7 +162,8 @@ def fetch_incidents(client: IMAPClient,
                     permitted_from_domains: str,
                     delete_processed: bool,
                     limit: int,
-                    save_file: bool
+                    save_file: bool,
+                    max_mail_size: Optional[int] = None
                     ) -> Tuple[dict, list]:
     """
     This function will execute each interval (default is 1 minute).
@@ -184,6 +187,7 @@ def fetch_incidents(client: IMAPClient,
         delete_processed: Whether to delete processed mails
         limit: The maximum number of incidents to fetch each time
         save_file: Whether to save the .eml file of the incident's mail
+        max_mail_size: The maximum size in bytes of a mail to fetch in full, larger mails are truncated
 
     Returns:
         next_run: This will be last_run in the next fetch-incidents
@@ -203,7 +207,8 @@ def fetch_incidents(client: IMAPClient,
         permitted_from_addresses=permitted_from_addresses,
         permitted_from_domains=permitted_from_domains,
         save_file=save_file,
-        uid_to_fetch_from=uid_to_fetch_from
+        uid_to_fetch_from=uid_to_fetch_from,
+        max_mail_size=max_mail_size
     )
     incidents = []
     for mail in mails_fetched:
@@ -223,9 +228,12 @@ def fetch_mails(client: IMAPClient,
                 limit: int = 200,
                 save_file: bool = False,
                 message_id: int = None,
-                uid_to_fetch_from: int = 1) -> Tuple[list, list, int]:
+                uid_to_fetch_from: int = 1,
+                max_mail_size: Optional[int] = None) -> Tuple[list, list, int]:
     """
     This function will fetch the mails from the IMAP server.
+    The mails are fetched in two phases, first only the envelope and size of the mails are fetched in order to
+    select the mails to fetch, and then the full mails are fetched only for the selected mails.
 
     Args:
         client: IMAP client
@@ -238,6 +246,8 @@ def fetch_mails(client: IMAPClient,
         save_file: Whether to save the .eml file of the incident's mail
         message_id: A unique message ID with which a specific mail can be fetched
         uid_to_fetch_from: The email message UID to start the fetch from as offset
+        max_mail_size: The maximum size in bytes of a mail to fetch in full, the body of larger mails is truncated
+                       to this size and their attachments are skipped
 
     Returns:
         mails_fetched: A list of Email objects
@@ -245,36 +255,109 @@ def fetch_mails(client: IMAPClient,
         last_message_in_current_batch: The UID of the last message fetchedd
     """
     if message_id:
-        messages_uids = [message_id]
+        messages_uids = [int(message_id)]
     else:
         messages_query = generate_search_query(time_to_fetch_from,
                                                permitted_from_addresses,
                                                permitted_from_domains,
                                                uid_to_fetch_from)
         demisto.debug(f'Searching for email messages with criteria: {messages_query}')
-        messages_uids = client.search(messages_query)[:limit]
+        messages_uids = client.search(messages_query)
+    selected_uids, oversized_uids, last_message_in_current_batch = select_mails(
+        client, messages_uids, time_to_fetch_from, uid_to_fetch_from, limit, max_mail_size
+    )
+    demisto.debug(f'Messages to fetch: {selected_uids}, truncated: {oversized_uids}')
+
+    messages_data = {}
+    full_uids = [uid for uid in selected_uids if uid not in oversized_uids]
+    if full_uids:
+        for mail_id, message_data in client.fetch(full_uids, 'RFC822').items():
+            messages_data[mail_id] = message_data.get(b'RFC822')
+    if oversized_uids:
+        for mail_id, message_data in client.fetch(oversized_uids,
+                                                  ['BODY.PEEK[HEADER]', f'BODY.PEEK[TEXT]<0.{max_mail_size}>']).items():
+            messages_data[mail_id] = (message_data.get(b'BODY[HEADER]') or b'') + \
+                (message_data.get(b'BODY[TEXT]<0>') or b'')
+
     mails_fetched = []
     messages_fetched = []
-    demisto.debug(f'Messages to fetch: {messages_uids}')
-    for mail_id, message_data in client.fetch(messages_uids, 'RFC822').items():
-        message_bytes = message_data.get(b'RFC822')
+    for mail_id in selected_uids:
+        message_bytes = messages_data.get(mail_id)
         if not message_bytes:
             continue
-        email_message_object = Email(message_bytes, include_raw_body, save_file, mail_id)
-        if (time_to_fetch_from and time_to_fetch_from < email_message_object.date) or \
-                int(email_message_object.id) > int(uid_to_fetch_from):
-            mails_fetched.append(email_message_object)
-            messages_fetched.append(email_message_object.id)
-        else:
-            demisto.debug(f'Skipping {email_message_object.id} with date {email_message_object.date}. '
-                          f'uid_to_fetch_from: {uid_to_fetch_from}, first_fetch_time: {time_to_fetch_from}')
-    last_message_in_current_batch = uid_to_fetch_from
-    if messages_uids:
-        last_message_in_current_batch = messages_uids[-1]
+        email_message_object = Email(message_bytes, include_raw_body, save_file, mail_id,
+                                     skip_attachments=mail_id in oversized_uids)
+        mails_fetched.append(email_message_object)
+        messages_fetched.append(email_message_object.id)
 
     return mails_fetched, messages_fetched, last_message_in_current_batch
 
 
+def get_mail_date(message_data: dict) -> Optional[datetime]:
+    """
+    Gets the date of a mail from its envelope, or its internal date if the envelope has no valid date.
+    imapclient normalises both to naive datetime objects in the local timezone.
+
+    Args:
+        message_data: The fetched data of the mail
+
+    Returns:
+        The date of the mail in utc
+    """
+    envelope = message_data.get(b'ENVELOPE')
+    mail_date = (envelope.date if envelope else None) or message_data.get(b'INTERNALDATE')
+    return mail_date.astimezone(timezone.utc) if mail_date else None
+
+
+def select_mails(client: IMAPClient,
+                 messages_uids: list,
+                 time_to_fetch_from: Optional[datetime],
+                 uid_to_fetch_from: int,
+                 limit: int,
+                 max_mail_size: Optional[int]) -> Tuple[list, set, int]:
+    """
+    Selects the mails to fetch by their envelope and size, without fetching their bodies.
+    The envelopes are fetched in pages of the limit size until enough mails were selected.
+
+    Args:
+        client: IMAP client
+        messages_uids: The UIDs of the mails that matched the search
+        time_to_fetch_from: Fetch all incidents since first_fetch_time
+        uid_to_fetch_from: The email message UID to start the fetch from as offset
+        limit: The maximum number of mails to select, if the value is -1 all mails will be selected
+        max_mail_size: The maximum size in bytes of a mail to fetch in full
+
+    Returns:
+        selected_uids: The UIDs of the mails to fetch
+        oversized_uids: The UIDs of the selected mails that are larger than max_mail_size
+        last_message_in_current_batch: The UID of the last message that was checked
+    """
+    selected_uids: List[int] = []
+    oversized_uids = set()
+    last_message_in_current_batch = uid_to_fetch_from
+    page_size = limit if limit > 0 else len(messages_uids)
+    for page_start in range(0, len(messages_uids), page_size or 1):
+        page_uids = messages_uids[page_start:page_start + page_size]
+        messages_data = client.fetch(page_uids, ['ENVELOPE', 'INTERNALDATE', 'RFC822.SIZE'])
+        for mail_id in page_uids:
+            last_message_in_current_batch = mail_id
+            message_data = messages_data.get(mail_id)
+            if not message_data:
+                continue
+            mail_date = get_mail_date(message_data)
+            if (time_to_fetch_from and mail_date and time_to_fetch_from < mail_date) or \
+                    int(mail_id) > int(uid_to_fetch_from):
+                selected_uids.append(mail_id)
+                if max_mail_size and message_data.get(b'RFC822.SIZE', 0) > max_mail_size:
+                    oversized_uids.add(mail_id)
+                if len(selected_uids) == limit:
+                    return selected_uids, oversized_uids, last_message_in_current_batch
+            else:
+                demisto.debug(f'Skipping {mail_id} with date {mail_date}. '
+                              f'uid_to_fetch_from: {uid_to_fetch_from}, first_fetch_time: {time_to_fetch_from}')
+    return selected_uids, oversized_uids, last_message_in_current_batch
+
+
 def generate_search_query(time_to_fetch_from: Optional[datetime],
                           permitted_from_addresses: str,
                           permitted_from_domains: str,
@@ -392,6 +475,8 @@ def main():
     delete_processed = demisto.params().get("delete_processed", False)
     limit = min(int(demisto.params().get('limit', '50')), 200)
     save_file = params.get('save_file', False)
+    max_mail_size = arg_to_number(params.get('max_mail_size'))
+    max_mail_size = max_mail_size * 1024 * 1024 if max_mail_size else None
     first_fetch_time = demisto.params().get('first_fetch', '3 days').strip()
     ssl_context = ssl.create_default_context()
 
@@ -425,7 +510,7 @@ def main():
                                                       permitted_from_addresses=permitted_from_addresses,
                                                       permitted_from_domains=permitted_from_domains,
                                                       delete_processed=delete_processed, limit=limit,
-                                                      save_file=save_file)
+                                                      save_file=save_file, max_mail_size=max_mail_size)
 
                 demisto.setLastRun(next_run)
                 demisto.incidents(incidents)
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
 import pytest
 
@@ -24,6 +24,27 @@ Content-Type: text/html; charset="UTF-8"
 --0000000000002b271405ac80bf8b--
 """
 
+MAIL_WITH_ATTACHMENT = """MIME-Version: 1.0
+From: John Smith <from@test1.com>
+Date: Mon, 10 Aug 2020 10:17:16 +0300
+Subject: Mail with attachment
+To: to@test1.com
+Content-Type: multipart/mixed; boundary="0000000000002b271405ac80bf8b"
+
+--0000000000002b271405ac80bf8b
+Content-Type: text/plain; charset="UTF-8"
+
+Mail body
+
+--0000000000002b271405ac80bf8b
+Content-Type: application/octet-stream; name="attachment.bin"
+Content-Disposition: attachment; filename="attachment.bin"
+Content-Transfer-Encoding: base64
+
+""" + "QUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFBQUFB\n" * 100 + """
+--0000000000002b271405ac80bf8b--
+"""
+
 EXPECTED_LABELS = [
     {'type': 'Email/from', 'value': 'from@test1.com'},
     {'type': 'Email/format', 'value': 'multipart/alternative'}, {'type': 'Email/text', 'value': ''},
@@ -137,3 +158,85 @@ def test_generate_labels():
     labels = email._generate_labels()
     for label in EXPECTED_LABELS:
         assert label in labels, f'Label {label} was not found in the generated labels, {labels}'
+
+
+class MockIMAPClient:
+    def __init__(self, mails):
+        self.mails = mails
+        self.fetched = []
+
+    def search(self, criteria):
+        return sorted(self.mails)
+
+    def fetch(self, messages, data):
+        from imapclient.response_types import Envelope
+        self.fetched.append((list(messages), data))
+        response = {}
+        for uid in messages:
+            mail_date, mail_bytes = self.mails[uid]
+            if data == 'RFC822':
+                response[uid] = {b'RFC822': mail_bytes}
+            elif data == ['ENVELOPE', 'INTERNALDATE', 'RFC822.SIZE']:
+                response[uid] = {b'ENVELOPE': Envelope(mail_date, *[None] * 9),
+                                 b'INTERNALDATE': mail_date,
+                                 b'RFC822.SIZE': len(mail_bytes)}
+            else:
+                header, text = mail_bytes.split(b'\n\n', 1)
+                response[uid] = {b'BODY[HEADER]': header + b'\n\n', b'BODY[TEXT]<0>': text[:100]}
+        return response
+
+
+def test_fetch_mails_fetches_only_selected_bodies():
+    """
+    Given:
+        - 5 mails in the mailbox, the first 2 were already fetched and are older than the first fetch time
+
+    When:
+        - Fetching mails with a limit of 2
+
+    Then:
+        - Only the envelopes of the first 2 pages of mails are fetched
+        - Only the bodies of the 2 selected mails are fetched
+        - The last message that was checked is returned as the last message in the batch
+    """
+    from MailListenerV2 import fetch_mails
+    mail_bytes = MAIL_STRING.encode()
+    mails = {uid: (datetime(2020, 8, uid), mail_bytes) for uid in range(1, 6)}
+    client = MockIMAPClient(mails)
+
+    mails_fetched, messages_fetched, last_uid = fetch_mails(
+        client, time_to_fetch_from=datetime(2020, 8, 2, 12, tzinfo=timezone.utc), limit=2, uid_to_fetch_from=2
+    )
+
+    assert messages_fetched == [3, 4]
+    assert last_uid == 4
+    assert client.fetched == [
+        ([1, 2], ['ENVELOPE', 'INTERNALDATE', 'RFC822.SIZE']),
+        ([3, 4], ['ENVELOPE', 'INTERNALDATE', 'RFC822.SIZE']),
+        ([3, 4], 'RFC822'),
+    ]
+    assert mails_fetched[0].subject == 'Testing email for mail listener'
+
+
+def test_fetch_mails_truncates_oversized_mails():
+    """
+    Given:
+        - A mail with an attachment that is larger than the maximum mail size
+
+    When:
+        - Fetching mails
+
+    Then:
+        - Only the header and the beginning of the body of the mail are fetched
+        - The attachments of the mail are skipped
+    """
+    from MailListenerV2 import fetch_mails
+    mail_bytes = MAIL_WITH_ATTACHMENT.encode()
+    client = MockIMAPClient({2: (datetime(2020, 8, 2), mail_bytes)})
+
+    mails_fetched, messages_fetched, _ = fetch_mails(client, uid_to_fetch_from=1, max_mail_size=100)
+
+    assert messages_fetched == [2]
+    assert client.fetched[-1] == ([2], ['BODY.PEEK[HEADER]', 'BODY.PEEK[TEXT]<0.100>'])
+    assert mails_fetched[0].subject == 'Mail with attachment'
+    assert mails_fetched[0].attachments == []
@@ -2,10 +2,13 @@ from CommonServerPython import *
 
 ''' IMPORTS '''
 from datetime import datetime
-from typing import Dict, List, Any, Optional, Tuple, Union
+from typing import Dict, Iterator, List, Any, Optional, Tuple, Union
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import uuid
 import json
 import requests
+from xml.sax.saxutils import escape, quoteattr
 
 # disable insecure warnings
 requests.packages.urllib3.disable_warnings()
@@ -26,6 +29,23 @@ XPATH_OBJECTS = ''
 
 XPATH_RULEBASE = ''
 
+# bulk User-ID updates are split into messages of this many entries, sent this many at a time
+USER_ID_CHUNK_SIZE = 1000
+USER_ID_MAX_WORKERS = 4
+
+# the objects registered to a tag are read in pages of the maximal size the API returns, up to a maximal number of pages
+REGISTERED_OBJECTS_PAGE_SIZE = 500
+REGISTERED_OBJECTS_MAX_PAGES = 200
+
+# logs written to a file are retrieved in pages of this many logs, up to a maximal number of pages
+LOGS_PAGE_SIZE = 1000
+LOGS_MAX_PAGES = 1000
+
+# API calls share the connections of one keep-alive session instead of a TLS handshake per call
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_maxsize=USER_ID_MAX_WORKERS))
+SESSION.mount('http://', HTTPAdapter(pool_maxsize=USER_ID_MAX_WORKERS))
+
 # Security rule arguments for output handling
 SECURITY_RULE_ARGS = {
     'rulename': 'Name',
@@ -87,7 +107,7 @@ def http_request(uri: str, method: str, headers: dict = {},
     """
     Makes an API call with the given arguments
     """
-    result = requests.request(
+    result = SESSION.request(
         method,
         uri,
         headers=headers,
@@ -97,6 +117,13 @@ def http_request(uri: str, method: str, headers: dict = {},
         files=files
     )
 
+    return handle_http_response(result, is_pcap)
+
+
+def handle_http_response(result: requests.Response, is_pcap: bool = False) -> Any:
+    """
+    Validates an API call response and parses it
+    """
     if result.status_code < 200 or result.status_code >= 300:
         raise Exception(
             'Request Failed. with status: ' + str(result.status_code) + '. Reason is: ' + str(result.reason))
@@ -105,7 +132,7 @@ def http_request(uri: str, method: str, headers: dict = {},
     if is_pcap:
         return result
 
-    json_result = json.loads(xml2json(result.text))
+    json_result = xml2dict(result.text)
 
     # handle raw response that doe not contain the response key, e.g xonfiguration export
     if 'response' not in json_result or '@code' not in json_result['response']:
@@ -3082,7 +3109,7 @@ def panorama_list_pcaps_command(args: dict):
         raise Exception('can not provide dlp-pcap without password')
 
     result = http_request(URL, 'GET', params=params, is_pcap=True)
-    json_result = json.loads(xml2json(result.text))['response']
+    json_result = xml2dict(result.text)['response']
     if json_result['@status'] != 'success':
         raise Exception('Request to get list of Pcaps Failed.\nStatus code: ' + str(
             json_result['response']['@code']) + '\nWith message: ' + str(json_result['response']['msg']['line']))
@@ -3715,6 +3742,152 @@ def panorama_unregister_ip_tag_command(args: dict):
     })
 
 
+def build_tag_entries(object_type: str, tag: str, values: List[str], persistent: Optional[str] = None,
+                      timeout: Optional[int] = None) -> List[str]:
+    """
+    Builds the User-ID entries of IPs (object_type 'ip') or users (object_type 'user') for a tag.
+    The tag and the values are escaped, as user names and tags may contain XML special characters
+    """
+    member = f'<member timeout={quoteattr(str(timeout))}>{escape(tag)}</member>' if timeout \
+        else f'<member>{escape(tag)}</member>'
+    persistent_attribute = f' persistent={quoteattr(persistent)}' if persistent is not None else ''
+    return [f'<entry {object_type}={quoteattr(value)}{persistent_attribute}><tag>{member}</tag></entry>'
+            for value in values]
+
+
+def build_uid_messages(payload_type: str, entries: List[str], chunk_size: int) -> List[str]:
+    """
+    Splits User-ID entries into update messages of at most chunk_size entries
+    """
+    return [f'<uid-message><version>2.0</version><type>update</type><payload><{payload_type}>{"".join(chunk)}'
+            f'</{payload_type}></payload></uid-message>' for chunk in batch(entries, chunk_size)]
+
+
+@logger
+def panorama_get_registered(object_type: str, tag: str) -> set:
+    """
+    Gets the IPs (object_type 'ip') or users (object_type 'user') registered to a tag, page by page
+    """
+    registered: set = set()
+    for page in range(REGISTERED_OBJECTS_MAX_PAGES):
+        params = {
+            'type': 'op',
+            'cmd': f'<show><object><registered-{object_type}><tag><entry name={quoteattr(tag)}/></tag>'
+                   f'<limit>{REGISTERED_OBJECTS_PAGE_SIZE}</limit>'
+                   f'<start-point>{page * REGISTERED_OBJECTS_PAGE_SIZE + 1}</start-point>'
+                   f'</registered-{object_type}></object></show>',
+            'key': API_KEY
+        }
+        result = http_request(
+            URL,
+            'GET',
+            params=params
+        )
+
+        # no registered objects are returned as a text message instead of entries
+        result_entries = result['response'].get('result')
+        entries = result_entries.get('entry', []) if isinstance(result_entries, dict) else []
+        if not isinstance(entries, list):
+            entries = [entries]
+        registered.update(entry[f'@{object_type}'] for entry in entries)
+        if len(entries) < REGISTERED_OBJECTS_PAGE_SIZE:
+            return registered
+
+    raise DemistoException(f'More than {REGISTERED_OBJECTS_MAX_PAGES * REGISTERED_OBJECTS_PAGE_SIZE} objects are '
+                           f'registered to the tag {tag}. Run the command without comparing with the registered objects.')
+
+
+@logger
+def panorama_send_uid_messages(messages: List[str]) -> List[Any]:
+    """
+    Sends User-ID messages concurrently over the pooled session, and validates their responses in order
+    """
+    def send_uid_message(message: str) -> requests.Response:
+        return SESSION.request('POST', URL, data={'type': 'user-id', 'cmd': message, 'key': API_KEY}, verify=USE_SSL)
+
+    if not messages:
+        return []
+    with ThreadPoolExecutor(max_workers=min(USER_ID_MAX_WORKERS, len(messages))) as executor:
+        responses = list(executor.map(send_uid_message, messages))
+    return [handle_http_response(response) for response in responses]
+
+
+def panorama_bulk_tag(object_type: str, tag: str, values: List[str], args: dict) -> Dict[str, Any]:
+    """
+    Registers IPs (object_type 'ip') or users (object_type 'user') to a tag, unregisters them from it, or syncs the tag
+    to them, in chunked User-ID messages. Only the objects whose registration changes are sent, unless the comparison
+    with the registered objects is disabled. Registrations with a timeout are always sent, to renew their timeout.
+    """
+    values = list(dict.fromkeys(values))
+    action = args.get('action', 'register')
+    persistent = ('1' if args.get('persistent', 'true') == 'true' else '0') if object_type == 'ip' else None
+    timeout = arg_to_number(args.get('timeout'), 'timeout')
+    chunk_size = arg_to_number(args.get('chunk_size'), 'chunk_size') or USER_ID_CHUNK_SIZE
+    compare_with_registered = argToBoolean(args.get('compare_with_registered', 'true'))
+    if action not in ('register', 'unregister', 'sync'):
+        raise DemistoException(f'Invalid action: {action}. The action should be register, unregister or sync.')
+    if action == 'sync' and not compare_with_registered:
+        raise DemistoException('The sync action requires comparing with the registered objects.')
+
+    registered = panorama_get_registered(object_type, tag) if compare_with_registered else set()
+    to_register: List[str] = []
+    to_unregister: List[str] = []
+    if action in ('register', 'sync'):
+        to_register = [value for value in values if value not in registered or timeout]
+    if action == 'unregister':
+        to_unregister = [value for value in values if value in registered or not compare_with_registered]
+    if action == 'sync':
+        to_unregister = sorted(registered.difference(values))
+
+    payload_suffix = '' if object_type == 'ip' else '-user'
+    messages = build_uid_messages(f'register{payload_suffix}',
+                                  build_tag_entries(object_type, tag, to_register, persistent, timeout), chunk_size)
+    messages += build_uid_messages(f'unregister{payload_suffix}', build_tag_entries(object_type, tag, to_unregister),
+                                   chunk_size)
+    panorama_send_uid_messages(messages)
+
+    return {
+        'Tag': tag,
+        'Registered': len(to_register),
+        'Unregistered': len(to_unregister),
+        'Unchanged': len(values) - len(to_register) - (len(to_unregister) if action == 'unregister' else 0),
+        'Messages': len(messages)
+    }
+
+
+def panorama_bulk_ip_tag_command(args: dict) -> CommandResults:
+    """
+    Registers IPs to a tag, unregisters them from it, or syncs the tag to them, in bulk
+    """
+    bulk_ip_tag = panorama_bulk_tag('ip', args['tag'], argToList(args.get('IPs')), args)
+    return CommandResults(
+        outputs_prefix='Panorama.BulkIPTag',
+        outputs_key_field='Tag',
+        outputs=bulk_ip_tag,
+        readable_output=tableToMarkdown(f'Bulk IP tag {args.get("action", "register")} results:', bulk_ip_tag,
+                                        ['Tag', 'Registered', 'Unregistered', 'Unchanged', 'Messages']),
+        raw_response=bulk_ip_tag
+    )
+
+
+def panorama_bulk_user_tag_command(args: dict) -> CommandResults:
+    """
+    Registers users to a tag, unregisters them from it, or syncs the tag to them, in bulk
+    """
+    major_version = get_pan_os_major_version()
+    if major_version <= 8:
+        raise Exception('The panorama-bulk-user-tag command is only available for PAN-OS 9.X and above versions.')
+    bulk_user_tag = panorama_bulk_tag('user', args['tag'], argToList(args.get('Users')), args)
+    return CommandResults(
+        outputs_prefix='Panorama.BulkUserTag',
+        outputs_key_field='Tag',
+        outputs=bulk_user_tag,
+        readable_output=tableToMarkdown(f'Bulk user tag {args.get("action", "register")} results:', bulk_user_tag,
+                                        ['Tag', 'Registered', 'Unregistered', 'Unchanged', 'Messages']),
+        raw_response=bulk_user_tag
+    )
+
+
 ''' User Tags '''
 
 
@@ -4149,7 +4322,7 @@ def build_logs_query(address_src: Optional[str], address_dst: Optional[str], ip_
 @logger
 def panorama_query_logs(log_type: str, number_of_logs: str, query: str, address_src: str, address_dst: str, ip_: str,
                         zone_src: str, zone_dst: str, time_generated: str, action: str,
-                        port_dst: str, rule: str, url: str, filedigest: str):
+                        port_dst: str, rule: str, url: str, filedigest: str, skip: Optional[str] = None):
     params = {
         'type': 'log',
         'log-type': log_type,
@@ -4172,6 +4345,8 @@ def panorama_query_logs(log_type: str, number_of_logs: str, query: str, address_
                                            port_dst, rule, url, filedigest)
     if number_of_logs:
         params['nlogs'] = number_of_logs
+    if skip:
+        params['skip'] = skip
 
     result = http_request(
         URL,
@@ -4200,6 +4375,7 @@ def panorama_query_logs_command(args: dict):
     rule = args.get('rule')
     filedigest = args.get('filedigest')
     url = args.get('url')
+    skip = args.get('skip')
     if url and url[-1] != '/':
         url += '/'
 
@@ -4209,7 +4385,7 @@ def panorama_query_logs_command(args: dict):
 
     result = panorama_query_logs(log_type, number_of_logs, query, address_src, address_dst, ip_,
                                  zone_src, zone_dst, time_generated, action,
-                                 port_dst, rule, url, filedigest)
+                                 port_dst, rule, url, filedigest, skip)
 
     if result['response']['@status'] == 'error':
         if 'msg' in result['response'] and 'line' in result['response']['msg']:
@@ -4275,93 +4451,54 @@ def panorama_check_logs_status_command(job_id: str):
         })
 
 
+# the log fields, by their API names, in the order they are prettified and written to log files
+LOG_FIELDS = {
+    'action': 'Action',
+    'app': 'Application',
+    'bytes': 'Bytes',
+    'bytes_received': 'BytesReceived',
+    'bytes_sent': 'BytesSent',
+    'category': 'CategoryOrVerdict',
+    'device_name': 'DeviceName',
+    'dst': 'DestinationAddress',
+    'dstuser': 'DestinationUser',
+    'dstloc': 'DestinationCountry',
+    'dport': 'DestinationPort',
+    'filedigest': 'FileDigest',
+    'filename': 'FileName',
+    'filetype': 'FileType',
+    'from': 'FromZone',
+    'misc': 'URLOrFilename',
+    'natdst': 'NATDestinationIP',
+    'natdport': 'NATDestinationPort',
+    'natsrc': 'NATSourceIP',
+    'natsport': 'NATSourcePort',
+    'pcap_id': 'PCAPid',
+    'proto': 'IPProtocol',
+    'recipient': 'Recipient',
+    'rule': 'Rule',
+    'rule_uuid': 'RuleID',
+    'receive_time': 'ReceiveTime',
+    'sender': 'Sender',
+    'sessionid': 'SessionID',
+    'serial': 'DeviceSN',
+    'severity': 'Severity',
+    'src': 'SourceAddress',
+    'srcloc': 'SourceCountry',
+    'srcuser': 'SourceUser',
+    'sport': 'SourcePort',
+    'thr_category': 'ThreatCategory',
+    'threatid': 'Name',
+    'tid': 'ID',
+    'to': 'ToZone',
+    'time_generated': 'TimeGenerated',
+    'url_category_list': 'URLCategoryList',
+    'vsys': 'Vsys',
+}
+
+
 def prettify_log(log: dict):
-    pretty_log = {}
-
-    if 'action' in log:
-        pretty_log['Action'] = log['action']
-    if 'app' in log:
-        pretty_log['Application'] = log['app']
-    if 'bytes' in log:
-        pretty_log['Bytes'] = log['bytes']
-    if 'bytes_received' in log:
-        pretty_log['BytesReceived'] = log['bytes_received']
-    if 'bytes_sent' in log:
-        pretty_log['BytesSent'] = log['bytes_sent']
-    if 'category' in log:
-        pretty_log['CategoryOrVerdict'] = log['category']
-    if 'device_name' in log:
-        pretty_log['DeviceName'] = log['device_name']
-    if 'dst' in log:
-        pretty_log['DestinationAddress'] = log['dst']
-    if 'dstuser' in log:
-        pretty_log['DestinationUser'] = log['dstuser']
-    if 'dstloc' in log:
-        pretty_log['DestinationCountry'] = log['dstloc']
-    if 'dport' in log:
-        pretty_log['DestinationPort'] = log['dport']
-    if 'filedigest' in log:
-        pretty_log['FileDigest'] = log['filedigest']
-    if 'filename' in log:
-        pretty_log['FileName'] = log['filename']
-    if 'filetype' in log:
-        pretty_log['FileType'] = log['filetype']
-    if 'from' in log:
-        pretty_log['FromZone'] = log['from']
-    if 'misc' in log:
-        pretty_log['URLOrFilename'] = log['misc']
-    if 'natdst' in log:
-        pretty_log['NATDestinationIP'] = log['natdst']
-    if 'natdport' in log:
-        pretty_log['NATDestinationPort'] = log['natdport']
-    if 'natsrc' in log:
-        pretty_log['NATSourceIP'] = log['natsrc']
-    if 'natsport' in log:
-        pretty_log['NATSourcePort'] = log['natsport']
-    if 'pcap_id' in log:
-        pretty_log['PCAPid'] = log['pcap_id']
-    if 'proto' in log:
-        pretty_log['IPProtocol'] = log['proto']
-    if 'recipient' in log:
-        pretty_log['Recipient'] = log['recipient']
-    if 'rule' in log:
-        pretty_log['Rule'] = log['rule']
-    if 'rule_uuid' in log:
-        pretty_log['RuleID'] = log['rule_uuid']
-    if 'receive_time' in log:
-        pretty_log['ReceiveTime'] = log['receive_time']
-    if 'sender' in log:
-        pretty_log['Sender'] = log['sender']
-    if 'sessionid' in log:
-        pretty_log['SessionID'] = log['sessionid']
-    if 'serial' in log:
-        pretty_log['DeviceSN'] = log['serial']
-    if 'severity' in log:
-        pretty_log['Severity'] = log['severity']
-    if 'src' in log:
-        pretty_log['SourceAddress'] = log['src']
-    if 'srcloc' in log:
-        pretty_log['SourceCountry'] = log['srcloc']
-    if 'srcuser' in log:
-        pretty_log['SourceUser'] = log['srcuser']
-    if 'sport' in log:
-        pretty_log['SourcePort'] = log['sport']
-    if 'thr_category' in log:
-        pretty_log['ThreatCategory'] = log['thr_category']
-    if 'threatid' in log:
-        pretty_log['Name'] = log['threatid']
-    if 'tid' in log:
-        pretty_log['ID'] = log['tid']
-    if 'to' in log:
-        pretty_log['ToZone'] = log['to']
-    if 'time_generated' in log:
-        pretty_log['TimeGenerated'] = log['time_generated']
-    if 'url_category_list' in log:
-        pretty_log['URLCategoryList'] = log['url_category_list']
-    if 'vsys' in log:
-        pretty_log['Vsys'] = log['vsys']
-
-    return pretty_log
+    return {pretty_field: log[field] for field, pretty_field in LOG_FIELDS.items() if field in log}
 
 
 def prettify_logs(logs: Union[list, dict]):
@@ -4377,7 +4514,13 @@ def prettify_logs(logs: Union[list, dict]):
 def panorama_get_logs_command(args: dict):
     ignore_auto_extract = args.get('ignore_auto_extract') == 'true'
     job_ids = argToList(args.get('job_id'))
+    file_format = args.get('file_format')
+    page_size = arg_to_number(args.get('page_size'), 'page_size') or LOGS_PAGE_SIZE
     for job_id in job_ids:
+        if file_format:
+            panorama_get_logs_to_file(job_id, file_format, page_size)
+            continue
+
         result = panorama_get_traffic_logs(job_id)
         log_type_dt = demisto.dt(demisto.context(), f'Panorama.Monitor(val.JobID === "{job_id}").LogType')
         if isinstance(log_type_dt, list):
@@ -4438,6 +4581,109 @@ def panorama_get_logs_command(args: dict):
             })
 
 
+@logger
+def panorama_get_logs_page(job_id: str, skip: int, nlogs: int) -> bytes:
+    """
+    Gets a page of the logs of a query job, without parsing it
+    """
+    params = {
+        'action': 'get',
+        'type': 'log',
+        'job-id': job_id,
+        'skip': skip,
+        'nlogs': nlogs,
+        'key': API_KEY
+    }
+    result = SESSION.request('GET', URL, params=params, verify=USE_SSL)
+    if result.status_code < 200 or result.status_code >= 300:
+        raise Exception(
+            'Request Failed. with status: ' + str(result.status_code) + '. Reason is: ' + str(result.reason))
+    return result.content
+
+
+def iterate_job_logs(job_id: str, page_size: int, first_page: bytes, total_logs: Optional[int] = None) -> Iterator[dict]:
+    """
+    Yields the prettified logs of a finished query job page by page, parsing every page incrementally.
+    Stops at the number of logs the job reported, at a short page, or after the maximal number of pages.
+    """
+    page, skip = first_page, 0
+    for page_number in range(LOGS_MAX_PAGES):
+        if page_number:
+            page = panorama_get_logs_page(job_id, skip, page_size)
+        page_logs = 0
+        for log in xml2dict_iter(page, 'entry'):
+            page_logs += 1
+            yield prettify_log(log)
+        skip += page_logs
+        if page_logs < page_size or (total_logs is not None and skip >= total_logs):
+            return
+    demisto.info(f'Stopped retrieving the logs of job {job_id} after {LOGS_MAX_PAGES} pages.')
+
+
+def write_logs_file(logs: Iterator[dict], file_format: str, file_path: str) -> Dict[str, Any]:
+    """
+    Writes logs to a CSV or NDJSON file one by one, and returns their summary stats
+    """
+    stats: Dict[str, Any] = {'LogsCount': 0, 'FirstTimeGenerated': None, 'LastTimeGenerated': None}
+    with open(file_path, 'w', newline='') as logs_file:
+        csv_writer = csv.DictWriter(logs_file, fieldnames=list(LOG_FIELDS.values())) if file_format == 'csv' else None
+        if csv_writer:
+            csv_writer.writeheader()
+        for log in logs:
+            if csv_writer:
+                csv_writer.writerow(log)
+            else:
+                logs_file.write(json.dumps(log) + '\n')
+            stats['LogsCount'] += 1
+            time_generated = log.get('TimeGenerated')
+            if time_generated:
+                if not stats['FirstTimeGenerated'] or time_generated < stats['FirstTimeGenerated']:
+                    stats['FirstTimeGenerated'] = time_generated
+                if not stats['LastTimeGenerated'] or time_generated > stats['LastTimeGenerated']:
+                    stats['LastTimeGenerated'] = time_generated
+    return stats
+
+
+def panorama_get_logs_to_file(job_id: str, file_format: str, page_size: int):
+    """
+    Writes the logs of a query job to a file entry, and returns only their summary stats to the context
+    """
+    first_page = panorama_get_logs_page(job_id, 0, page_size)
+    # the job precedes the logs, so the rest of the page is not parsed here
+    job = next(xml2dict_iter(first_page, 'job'), None)
+    if not isinstance(job, dict) or 'status' not in job:
+        response = xml2dict(first_page).get('response', {})
+        if isinstance(response.get('msg'), dict) and 'line' in response['msg']:
+            raise Exception('Query logs failed. Reason is: ' + str(response['msg']['line']))
+        raise Exception('Missing JobID status in response.')
+
+    query_logs_output: Dict[str, Any] = {
+        'JobID': job_id,
+        'Status': 'Pending'
+    }
+    if job['status'] == 'FIN':
+        query_logs_output['Status'] = 'Completed'
+        file_name = f'{job_id}_logs.{"csv" if file_format == "csv" else "ndjson"}'
+        file_id = demisto.uniqueFile()
+        total_logs = arg_to_number(job.get('cached-logs'), 'cached-logs')
+        query_logs_output.update(write_logs_file(iterate_job_logs(job_id, page_size, first_page, total_logs),
+                                                 file_format, demisto.investigation()['id'] + '_' + file_id))
+        query_logs_output['FileName'] = file_name
+        return_results({'Contents': '', 'ContentsFormat': formats['text'], 'Type': entryTypes['file'],
+                        'File': file_name, 'FileID': file_id})
+
+    return_results({
+        'Type': entryTypes['note'],
+        'ContentsFormat': formats['json'],
+        'Contents': query_logs_output,
+        'ReadableContentsFormat': formats['markdown'],
+        'HumanReadable': tableToMarkdown('Query Logs status:', query_logs_output,
+                                         ['JobID', 'Status', 'LogsCount', 'FirstTimeGenerated', 'LastTimeGenerated',
+                                          'FileName'], removeNull=True),
+        'EntryContext': {"Panorama.Monitor(val.JobID == obj.JobID)": query_logs_output}
+    })
+
+
 ''' Security Policy Match'''
 
 
@@ -6813,6 +7059,9 @@ def main():
         elif demisto.command() == 'panorama-unregister-ip-tag':
             panorama_unregister_ip_tag_command(args)
 
+        elif demisto.command() == 'panorama-bulk-ip-tag':
+            return_results(panorama_bulk_ip_tag_command(args))
+
         # Registered Users
         elif demisto.command() == 'panorama-register-user-tag':
             panorama_register_user_tag_command(args)
@@ -6820,6 +7069,9 @@ def main():
         elif demisto.command() == 'panorama-unregister-user-tag':
             panorama_unregister_user_tag_command(args)
 
+        elif demisto.command() == 'panorama-bulk-user-tag':
+            return_results(panorama_bulk_user_tag_command(args))
+
         # Security Rules Managing
         elif demisto.command() == 'panorama-list-rules':
             panorama_list_rules_command(args.get('tag'))
@@ -250,3 +250,185 @@ def test_validate_search_time():
     with pytest.raises(Exception):
         assert validate_search_time('219/12/26 00:00:00')
         assert validate_search_time('219/10/35')
+
+
+def test_build_uid_messages():
+    """
+    Given:
+        - Five IP addresses to register to a tag with a timeout.
+    When:
+        - Building User-ID messages of at most two entries.
+    Then:
+        - Three register messages are built, and the last one has a single entry.
+    """
+    from Panorama import build_tag_entries, build_uid_messages
+    entries = build_tag_entries('ip', 'tag', [f'1.1.1.{i}' for i in range(5)], persistent='1', timeout=60)
+    messages = build_uid_messages('register', entries, 2)
+    assert len(messages) == 3
+    assert messages[2] == '<uid-message><version>2.0</version><type>update</type><payload><register>' \
+                          '<entry ip="1.1.1.4" persistent="1"><tag><member timeout="60">tag</member></tag></entry>' \
+                          '</register></payload></uid-message>'
+
+
+def test_build_tag_entries_special_characters():
+    """
+    Given:
+        - A user name and a tag with XML special characters.
+    When:
+        - Building a User-ID register-user message.
+    Then:
+        - The message is well formed XML, and the user name and the tag are kept as they are.
+    """
+    import xml.etree.ElementTree as ElementTree
+    from Panorama import build_tag_entries, build_uid_messages
+    user = 'domain\\a&b<c>"d\''
+    tag = 'tag&<"x">'
+    [message] = build_uid_messages('register-user', build_tag_entries('user', tag, [user], timeout=60), 10)
+    entry = ElementTree.fromstring(message).find('payload/register-user/entry')
+    assert entry.attrib == {'user': user}
+    assert entry.find('tag/member').text == tag
+    assert entry.find('tag/member').attrib == {'timeout': '60'}
+
+
+def test_panorama_bulk_ip_tag_sync(mocker, requests_mock):
+    """
+    Given:
+        - A tag registered to 1.1.1.1 and 2.2.2.2.
+    When:
+        - Syncing the tag to 2.2.2.2 and 3.3.3.3.
+    Then:
+        - Only 3.3.3.3 is registered and only 1.1.1.1 is unregistered, each in its own User-ID message.
+    """
+    import Panorama
+    from urllib.parse import parse_qs
+    mocker.patch.object(Panorama, 'URL', 'https://1.1.1.1:443/api/')
+    registered_ips_xml = """
+    <response status="success">
+        <result>
+            <entry ip="1.1.1.1" from_agent="0" persistent="1"><tag><member>tag</member></tag></entry>
+            <entry ip="2.2.2.2" from_agent="0" persistent="1"><tag><member>tag</member></tag></entry>
+        </result>
+    </response>
+    """
+    requests_mock.get(Panorama.URL, text=registered_ips_xml)
+    requests_mock.post(Panorama.URL, text='<response status="success"><result><uid-response><version>2.0</version>'
+                                          '<payload/></uid-response></result></response>')
+
+    result = Panorama.panorama_bulk_ip_tag_command({'tag': 'tag', 'IPs': '2.2.2.2,3.3.3.3', 'action': 'sync'})
+
+    sent_messages = sorted(parse_qs(request.text)['cmd'][0] for request in requests_mock.request_history
+                           if request.method == 'POST')
+    assert len(sent_messages) == 2
+    assert '<register><entry ip="3.3.3.3" persistent="1">' in sent_messages[0]
+    assert '<unregister><entry ip="1.1.1.1">' in sent_messages[1]
+    assert result.outputs == {'Tag': 'tag', 'Registered': 1, 'Unregistered': 1, 'Unchanged': 1, 'Messages': 2}
+
+
+def test_panorama_bulk_user_tag_timeout(mocker, requests_mock):
+    """
+    Given:
+        - A tag registered to two pages of users, one of which is user1.
+    When:
+        - Registering user1 and user2 to the tag with a timeout.
+    Then:
+        - Both pages of the registered users are read.
+        - Both users are registered, so the timeout of the registered user is renewed, in a register-user message.
+    """
+    import Panorama
+    from urllib.parse import parse_qs
+    mocker.patch.object(Panorama, 'URL', 'https://1.1.1.1:443/api/')
+    mocker.patch.object(Panorama, 'REGISTERED_OBJECTS_PAGE_SIZE', 1)
+    mocker.patch.object(Panorama, 'get_pan_os_major_version', return_value=9)
+    registered_users_xml = '<response status="success"><result><entry user="{}"><tag><member>tag</member></tag>' \
+                           '</entry></result></response>'
+    requests_mock.get(Panorama.URL, [{'text': registered_users_xml.format('user1')},
+                                     {'text': registered_users_xml.format('user3')},
+                                     {'text': '<response status="success"><result/></response>'}])
+    requests_mock.post(Panorama.URL, text='<response status="success"><result><uid-response><version>2.0</version>'
+                                          '<payload/></uid-response></result></response>')
+
+    result = Panorama.panorama_bulk_user_tag_command({'tag': 'tag', 'Users': 'user1,user2', 'timeout': '60'})
+
+    start_points = [parse_qs(request.query)['cmd'][0].split('<start-point>')[1].split('<')[0]
+                    for request in requests_mock.request_history if request.method == 'GET']
+    assert start_points == ['1', '2', '3']
+    [sent_message] = [parse_qs(request.text)['cmd'][0] for request in requests_mock.request_history
+                      if request.method == 'POST']
+    assert sent_message == '<uid-message><version>2.0</version><type>update</type><payload><register-user>' \
+                           '<entry user="user1"><tag><member timeout="60">tag</member></tag></entry>' \
+                           '<entry user="user2"><tag><member timeout="60">tag</member></tag></entry>' \
+                           '</register-user></payload></uid-message>'
+    assert result.outputs == {'Tag': 'tag', 'Registered': 2, 'Unregistered': 0, 'Unchanged': 0, 'Messages': 1}
+
+
+def test_panorama_get_logs_to_file(mocker, requests_mock, tmp_path):
+    """
+    Given:
+        - A finished logs query job of three logs.
+    When:
+        - Getting its logs into a CSV file, two logs per page.
+    Then:
+        - Two pages are retrieved, all three logs are written to the file, and only their summary is in the context.
+    """
+    import csv
+    import Panorama
+    mocker.patch.object(Panorama, 'URL', 'https://1.1.1.1:443/api/')
+    mocker.patch.object(demisto, 'investigation', return_value={'id': str(tmp_path / 'inv')})
+    mocker.patch.object(demisto, 'uniqueFile', return_value='logs')
+    mocker.patch.object(Panorama, 'return_results')
+    entries = ['<entry logid="{0}"><time_generated>2020/09/2{0} 10:00:00</time_generated><src>1.1.1.{0}</src>'
+               '<app>ssl</app></entry>'.format(i) for i in range(3)]
+
+    def logs_page(request, context):
+        skip = int(request.qs['skip'][0])
+        return '<response status="success"><result><job><id>7</id><status>FIN</status></job><log>' \
+               '<logs count="2" progress="100">' + ''.join(entries[skip:skip + 2]) + '</logs></log></result></response>'
+
+    requests_mock.get(Panorama.URL, text=logs_page)
+
+    Panorama.panorama_get_logs_command({'job_id': '7', 'file_format': 'csv', 'page_size': '2'})
+
+    assert [request.qs['skip'] for request in requests_mock.request_history] == [['0'], ['2']]
+    with open(str(tmp_path / 'inv') + '_logs') as logs_file:
+        logs = list(csv.DictReader(logs_file))
+    assert [log['SourceAddress'] for log in logs] == ['1.1.1.0', '1.1.1.1', '1.1.1.2']
+    file_entry, summary_entry = [call[0][0] for call in Panorama.return_results.call_args_list]
+    assert file_entry['File'] == '7_logs.csv'
+    assert summary_entry['EntryContext']['Panorama.Monitor(val.JobID == obj.JobID)'] == {
+        'JobID': '7', 'Status': 'Completed', 'LogsCount': 3, 'FirstTimeGenerated': '2020/09/20 10:00:00',
+        'LastTimeGenerated': '2020/09/22 10:00:00', 'FileName': '7_logs.csv'
+    }
+
+
+@pytest.mark.parametrize('cached_logs, max_pages, expected_skips, expected_logs', [
+    ('<cached-logs>4</cached-logs>', 1000, [['0'], ['2']], 4),
+    ('', 1000, [['0'], ['2'], ['4']], 4),
+    ('', 1, [['0']], 2),
+])
+def test_iterate_job_logs_bounds(mocker, requests_mock, cached_logs, max_pages, expected_skips, expected_logs):
+    """
+    Given:
+        - A finished logs query job of four logs, with and without the number of logs the job reported.
+    When:
+        - Iterating its logs two logs per page, with and without a maximal number of pages.
+    Then:
+        - The pages are retrieved until the reported number of logs, a short page, or the maximal number of pages.
+    """
+    import Panorama
+    mocker.patch.object(Panorama, 'URL', 'https://1.1.1.1:443/api/')
+    mocker.patch.object(Panorama, 'LOGS_MAX_PAGES', max_pages)
+    entries = ['<entry logid="{0}"><src>1.1.1.{0}</src></entry>'.format(i) for i in range(4)]
+
+    def logs_page(request, context):
+        skip = int(request.qs['skip'][0])
+        return f'<response status="success"><result><job><id>7</id><status>FIN</status>{cached_logs}</job><log>' \
+               '<logs count="2" progress="100">' + ''.join(entries[skip:skip + 2]) + '</logs></log></result></response>'
+
+    requests_mock.get(Panorama.URL, text=logs_page)
+    first_page = Panorama.panorama_get_logs_page('7', 0, 2)
+    job = next(Panorama.xml2dict_iter(first_page, 'job'))
+
+    logs = list(Panorama.iterate_job_logs('7', 2, first_page, Panorama.arg_to_number(job.get('cached-logs'))))
+
+    assert [request.qs['skip'] for request in requests_mock.request_history] == expected_skips
+    assert len(logs) == expected_logs
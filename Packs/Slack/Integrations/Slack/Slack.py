@@ -7,7 +7,7 @@ import sys
 import threading
 import traceback
 from distutils.util import strtobool
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 import requests
 import slack
@@ -55,6 +55,28 @@ OBJECTS_TO_KEYS = {
     'users': 'id'
 }
 SYNC_CONTEXT = True
+STATE_REFRESH_SECONDS = 5
+STATE_IDS = dict(OBJECTS_TO_KEYS, conversations='id')
+STATE_INDEXES: Dict[str, Dict[str, Callable[[dict], list]]] = {
+    'users': {
+        'id': lambda user: [user.get('id')],
+        'name': lambda user: [(user.get('name') or '').lower(),
+                              (user.get('profile', {}).get('email') or '').lower(),
+                              (user.get('real_name') or '').lower()]
+    },
+    'conversations': {
+        'id': lambda conversation: [conversation.get('id')],
+        'name': lambda conversation: [(conversation.get('name') or '').lower()]
+    },
+    'mirrors': {
+        'investigation_id': lambda mirror: [mirror.get('investigation_id')],
+        'channel_id': lambda mirror: [mirror.get('channel_id')]
+    },
+    'questions': {
+        'entitlement': lambda question: [question.get('entitlement')],
+        'thread': lambda question: [question.get('thread')]
+    }
+}
 
 ''' GLOBALS '''
 
@@ -80,6 +102,165 @@ PAGINATED_COUNT: int
 ''' HELPER FUNCTIONS '''
 
 
+class SlackState:
+    """
+    A process local cache of the users, conversations, mirrors and questions in the integration context,
+    indexed for O(1) lookups. Each key is deserialized again only when it was changed in the integration context.
+
+    By default, every read reconciles the cache with the integration context and every update is written through.
+    In write behind mode (used by the long running execution), the integration context is read at most once in a
+    refresh interval, and the updates are written in batches by flush, merged with the latest context version.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.write_behind = False
+        self.refresh_interval = 0.0
+        self.last_refresh = 0.0
+        self.raw: Dict[str, Any] = {}
+        self.objects: Dict[str, Dict[str, dict]] = {key: {} for key in STATE_INDEXES}
+        self.indexes: Dict[str, Dict[str, Dict[str, list]]] = {
+            key: {name: {} for name in indexes} for key, indexes in STATE_INDEXES.items()
+        }
+        self.pending: Dict[str, Dict[str, dict]] = {}
+
+    def set_write_behind(self, refresh_interval: float):
+        """
+        Enables write behind mode.
+
+        Args:
+            refresh_interval: The minimal number of seconds between reads of the integration context.
+        """
+        with self.lock:
+            self.write_behind = True
+            self.refresh_interval = refresh_interval
+
+    def refresh(self):
+        """
+        Reconciles the cache with the integration context, keeping the updates that were not written yet.
+        """
+        with self.lock:
+            if self.write_behind and time.time() - self.last_refresh < self.refresh_interval:
+                return
+            integration_context = get_integration_context(SYNC_CONTEXT)
+            self.last_refresh = time.time()
+            for key in STATE_INDEXES:
+                raw = integration_context.get(key)
+                if key in self.raw and raw == self.raw[key]:
+                    continue
+                self.raw[key] = raw
+                self.objects[key] = {}
+                for index in self.indexes[key].values():
+                    index.clear()
+                for obj in json.loads(raw) if raw else []:
+                    self._apply(key, obj)
+                for obj in self.pending.get(key, {}).values():
+                    self._apply(key, obj)
+
+    def find(self, key: str, index: str, value: str) -> dict:
+        """
+        Finds the first object with the given indexed value.
+
+        Args:
+            key: The integration context key, e.g. users.
+            index: The index name, e.g. id.
+            value: The value to find.
+
+        Returns:
+            The object, or an empty dict if not found.
+        """
+        objects = self.find_all(key, index, value)
+        return objects[0] if objects else {}
+
+    def find_all(self, key: str, index: str, value: str) -> list:
+        """
+        Finds all the objects with the given indexed value.
+
+        Args:
+            key: The integration context key, e.g. mirrors.
+            index: The index name, e.g. channel_id.
+            value: The value to find.
+
+        Returns:
+            A list of the objects.
+        """
+        with self.lock:
+            self.refresh()
+            return list(self.indexes[key][index].get(value, []))
+
+    def values(self, key: str) -> list:
+        """
+        Gets all the objects of an integration context key.
+
+        Args:
+            key: The integration context key, e.g. questions.
+
+        Returns:
+            A list of the objects.
+        """
+        with self.lock:
+            self.refresh()
+            return list(self.objects[key].values())
+
+    def update(self, context: dict):
+        """
+        Updates objects in the cache, and writes them to the integration context unless in write behind mode.
+        Objects with a remove key set to True are removed. Keys without objects are ignored, so their cache is kept.
+
+        Args:
+            context: A dictionary of integration context keys and the updated objects.
+        """
+        with self.lock:
+            for key, objects in context.items():
+                if key not in OBJECTS_TO_KEYS:
+                    raise ValueError(f'Updating {key} is not supported.')
+                if not objects:
+                    continue
+                for obj in objects:
+                    self._apply(key, obj)
+                    self.pending.setdefault(key, {})[obj[STATE_IDS[key]]] = obj
+                # the cached objects no longer match the deserialized value, reconcile them on the next refresh
+                self.raw.pop(key, None)
+            if not self.write_behind:
+                self.flush()
+
+    def flush(self):
+        """
+        Writes the pending updates to the integration context, merged with its latest version.
+        """
+        with self.lock:
+            if not self.pending:
+                return
+            context = {key: list(objects.values()) for key, objects in self.pending.items()}
+            set_to_integration_context_with_retries(context, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+            self.pending = {}
+            # reconcile with the written context on the next read
+            self.last_refresh = 0.0
+
+    def _apply(self, key: str, obj: dict):
+        object_id = obj.get(STATE_IDS[key])
+        existing = self.objects[key].get(object_id)
+        if existing is not None:
+            for name, get_values in STATE_INDEXES[key].items():
+                for value in set(get_values(existing)):
+                    indexed = self.indexes[key][name].get(value)
+                    if indexed:
+                        indexed[:] = [indexed_obj for indexed_obj in indexed if indexed_obj is not existing]
+            if obj.get('remove', False) is True:
+                del self.objects[key][object_id]
+                return
+        elif obj.get('remove', False) is True:
+            return
+        self.objects[key][object_id] = obj
+        for name, get_values in STATE_INDEXES[key].items():
+            for value in set(get_values(obj)):
+                if value:
+                    self.indexes[key][name].setdefault(value, []).append(obj)
+
+
+SLACK_STATE = SlackState()
+
+
 def get_bot_id() -> str:
     """
     Gets the app bot ID
@@ -133,18 +314,8 @@ def get_user_by_name(user_to_search: str, add_to_context: bool = True) -> dict:
         A slack user object
     """
 
-    user: dict = {}
-    users: list = []
-    integration_context = get_integration_context(SYNC_CONTEXT)
-
     user_to_search = user_to_search.lower()
-    if integration_context.get('users'):
-        users = json.loads(integration_context['users'])
-        users_filter = list(filter(lambda u: u.get('name', '').lower() == user_to_search
-                                             or u.get('profile', {}).get('email', '').lower() == user_to_search
-                                             or u.get('real_name', '').lower() == user_to_search, users))
-        if users_filter:
-            user = users_filter[0]
+    user = SLACK_STATE.find('users', 'name', user_to_search)
     if not user:
         body = {
             'limit': PAGINATED_COUNT
@@ -167,8 +338,7 @@ def get_user_by_name(user_to_search: str, add_to_context: bool = True) -> dict:
         if users_filter:
             user = users_filter[0]
             if add_to_context:
-                users.append(user)
-                set_to_integration_context_with_retries({'users': users}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+                SLACK_STATE.update({'users': [user]})
         else:
             return {}
 
@@ -213,13 +383,7 @@ def find_mirror_by_investigation() -> dict:
     mirror: dict = {}
     investigation = demisto.investigation()
     if investigation:
-        integration_context = get_integration_context(SYNC_CONTEXT)
-        if integration_context.get('mirrors'):
-            mirrors = json.loads(integration_context['mirrors'])
-            investigation_filter = list(filter(lambda m: investigation.get('id') == m['investigation_id'],
-                                               mirrors))
-            if investigation_filter:
-                mirror = investigation_filter[0]
+        mirror = SLACK_STATE.find('mirrors', 'investigation_id', investigation.get('id'))
 
     return mirror
 
@@ -343,18 +507,12 @@ async def get_slack_name(slack_id: str, client) -> str:
     if not slack_id:
         return ''
 
-    integration_context = get_integration_context(SYNC_CONTEXT)
     prefix = slack_id[0]
     slack_name = ''
 
     if prefix in ['C', 'D', 'G']:
         slack_id = slack_id.split('|')[0]
-        conversation: dict = {}
-        if integration_context.get('conversations'):
-            conversations = list(filter(lambda c: c['id'] == slack_id,
-                                        json.loads(integration_context['conversations'])))
-            if conversations:
-                conversation = conversations[0]
+        conversation = SLACK_STATE.find('conversations', 'id', slack_id)
         if not conversation:
             body = {
                 'channel': slack_id
@@ -364,11 +522,7 @@ async def get_slack_name(slack_id: str, client) -> str:
                                                            body=body)).get('channel', {})
         slack_name = conversation.get('name', '')
     elif prefix == 'U':
-        user: dict = {}
-        if integration_context.get('users'):
-            users = list(filter(lambda u: u['id'] == slack_id, json.loads(integration_context['users'])))
-            if users:
-                user = users[0]
+        user = SLACK_STATE.find('users', 'id', slack_id)
         if not user:
             body = {
                 'user': slack_id
@@ -604,6 +758,7 @@ def long_running_loop():
         try:
             check_for_mirrors()
             check_for_answers()
+            SLACK_STATE.flush()
         except requests.exceptions.ConnectionError as e:
             error = f'Could not connect to the Slack endpoint: {str(e)}'
         except Exception as e:
@@ -620,16 +775,11 @@ def check_for_answers():
     Checks for answered questions
     """
 
-    integration_context = get_integration_context(SYNC_CONTEXT)
-    questions = integration_context.get('questions', [])
-    users = integration_context.get('users', [])
-    if questions:
-        questions = json.loads(questions)
-    if users:
-        users = json.loads(users)
+    questions = SLACK_STATE.values('questions')
     now = get_current_utc_time()
     now_string = datetime.strftime(now, DATE_FORMAT)
     updated_questions = []
+    updated_users = []
 
     for question in questions:
         if question.get('last_poll_time'):
@@ -681,20 +831,22 @@ def check_for_answers():
         if actions:
             demisto.info(f'Slack - received answer from user for entitlement {entitlement}.')
             user_id = payload.get('user', {}).get('id')
-            user_filter = list(filter(lambda u: u['id'] == user_id, users))
-            if user_filter:
-                user = user_filter[0]
-            else:
+            user = SLACK_STATE.find('users', 'id', user_id)
+            if not user:
                 body = {
                     'user': user_id
                 }
                 user = send_slack_request_sync(CLIENT, 'users.info', http_verb='GET', body=body).get('user', {})
-                users.append(user)
+                updated_users.append(user)
 
             answer_question(actions[0].get('text', {}).get('text'), question, user.get('profile', {}).get('email'))
 
     if updated_questions:
-        set_to_integration_context_with_retries({'users': users, 'questions': questions}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+        context = {'questions': updated_questions}
+        if updated_users:
+            context['users'] = updated_users
+
+        SLACK_STATE.update(context)
 
 
 def get_poll_minutes(current_time: datetime, sent: Optional[str]) -> float:
@@ -751,16 +903,14 @@ def check_for_mirrors():
     """
     Checks for newly created mirrors and handles the mirroring process
     """
-    integration_context = get_integration_context(SYNC_CONTEXT)
-    if integration_context.get('mirrors'):
-        mirrors = json.loads(integration_context['mirrors'])
+    mirrors = SLACK_STATE.values('mirrors')
+    if mirrors:
         updated_mirrors = []
         updated_users = []
         for mirror in mirrors:
             if not mirror['mirrored']:
                 investigation_id = mirror['investigation_id']
                 demisto.info(f'Mirroring: {investigation_id}')
-                mirror = mirrors.pop(mirrors.index(mirror))
                 if mirror['mirror_to'] and mirror['mirror_direction'] and mirror['mirror_type']:
                     mirror_type = mirror['mirror_type']
                     auto_close = mirror['auto_close']
@@ -787,7 +937,7 @@ def check_for_mirrors():
             if updated_users:
                 context['users'] = updated_users
 
-            set_to_integration_context_with_retries(context, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+            SLACK_STATE.update(context)
 
 
 def invite_to_mirrored_channel(channel_id: str, users: List[Dict]) -> list:
@@ -1105,12 +1255,7 @@ async def listen(**payload: Any):
             await handle_dm(user, text, client)
         else:
             channel_id = data.get('channel')
-            integration_context = get_integration_context(SYNC_CONTEXT)
-            if not integration_context or 'mirrors' not in integration_context:
-                return
-
-            mirrors = json.loads(integration_context['mirrors'])
-            mirror_filter = list(filter(lambda m: m['channel_id'] == channel_id, mirrors))
+            mirror_filter = SLACK_STATE.find_all('mirrors', 'channel_id', channel_id)
             if not mirror_filter:
                 return
 
@@ -1120,7 +1265,6 @@ async def listen(**payload: Any):
 
                 if not mirror['mirrored']:
                     # In case the investigation is not mirrored yet
-                    mirror = mirrors.pop(mirrors.index(mirror))
                     if mirror['mirror_to'] and mirror['mirror_direction'] and mirror['mirror_type']:
                         investigation_id = mirror['investigation_id']
                         mirror_type = mirror['mirror_type']
@@ -1131,8 +1275,7 @@ async def listen(**payload: Any):
                         demisto.info(f'Mirroring: {investigation_id}')
                         demisto.mirrorInvestigation(investigation_id, f'{mirror_type}:{direction}', auto_close)
                         mirror['mirrored'] = True
-                        mirrors.append(mirror)
-                        set_to_integration_context_with_retries({'mirrors': mirrors}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+                        SLACK_STATE.update({'mirrors': [mirror]})
 
                 investigation_id = mirror['investigation_id']
                 await handle_text(client, investigation_id, text, user)
@@ -1152,21 +1295,13 @@ async def get_user_by_id_async(client: slack.WebClient, user_id: str) -> dict:
     Returns:
         The slack user.
     """
-    user: dict = {}
-    users: list = []
-    integration_context = get_integration_context(SYNC_CONTEXT)
-    if integration_context.get('users'):
-        users = json.loads(integration_context['users'])
-        user_filter = list(filter(lambda u: u['id'] == user_id, users))
-        if user_filter:
-            user = user_filter[0]
+    user = SLACK_STATE.find('users', 'id', user_id)
     if not user:
         body = {
             'user': user_id
         }
         user = (await send_slack_request_async(client, 'users.info', http_verb='GET', body=body)).get('user', {})
-        users.append(user)
-        set_to_integration_context_with_retries({'users': users}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+        SLACK_STATE.update({'users': [user]})
 
     return user
 
@@ -1211,23 +1346,18 @@ async def check_and_handle_entitlement(text: str, user: dict, thread_id: str) ->
 
         return 'Thank you for your response.'
     else:
-        integration_context = get_integration_context(SYNC_CONTEXT)
-        questions = integration_context.get('questions', [])
-        if questions and thread_id:
-            questions = json.loads(questions)
-            question_filter = list(filter(lambda q: q.get('thread') == thread_id, questions))
-            if question_filter:
-                question = question_filter[0]
-                demisto.info('Slack - handling entitlement in thread.')
-                entitlement = question.get('entitlement')
-                reply = question.get('reply', 'Thank you for your response.')
-                content, guid, incident_id, task_id = extract_entitlement(entitlement, text)
-                demisto.handleEntitlementForUser(incident_id, guid, user.get('profile', {}).get('email'), content,
-                                                 task_id)
-                question['remove'] = True
-                set_to_integration_context_with_retries({'questions': questions}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
-
-                return reply
+        question = SLACK_STATE.find('questions', 'thread', thread_id) if thread_id else {}
+        if question:
+            demisto.info('Slack - handling entitlement in thread.')
+            entitlement = question.get('entitlement')
+            reply = question.get('reply', 'Thank you for your response.')
+            content, guid, incident_id, task_id = extract_entitlement(entitlement, text)
+            demisto.handleEntitlementForUser(incident_id, guid, user.get('profile', {}).get('email'), content,
+                                             task_id)
+            question['remove'] = True
+            SLACK_STATE.update({'questions': [question]})
+
+            return reply
 
     return ''
 
@@ -1245,21 +1375,10 @@ def get_conversation_by_name(conversation_name: str) -> dict:
     Returns:
         The slack conversation
     """
-    integration_context = get_integration_context(SYNC_CONTEXT)
-
-    conversation_to_search = conversation_name.lower()
     # Find conversation in the cache
-    conversations = integration_context.get('conversations')
-    if conversations:
-        conversations = json.loads(conversations)
-        conversation_filter = list(
-            filter(
-                lambda c: conversation_to_search == c.get('name', '').lower(),
-                conversations
-            )
-        )
-        if conversation_filter:
-            return conversation_filter[0]
+    conversation = SLACK_STATE.find('conversations', 'name', conversation_name.lower())
+    if conversation:
+        return conversation
 
     # If not found in cache, search for it
     body = {
@@ -1267,7 +1386,6 @@ def get_conversation_by_name(conversation_name: str) -> dict:
         'limit': PAGINATED_COUNT
     }
     response = send_slack_request_sync(CLIENT, 'conversations.list', http_verb='GET', body=body)
-    conversation: dict = {}
     while True:
         conversations = response['channels'] if response and response.get('channels') else []
         cursor = response.get('response_metadata', {}).get('next_cursor')
@@ -1285,6 +1403,7 @@ def get_conversation_by_name(conversation_name: str) -> dict:
 
     # Save conversations to cache
     if conversation:
+        integration_context = get_integration_context(SYNC_CONTEXT)
         conversations = integration_context.get('conversations')
         if conversations:
             conversations = json.loads(conversations)
@@ -1905,6 +2024,7 @@ def long_running_main():
     """
     Starts the long running thread.
     """
+    SLACK_STATE.set_write_behind(STATE_REFRESH_SECONDS)
     asyncio.run(start_listening())
 
 
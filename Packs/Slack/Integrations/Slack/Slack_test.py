@@ -4353,3 +4353,107 @@ def test_send_message_to_destinations_non_strict():
                   }
               ]"""
     send_message_to_destinations([], "", "", blocks=blocks)  # No destinations, no response
+
+
+def test_slack_state_write_behind(mocker):
+    """
+    Given:
+        A Slack state in write behind mode
+
+    When:
+        Looking up users and mirrors, updating a mirror and flushing after another process updated the context
+
+    Then:
+        The integration context is read once in the refresh interval and written only on flush,
+        merged with the latest context
+    """
+    from Slack import SlackState
+
+    set_integration_context({
+        'mirrors': MIRRORS,
+        'users': USERS,
+        'conversations': CONVERSATIONS,
+        'bot_id': 'W12345678'
+    })
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    state = SlackState()
+    state.set_write_behind(60)
+
+    assert state.find('users', 'name', 'spengler@ghostbusters.example.com')['id'] == 'U012A3CDE'
+    assert state.find('users', 'id', 'U012A3CDE')['name'] == 'spengler'
+    mirror = state.find('mirrors', 'investigation_id', '681')
+    assert mirror['channel_id'] == 'GKQ86DVPH'
+    assert demisto.getIntegrationContext.call_count == 1
+
+    mirror['mirrored'] = False
+    state.update({'mirrors': [mirror]})
+    assert demisto.setIntegrationContext.call_count == 0
+
+    # another process adds a user in the meantime
+    users = js.loads(USERS)
+    users.append({'id': 'U012B3CUI', 'name': 'perikles'})
+    set_integration_context(dict(get_integration_context(), users=js.dumps(users)))
+
+    state.flush()
+    new_context = demisto.setIntegrationContext.call_args[0][0]
+    assert len(js.loads(new_context['users'])) == len(users)
+    assert [m for m in js.loads(new_context['mirrors']) if m['investigation_id'] == '681'][0]['mirrored'] is False
+
+    assert state.find('users', 'name', 'perikles')['id'] == 'U012B3CUI'
+
+
+def test_slack_state_remove_question(mocker):
+    """
+    Given:
+        A Slack state with a question
+
+    When:
+        Removing the question
+
+    Then:
+        The question can no longer be found by its thread and is removed from the integration context
+    """
+    from Slack import SlackState
+
+    questions = [{'thread': 'cool', 'entitlement': 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43'}]
+    set_integration_context({'questions': js.dumps(questions)})
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    state = SlackState()
+
+    question = state.find('questions', 'thread', 'cool')
+    question['remove'] = True
+    state.update({'questions': [question]})
+
+    assert state.find('questions', 'thread', 'cool') == {}
+    assert js.loads(get_integration_context()['questions']) == []
+
+
+def test_slack_state_update_empty_key(mocker):
+    """
+    Given:
+        A Slack state with cached users and a question
+
+    When:
+        Updating the question along with an empty list of users
+
+    Then:
+        The users are not deserialized again on the next lookup
+    """
+    from Slack import SlackState
+
+    questions = [{'thread': 'cool', 'entitlement': 'e95cb5a1-e394-4bc5-8ce0-508973aaf298@22|43'}]
+    set_integration_context({'questions': js.dumps(questions), 'users': USERS})
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(demisto, 'setIntegrationContext', side_effect=set_integration_context)
+    state = SlackState()
+
+    question = state.find('questions', 'thread', 'cool')
+    question['last_poll_time'] = '2019-09-26 18:38:25'
+    loads = mocker.spy(js, 'loads')
+    state.update({'users': [], 'questions': [question]})
+
+    assert state.find('users', 'id', 'U012A3CDE')['name'] == 'spengler'
+    assert not any(call[0][0] == USERS for call in loads.call_args_list)
+    assert js.loads(get_integration_context()['questions'])[0]['last_poll_time'] == '2019-09-26 18:38:25'
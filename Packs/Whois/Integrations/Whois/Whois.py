@@ -5,10 +5,27 @@ import re
 import socket
 import sys
 from codecs import encode, decode
+from contextlib import contextmanager
+from multiprocessing.pool import ThreadPool
 import socks
 import errno
+import threading
 
 SHOULD_ERROR = demisto.params().get('with_error', False)
+CACHE_TTL_HOURS = int(demisto.params().get('cache_ttl') or 0)
+# only the fields the outputs are created from are cached, and the cache is capped by its entries and serialized size
+CACHE_MAX_SIZE = 1000
+CACHE_MAX_BYTES = 512 * 1024
+CACHE_MAX_RESULT_BYTES = 32 * 1024
+CACHED_FIELDS = ('id', 'status', 'raw', 'nameservers', 'creation_date', 'expiration_date', 'updated_date', 'registrar',
+                 'emails', 'contacts')
+CACHE_DATETIME_KEY = '__datetime__'
+CACHE_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# bulk lookups are queried concurrently, with a limit on the connections and the query rate of every WHOIS server
+MAX_WORKERS = 10
+WHOIS_SERVER_MAX_CONNECTIONS = 2
+WHOIS_SERVER_MIN_INTERVAL = 0.5
 
 # flake8: noqa
 
@@ -7170,7 +7187,8 @@ def get_whois_raw(domain, server="", previous=None, rfc3490=True, never_cut=Fals
     # If the request fails due to other cause - there will not be another try
     for i in range(0, 3):
         try:
-            response = whois_request(request_domain, target_server)
+            with WHOIS_SERVER_THROTTLE.query(target_server):
+                response = whois_request(request_domain, target_server)
         except socket.error as err:
             if err.errno == errno.ECONNRESET:
                 continue
@@ -7227,20 +7245,7 @@ def get_root_server(domain):
         try:
             host = entry["host"]
         except KeyError:
-            context = ({
-                outputPaths['domain']: {
-                    'Name': domain,
-                    'Whois': {
-                        'QueryStatus': 'Failed'
-                    }
-                },
-            })
-            if SHOULD_ERROR:
-                return_error('The domain - {} - is not supported by the Whois service'.format(domain),
-                             outputs=context)
-            else:
-                return_warning('The domain - {} - is not supported by the Whois service'.format(domain),
-                               exit=True, outputs=context)
+            raise WhoisQueryFailed('The domain - {} - is not supported by the Whois service'.format(domain), domain)
 
         return host
 
@@ -7253,20 +7258,7 @@ def whois_request(domain, server, port=43):
     try:
         sock.connect((server, port))
     except Exception as msg:
-        context = ({
-            outputPaths['domain']: {
-                'Name': domain,
-                'Whois': {
-                    'QueryStatus': 'Failed'
-                }
-            },
-        })
-
-        if SHOULD_ERROR:
-            return_error("Whois returned - Couldn't connect with the socket-server: {}".format(msg), outputs=context)
-        else:
-            return_warning("Whois returned - Couldn't connect with the socket-server: {}".format(msg),
-                           exit=True, outputs=context)
+        raise WhoisQueryFailed("Whois returned - Couldn't connect with the socket-server: {}".format(msg), domain)
 
     else:
         sock.send(("%s\r\n" % domain).encode("utf-8"))
@@ -7298,6 +7290,43 @@ class WhoisException(Exception):
     pass
 
 
+class WhoisQueryFailed(WhoisException):
+    """A query that could not be completed, reported as a failed query of the domain"""
+
+    def __init__(self, message, domain):
+        super(WhoisQueryFailed, self).__init__(message)
+        self.domain = domain
+
+
+class WhoisServerThrottle(object):
+    """Limits the concurrent connections and the query rate to every WHOIS server, to avoid being banned by registrars"""
+
+    def __init__(self, max_connections, min_interval):
+        self._max_connections = max_connections
+        self._min_interval = min_interval
+        self._lock = threading.Lock()
+        self._semaphores = {}  # type: dict
+        self._next_query_time = {}  # type: dict
+
+    @contextmanager
+    def query(self, server):
+        with self._lock:
+            if server not in self._semaphores:
+                self._semaphores[server] = threading.BoundedSemaphore(self._max_connections)
+            semaphore = self._semaphores[server]
+        with semaphore:
+            with self._lock:
+                now = time.time()
+                query_time = max(now, self._next_query_time.get(server, 0))
+                self._next_query_time[server] = query_time + self._min_interval
+            if query_time > now:
+                time.sleep(query_time - now)
+            yield
+
+
+WHOIS_SERVER_THROTTLE = WhoisServerThrottle(WHOIS_SERVER_MAX_CONNECTIONS, WHOIS_SERVER_MIN_INTERVAL)
+
+
 def precompile_regexes(source, flags=0):
     return [re.compile(regex, flags) for regex in source]
 
@@ -7649,6 +7678,71 @@ nic_contact_references["tech"] = precompile_regexes(nic_contact_references["tech
 nic_contact_references["admin"] = precompile_regexes(nic_contact_references["admin"])
 nic_contact_references["billing"] = precompile_regexes(nic_contact_references["billing"])
 
+# Fields of the common "key: value" lines, by their lowercase key. Lines with other keys, or that are not "key: value"
+# lines, are matched with the regexes of grammar["_data"] instead. None marks keys that are known not to hold a field.
+key_value_fields = {
+    'domain id': 'id',
+    'registry domain id': 'id',
+    'status': 'status',
+    'domain status': 'status',
+    'state': 'status',
+    'creation date': 'creation_date',
+    'created': 'creation_date',
+    'created on': 'creation_date',
+    'created date': 'creation_date',
+    'created-date': 'creation_date',
+    'domain created': 'creation_date',
+    'domain registration date': 'creation_date',
+    'record created': 'creation_date',
+    'registered': 'creation_date',
+    'registered on': 'creation_date',
+    'registration': 'creation_date',
+    'registration date': 'creation_date',
+    'expire': 'expiration_date',
+    'expire date': 'expiration_date',
+    'expire-date': 'expiration_date',
+    'expires': 'expiration_date',
+    'expires on': 'expiration_date',
+    'expiration date': 'expiration_date',
+    'expiry': 'expiration_date',
+    'expiry date': 'expiration_date',
+    'domain expiration date': 'expiration_date',
+    'paid-till': 'expiration_date',
+    'registrar registration expiration date': 'expiration_date',
+    'registry expiry date': 'expiration_date',
+    'renewal': 'expiration_date',
+    'changed': 'updated_date',
+    'date modified': 'updated_date',
+    'last modified': 'updated_date',
+    'last update': 'updated_date',
+    'last updated': 'updated_date',
+    'last-updated': 'updated_date',
+    'modified': 'updated_date',
+    'updated date': 'updated_date',
+    'registrar': 'registrar',
+    'registrar name': 'registrar',
+    'registrar of record': 'registrar',
+    'sponsoring registrar organization': 'registrar',
+    'registrar whois': 'whois_server',
+    'registrar whois server': 'whois_server',
+    'whois server': 'whois_server',
+    'hostname': 'nameservers',
+    'name server': 'nameservers',
+    'nameserver': 'nameservers',
+    'nameservers': 'nameservers',
+    'nserver': 'nameservers',
+}  # type: dict
+for key in ('domain', 'domain name', 'dnssec', 'dnskey', 'reseller', 'source', 'script', 'hold', 'type', 'website',
+            'registrar url', 'registrar iana id', 'registrar abuse contact email', 'registrar abuse contact phone',
+            'org', 'taxpayer-id', 'admin-contact', 'free-date', 'holder-c', 'admin-c', 'tech-c', 'zone-c', 'nsl-id',
+            'dsl-id', 'ns-list', 'address', 'country', 'phone', 'fax-no', 'e-mail', 'anonymous'):
+    key_value_fields[key] = None
+for contact in ('registrant', 'admin', 'tech', 'billing'):
+    for contact_field in ('id', 'name', 'organization', 'street', 'city', 'state/province', 'postal code',
+                          'country', 'phone', 'phone ext', 'fax', 'fax ext', 'email'):
+        key_value_fields['{} {}'.format(contact, contact_field)] = None
+
+
 if sys.version_info < (3, 0):
     def is_string(data):
         """Test for string with support for python 2."""
@@ -7666,19 +7760,8 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
     raw_data = [segment.replace("\r", "") for segment in raw_data]  # Carriage returns are the devil
 
     for segment in raw_data:
-        for rule_key, rule_regexes in grammar['_data'].items():  # type: ignore
-            if (rule_key in data) == False:
-                for line in segment.splitlines():
-                    for regex in rule_regexes:
-                        result = re.search(regex, line)
-
-                        if result is not None:
-                            val = result.group("val").strip()
-                            if val != "":
-                                try:
-                                    data[rule_key].append(val)
-                                except KeyError as e:
-                                    data[rule_key] = [val]
+        for rule_key, values in parse_segment_fields(segment, skip_keys=set(data)).items():
+            data[rule_key] = values
 
         # Whois.com is a bit special... Fabulous.com also seems to use this format. As do some others.
         match = re.search("^\s?Name\s?[Ss]ervers:?\s*\n((?:\s*.+\n)+?\s?)\n", segment, re.MULTILINE)
@@ -7742,7 +7825,7 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
         # SIDN isn't very standard either. And EURid uses a similar format.
         match = re.search("Registrar:\n\s+(?:Name:\s*)?(\S.*)", segment)
         if match is not None:
-            data["registrar"].insert(0, match.group(1).strip())
+            data.setdefault("registrar", []).insert(0, match.group(1).strip())
         match = re.search("(?:Domain nameservers|Name servers):([\s\S]*?\n)\n", segment)
         if match is not None:
             chunk = match.group(1)
@@ -7757,7 +7840,7 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
         # The .ie WHOIS server puts ambiguous status information in an unhelpful order
         match = re.search('ren-status:\s*(.+)', segment)
         if match is not None:
-            data["status"].insert(0, match.group(1).strip())
+            data.setdefault("status", []).insert(0, match.group(1).strip())
         # nic.it gives us the registrar in a multi-line format...
         match = re.search('Registrar\n  Organization:     (.+)\n', segment)
         if match is not None:
@@ -7788,19 +7871,19 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
     # Parse dates
     try:
         data['expiration_date'] = remove_duplicates(data['expiration_date'])
-        data['expiration_date'] = parse_dates(data['expiration_date'])
+        data['expiration_date'] = remove_duplicates(parse_dates(data['expiration_date']) or [])
     except KeyError as e:
         pass  # Not present
 
     try:
         data['creation_date'] = remove_duplicates(data['creation_date'])
-        data['creation_date'] = parse_dates(data['creation_date'])
+        data['creation_date'] = remove_duplicates(parse_dates(data['creation_date']) or [])
     except KeyError as e:
         pass  # Not present
 
     try:
         data['updated_date'] = remove_duplicates(data['updated_date'])
-        data['updated_date'] = parse_dates(data['updated_date'])
+        data['updated_date'] = remove_duplicates(parse_dates(data['updated_date']) or [])
     except KeyError as e:
         pass  # Not present
 
@@ -7845,6 +7928,56 @@ def parse_raw_whois(raw_data, normalized=None, never_query_handles=True, handle_
     return data
 
 
+def parse_segment_fields(segment, skip_keys=()):
+    """Parses the fields of a WHOIS response segment in a single pass over its lines.
+
+    "key: value" lines with a known key are dispatched by their key, and only the rest of the lines are matched with the
+    regexes of grammar["_data"].
+
+    Args:
+        segment: The WHOIS response segment.
+        skip_keys: Fields that should not be parsed, since they were found in a previous segment.
+
+    Returns:
+        dict. The values of every field found, in the order of the lines.
+    """
+    fields = {}  # type: dict
+    for line in segment.splitlines():
+        key, separator, value = line.partition(':')
+        key = ' '.join(key.lower().split())
+        if not separator or key not in key_value_fields:
+            parse_line_fields(line, fields, skip_keys)
+            continue
+
+        rule_key = key_value_fields[key]
+        value = value.strip()
+        if rule_key and rule_key not in skip_keys and value:
+            fields.setdefault(rule_key, []).append(value)
+        if '@' in value or ' AT ' in value:
+            parse_line_fields(line, fields, skip_keys, rule_keys=('emails',))
+    return fields
+
+
+def parse_segment_fields_with_regexes(segment, skip_keys=()):
+    """Parses the fields of a WHOIS response segment by matching all of its lines with the regexes of grammar["_data"]"""
+    fields = {}  # type: dict
+    for line in segment.splitlines():
+        parse_line_fields(line, fields, skip_keys)
+    return fields
+
+
+def parse_line_fields(line, fields, skip_keys=(), rule_keys=None):
+    for rule_key, rule_regexes in grammar['_data'].items():  # type: ignore
+        if rule_key in skip_keys or (rule_keys is not None and rule_key not in rule_keys):
+            continue
+        for regex in rule_regexes:
+            result = regex.search(line)
+            if result is not None:
+                val = result.group("val").strip()
+                if val != "":
+                    fields.setdefault(rule_key, []).append(val)
+
+
 def normalize_data(data, normalized):
     for key in ("nameservers", "emails", "whois_server"):
         if key in data and data[key] is not None and (normalized == True or key in normalized):
@@ -8253,6 +8386,119 @@ def get_whois(domain, normalized=None):
                            handle_server=server_list[-1])
 
 
+def query_whois(domain):
+    """Queries and parses the WHOIS of a domain, returning the exception instead of raising it, for use in a pool"""
+    try:
+        return get_whois(domain)
+    except Exception as e:
+        return e
+
+
+def serialize_whois_result(value):
+    """Converts the dates of a parsed WHOIS result, so it can be cached in the integration context"""
+    if isinstance(value, datetime):
+        return {CACHE_DATETIME_KEY: value.strftime(CACHE_DATETIME_FORMAT)}
+    if isinstance(value, dict):
+        return {key: serialize_whois_result(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [serialize_whois_result(val) for val in value]
+    return value
+
+
+def deserialize_whois_result(value):
+    """Restores the dates of a parsed WHOIS result that was cached in the integration context"""
+    if isinstance(value, dict):
+        if CACHE_DATETIME_KEY in value:
+            return datetime.strptime(value[CACHE_DATETIME_KEY], CACHE_DATETIME_FORMAT)
+        return {key: deserialize_whois_result(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [deserialize_whois_result(val) for val in value]
+    return value
+
+
+def prune_whois_cache(cache):
+    """Removes the oldest entries of the WHOIS cache, keeping it within its maximal entries and serialized size"""
+    kept_entries = total_size = 0
+    is_full = False
+    for domain, entry in sorted(cache.items(), key=lambda item: item[1]['time'], reverse=True):
+        total_size += entry.get('size') or len(json.dumps(entry['result']))
+        is_full = is_full or kept_entries == CACHE_MAX_SIZE or total_size > CACHE_MAX_BYTES
+        if is_full:
+            del cache[domain]
+        else:
+            kept_entries += 1
+
+
+def get_whois_results(domains):
+    """Gets the WHOIS results of the domains.
+
+    Results that were cached in the integration context less than the cache TTL ago are returned without a query. The
+    rest of the domains are queried concurrently, and their results are cached, unless no matching result was found.
+
+    Returns:
+        list. (domain, parsed WHOIS result or the exception raised by its query) tuples, in the order of the domains.
+    """
+    integration_context = get_integration_context() if CACHE_TTL_HOURS else {}
+    cache = integration_context.get('whois_cache', {})
+    now = time.time()
+    results = {}
+    for domain in domains:
+        cached = cache.get(domain.lower())
+        if cached and now - cached['time'] < CACHE_TTL_HOURS * 3600:
+            results[domain] = deserialize_whois_result(cached['result'])
+
+    missing_domains = []  # type: list
+    for domain in domains:
+        if domain not in results and domain not in missing_domains:
+            missing_domains.append(domain)
+
+    if len(missing_domains) == 1:
+        results[missing_domains[0]] = query_whois(missing_domains[0])
+    elif missing_domains:
+        pool = ThreadPool(min(MAX_WORKERS, len(missing_domains)))
+        try:
+            results.update(zip(missing_domains, pool.map(query_whois, missing_domains)))
+        finally:
+            pool.close()
+            pool.join()
+
+    if CACHE_TTL_HOURS and missing_domains:
+        cached_domains = 0
+        for domain in missing_domains:
+            result = results[domain]
+            if isinstance(result, Exception) or not is_good_query_result(str(result.get('raw', 'NOT FOUND'))):
+                continue
+            result = serialize_whois_result({key: val for key, val in result.items() if key in CACHED_FIELDS})
+            size = len(json.dumps(result))
+            if size <= CACHE_MAX_RESULT_BYTES:
+                cache[domain.lower()] = {'time': now, 'size': size, 'result': result}
+                cached_domains += 1
+        if cached_domains:
+            prune_whois_cache(cache)
+            integration_context['whois_cache'] = cache
+            set_integration_context(integration_context)
+
+    return [(domain, results[domain]) for domain in domains]
+
+
+def return_query_failed(errors):
+    """Reports the failed queries of domains as an error, or as a warning if errors should not be returned"""
+    if not isinstance(errors, list):
+        errors = [errors]
+    failed_domains = [{
+        'Name': error.domain,
+        'Whois': {
+            'QueryStatus': 'Failed'
+        }
+    } for error in errors]
+    context = {outputPaths['domain']: failed_domains if len(failed_domains) > 1 else failed_domains[0]}
+    message = '\n'.join(str(error) for error in errors)
+    if SHOULD_ERROR:
+        return_error(message, outputs=context)
+    else:
+        return_warning(message, exit=True, outputs=context)
+
+
 # Drops the mic disable-secrets-detection-end
 
 def get_domain_from_query(query):
@@ -8363,30 +8609,9 @@ def create_outputs(whois_result, domain, query=None):
 '''COMMANDS'''
 
 
-def domain_command():
-    domains = demisto.args().get('domain', [])
-    for domain in argToList(domains):
-        whois_result = get_whois(domain)
-        md, standard_ec, dbot_score = create_outputs(whois_result, domain)
-        demisto.results({
-            'Type': entryTypes['note'],
-            'ContentsFormat': formats['markdown'],
-            'Contents': str(whois_result),
-            'HumanReadable': tableToMarkdown('Whois results for {}'.format(domain), md),
-            'EntryContext': {
-                'Domain(val.Name && val.Name == obj.Name)': standard_ec,
-                'DBotScore(val.Indicator && val.Indicator == obj.Indicator && val.Vendor && val.Vendor == obj.Vendor)':
-                    dbot_score
-            }
-        })
-
-
-def whois_command():
-    query = demisto.args().get('query')
-    domain = get_domain_from_query(query)
-    whois_result = get_whois(domain)
+def whois_result_entry(whois_result, domain, query=None):
     md, standard_ec, dbot_score = create_outputs(whois_result, domain, query)
-    demisto.results({
+    return {
         'Type': entryTypes['note'],
         'ContentsFormat': formats['markdown'],
         'Contents': str(whois_result),
@@ -8396,11 +8621,40 @@ def whois_command():
             'DBotScore(val.Indicator && val.Indicator == obj.Indicator && val.Vendor && val.Vendor == obj.Vendor)':
                 dbot_score
         }
-    })
+    }
+
+
+def domain_command():
+    domains = argToList(demisto.args().get('domain', []))
+    failed_queries = []
+    for domain, whois_result in get_whois_results(domains):
+        if isinstance(whois_result, WhoisQueryFailed):
+            # carry on with the rest of the domains, the failed domains are reported together once they are done
+            failed_queries.append(whois_result)
+            continue
+        if isinstance(whois_result, Exception):
+            raise whois_result
+        demisto.results(whois_result_entry(whois_result, domain))
+    if failed_queries:
+        return_query_failed(failed_queries)
+
+
+def whois_command():
+    query = demisto.args().get('query')
+    domain = get_domain_from_query(query)
+    [(_, whois_result)] = get_whois_results([domain])
+    if isinstance(whois_result, WhoisQueryFailed):
+        return_query_failed(whois_result)
+    if isinstance(whois_result, Exception):
+        raise whois_result
+    demisto.results(whois_result_entry(whois_result, domain, query))
 
 
 def test_command():
-    whois_result = get_whois('google.co.uk')
+    try:
+        whois_result = get_whois('google.co.uk')
+    except WhoisQueryFailed as e:
+        return_query_failed(e)
 
     try:
         domain_test = whois_result['nameservers'][0]
@@ -1,4 +1,6 @@
 import datetime
+import glob
+import json
 
 import Whois
 import demistomock as demisto
@@ -141,3 +143,163 @@ def test_query_result(whois_result, domain, expected):
     from Whois import create_outputs
     md, standard_ec, dbot_score = create_outputs(whois_result, domain)
     assert standard_ec['Whois']['QueryResult'] == expected
+
+
+def test_get_whois_results_cache(mocker):
+    """
+    Given:
+        - A domain cached less than the cache TTL ago, an expired domain and a new domain, queried with a duplicate.
+    When:
+        - Getting the WHOIS results of the domains.
+    Then:
+        - Only the expired and new domains are queried, once each, and the results are in the order of the domains.
+        - The dates of the cached result are restored, and the new results are cached.
+    """
+    now = time.time()
+    cached_result = Whois.serialize_whois_result({'raw': ['Domain Name: CACHED.COM'],
+                                                  'creation_date': [datetime.datetime(2020, 1, 2, 3, 4, 5)]})
+    integration_context = {'whois_cache': {'cached.com': {'time': now - 60, 'result': cached_result},
+                                           'expired.com': {'time': now - 2 * 3600, 'result': cached_result}}}
+    mocker.patch.object(Whois, 'CACHE_TTL_HOURS', 1)
+    mocker.patch.object(Whois, 'get_integration_context', return_value=integration_context)
+    set_context = mocker.patch.object(Whois, 'set_integration_context')
+    get_whois = mocker.patch.object(Whois, 'get_whois', side_effect=lambda domain: {'raw': ['Domain Name: ' + domain]})
+
+    results = Whois.get_whois_results(['new.com', 'cached.com', 'expired.com', 'new.com'])
+
+    assert sorted(call[0][0] for call in get_whois.call_args_list) == ['expired.com', 'new.com']
+    assert [domain for domain, _ in results] == ['new.com', 'cached.com', 'expired.com', 'new.com']
+    assert results[1][1]['creation_date'] == [datetime.datetime(2020, 1, 2, 3, 4, 5)]
+    assert results[2][1] == {'raw': ['Domain Name: expired.com']}
+    cache = set_context.call_args[0][0]['whois_cache']
+    assert cache['new.com']['time'] == cache['expired.com']['time'] >= now
+
+
+@pytest.mark.parametrize('with_error', [False, True])
+def test_domain_command_partial_failure(mocker, with_error):
+    """
+    Given:
+        - Three domains, the first and last of which can not be queried, with and without returning errors.
+    When:
+        - Running the domain command.
+    Then:
+        - The other domain's result is returned, and the failed domains are reported together in one entry afterwards.
+    """
+    def get_whois(domain):
+        if domain.startswith('bad'):
+            raise Whois.WhoisQueryFailed("Whois returned - Couldn't connect with the socket-server: timed out", domain)
+        return {'raw': ['Domain Name: ' + domain]}
+
+    mocker.patch.object(Whois, 'CACHE_TTL_HOURS', 0)
+    mocker.patch.object(Whois, 'SHOULD_ERROR', with_error)
+    mocker.patch.object(Whois, 'get_whois', side_effect=get_whois)
+    mocker.patch.object(demisto, 'args', return_value={'domain': 'bad1.com,good.com,bad2.com'})
+    mocker.patch.object(demisto, 'results')
+
+    with pytest.raises(SystemExit):
+        Whois.domain_command()
+
+    assert demisto.results.call_count == 2
+    succeeded, failed = [call[0][0] for call in demisto.results.call_args_list]
+    assert 'good.com' in succeeded['HumanReadable']
+    assert failed['Contents'].count("Couldn't connect with the socket-server") == 2
+    assert [domain['Name'] for domain in failed['EntryContext'][Whois.outputPaths['domain']]] == ['bad1.com', 'bad2.com']
+
+
+def test_get_whois_results_cache_size(mocker):
+    """
+    Given:
+        - A cache of the maximal size, and a result with fields the outputs are not created from.
+    When:
+        - Getting the WHOIS result of a new domain.
+    Then:
+        - Only the fields the outputs are created from are cached, and the oldest entry is removed from the cache.
+    """
+    now = time.time()
+    cache = {'old{}.com'.format(i): {'time': now - 60 + i, 'size': 1, 'result': {}} for i in range(3)}
+    mocker.patch.object(Whois, 'CACHE_TTL_HOURS', 1)
+    mocker.patch.object(Whois, 'CACHE_MAX_SIZE', 3)
+    mocker.patch.object(Whois, 'get_integration_context', return_value={'whois_cache': cache})
+    set_context = mocker.patch.object(Whois, 'set_integration_context')
+    mocker.patch.object(Whois, 'get_whois', return_value={'raw': ['Domain Name: new.com'], 'id': ['1'],
+                                                          'unused': ['x' * 1000]})
+
+    Whois.get_whois_results(['new.com'])
+
+    cache = set_context.call_args[0][0]['whois_cache']
+    assert sorted(cache) == ['new.com', 'old1.com', 'old2.com']
+    assert cache['new.com']['result'] == {'raw': ['Domain Name: new.com'], 'id': ['1']}
+
+
+def test_prune_whois_cache():
+    """
+    Given:
+        - A cache whose serialized size is over the maximal size.
+    When:
+        - Pruning the cache.
+    Then:
+        - The oldest entries are removed until the cache is within the maximal size.
+    """
+    size = Whois.CACHE_MAX_BYTES // 3
+    cache = {'domain{}.com'.format(i): {'time': i, 'size': size, 'result': {}} for i in range(5)}
+
+    Whois.prune_whois_cache(cache)
+
+    assert sorted(cache) == ['domain2.com', 'domain3.com', 'domain4.com']
+
+
+def test_whois_server_throttle(mocker):
+    """
+    Given:
+        - A throttle with a minimum interval between the queries of a server.
+    When:
+        - Querying the same server twice and another server once.
+    Then:
+        - Only the second query of the same server waits.
+    """
+    sleep = mocker.patch.object(Whois.time, 'sleep')
+    throttle = Whois.WhoisServerThrottle(max_connections=1, min_interval=10)
+    with throttle.query('whois.verisign-grs.com'):
+        pass
+    with throttle.query('whois.nic.uk'):
+        pass
+    assert sleep.call_count == 0
+    with throttle.query('whois.verisign-grs.com'):
+        pass
+    assert sleep.call_count == 1
+    assert 9 < sleep.call_args[0][0] <= 10
+
+
+@pytest.mark.parametrize('corpus_file', sorted(glob.glob('test_data/whois_corpus/*.json')))
+def test_parse_raw_whois_single_pass(mocker, corpus_file):
+    """
+    Given:
+        - A saved raw WHOIS response of one of the main registries.
+    When:
+        - Parsing the response with the single pass parser, and with the regexes of all fields.
+    Then:
+        - Both parsers return the same result.
+    """
+    with open(corpus_file) as f:
+        raw_data = json.load(f)
+
+    single_pass_result = Whois.parse_raw_whois(raw_data, normalized=True)
+    mocker.patch.object(Whois, 'parse_segment_fields', side_effect=Whois.parse_segment_fields_with_regexes)
+    regexes_result = Whois.parse_raw_whois(raw_data, normalized=True)
+
+    assert single_pass_result == regexes_result
+    assert single_pass_result.get('nameservers')
+
+
+def test_key_value_fields_match_regexes():
+    """
+    Given:
+        - The fields of the known "key: value" lines.
+    When:
+        - Matching a line of every key with the regexes of all fields.
+    Then:
+        - The regexes find the field of the key, and only it.
+    """
+    for key, rule_key in Whois.key_value_fields.items():
+        fields = Whois.parse_segment_fields_with_regexes('{}: 2020-01-01 ns1.example.com'.format(key))
+        assert list(fields) == ([rule_key] if rule_key else []), key
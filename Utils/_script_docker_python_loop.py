@@ -1,8 +1,15 @@
+import __future__
 import os
 import threading
 import sys
 import json
+import time
+import hashlib
+import io
+import struct
+import tempfile
 import traceback
+from collections import OrderedDict
 
 if sys.version_info[0] < 3:
     import Queue as queue
@@ -12,10 +19,106 @@ else:
 __read_thread = None
 __input_queue = None
 
+# compiled code objects of the last executed scripts, keyed by (is integration, sha256 of the script source)
+CODE_CACHE_SIZE = 10
+__code_cache = OrderedDict()
+__code_cache_stats = {'hits': 0, 'misses': 0}
+
+# warm start mode executes CommonServerPython once and gives each execution a fresh copy of its namespace.
+# the modules listed in DEMISTO_PYTHON_WARM_MODULES (comma separated) are imported when the process starts
+WARM_START = os.environ.get('DEMISTO_PYTHON_WARM_START', '').lower() in ('1', 'true', 'yes')
+WARM_NAMESPACES_SIZE = 2
+COMMON_SERVER_END_MARKER = '\n# END OF COMMONSERVERPYTHON\n'
+__warm_namespaces = OrderedDict()
+
 win = sys.platform.startswith('win')
 if win:
     __input_queue = queue.Queue()
 
+# framed protocol mode: every message in both directions is a frame of a kind byte and a 4 bytes big endian length,
+# followed by the UTF-8 payload. A JSON message larger than LARGE_PAYLOAD_BYTES is streamed to a file in
+# LARGE_PAYLOAD_DIR and only its path is sent, in a PAYLOAD_FILE_FRAME. The reader of a payload file deletes it.
+FRAMED_PROTOCOL = os.environ.get('DEMISTO_PYTHON_PROTOCOL', '').lower() == 'framed' and not win
+LARGE_PAYLOAD_BYTES = int(os.environ.get('DEMISTO_PYTHON_LARGE_PAYLOAD_BYTES') or 10 * 1024 * 1024)
+LARGE_PAYLOAD_DIR = os.environ.get('DEMISTO_PYTHON_PAYLOAD_DIR') or tempfile.gettempdir()
+FRAME_HEADER = struct.Struct('>cI')
+INLINE_FRAME = b'J'
+PAYLOAD_FILE_FRAME = b'F'
+JSON_ENCODER = json.JSONEncoder()
+
+# log batch mode: the server accepts 'logBatch' messages of several logs without replying to them.
+# otherwise every info/debug/error log is sent in its own 'log' message and waits for the server reply
+LOG_BATCH = os.environ.get('DEMISTO_PYTHON_LOG_BATCH', '').lower() in ('1', 'true', 'yes')
+
+if sys.version_info[0] < 3:
+    __binary_stdin, __binary_stdout = sys.stdin, sys.stdout
+else:
+    __binary_stdin, __binary_stdout = sys.stdin.buffer, sys.stdout.buffer
+
+
+def read_exactly(size):
+    chunks = []
+    while size > 0:
+        chunk = __binary_stdin.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+# returns the payload of the next frame, or an empty string when the input was closed
+def read_frame():
+    header = read_exactly(FRAME_HEADER.size)
+    if header is None:
+        return ''
+    kind, length = FRAME_HEADER.unpack(header)
+    payload = read_exactly(length) if length else b''
+    if payload is None:
+        return ''
+    if kind == PAYLOAD_FILE_FRAME:
+        path = payload.decode('utf-8')
+        with open(path, 'rb') as payload_file:
+            payload = payload_file.read()
+        os.remove(path)
+    return payload.decode('utf-8')
+
+
+def write_frame(kind, payload):
+    __binary_stdout.write(FRAME_HEADER.pack(kind, len(payload)))
+    __binary_stdout.write(payload)
+    __binary_stdout.flush()
+
+
+# writes a JSON message to the server. In framed mode the message is encoded in chunks, and moved to a payload
+# file once it passes LARGE_PAYLOAD_BYTES, so a large result is never held in memory as a single string
+def write_message(message):
+    if not FRAMED_PROTOCOL:
+        json.dump(message, sys.stdout)
+        sys.stdout.write('\n')
+        sys.stdout.flush()
+        return
+
+    buff = io.BytesIO()
+    payload_file = None
+    size = 0
+    for chunk in JSON_ENCODER.iterencode(message):
+        data = chunk.encode('utf-8')
+        size += len(data)
+        if payload_file is None and size > LARGE_PAYLOAD_BYTES:
+            payload_file = tempfile.NamedTemporaryFile(prefix='demisto_payload_', dir=LARGE_PAYLOAD_DIR, delete=False)
+            payload_file.write(buff.getvalue())
+            buff = payload_file
+        buff.write(data)
+
+    # anything written to the text layer of stdout goes before the frame
+    sys.stdout.flush()
+    if payload_file is not None:
+        payload_file.close()
+        write_frame(PAYLOAD_FILE_FRAME, payload_file.name.encode('utf-8'))
+    else:
+        write_frame(INLINE_FRAME, buff.getvalue())
+
 
 def read_input_loop():
     global __input_queue
@@ -27,6 +130,8 @@ def read_input_loop():
 
 
 def __readWhileAvailable():
+    if FRAMED_PROTOCOL:
+        return read_frame()
     if win:
         # An ugly solution - just open a blocking thread to handle input
         global __input_queue
@@ -53,21 +158,37 @@ from __future__ import print_function
 import json
 import uuid
 import sys
+import time
+import threading
 
 class Demisto:
     """Wrapper class to interface with the Demisto server via stdin, stdout"""
 
+    # when the server supports it, info/debug/error logs are buffered and sent in batches without waiting for
+    # the server reply. The buffer is flushed by a background thread every LOG_FLUSH_INTERVAL seconds
+    LOG_BATCH_SIZE = 100
+    LOG_FLUSH_INTERVAL = 1
+    # number of batches that can be sent without a reply before waiting for the server to catch up
+    LOG_MAX_PENDING_BATCHES = 10
+
     def __init__(self, context):
         self.callingContext = context
+        self._log_buffer = []
+        self._log_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._log_flushed_at = time.time()
+        self._log_pending_batches = 0
+        self._log_flusher = None
+        self._log_closed = threading.Event()
+        self._results_batch = None
         args = self.args()
         if 'demisto_machine_learning_magic_key' in  args:
             import os
             os.environ['DEMISTO_MACHINE_LEARNING_MAGIC_KEY'] = args['demisto_machine_learning_magic_key']
 
     def log(self, msg):
-        json.dump({'type': 'entryLog', 'args': {'message': msg}}, sys.stdout)
-        sys.stdout.write('\\n')
-        sys.stdout.flush()
+        self.flush_logs()
+        self.__write({'type': 'entryLog', 'args': {'message': msg}})
 
     def investigation(self):
         return self.callingContext[u'context'][u'Inv']
@@ -119,22 +240,16 @@ class Demisto:
         return self.__do({'type': 'demistoUrls'})
 
     def info(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'info', 'args': argsObj})
+        self.__log('info', args)
 
     def error(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'error', 'args': argsObj})
+        self.__log('error', args)
 
     def exception(self, ex):
         return self.__do({'type': 'exception', 'command': 'exception', 'args': ex})
 
     def debug(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'debug', 'args': argsObj})
+        self.__log('debug', args)
 
     def getAllSupportedCommands(self):
         return self.__do({'type': 'getAllModulesSupportedCmds'})
@@ -148,17 +263,93 @@ class Demisto:
     def dt(self, data, q):
         return self.__do({'type': 'dt', 'name': q, 'value': data})['result']
 
+    def __log(self, level, args):
+        if not globals().get('__logBatch'):
+            self.__do({'type': 'log', 'command': level, 'args': {'args': list(args)}})
+            return
+        with self._log_lock:
+            self._log_buffer.append({'command': level, 'args': {'args': list(args)}})
+            flush = len(self._log_buffer) >= self.LOG_BATCH_SIZE \\
+                or time.time() - self._log_flushed_at >= self.LOG_FLUSH_INTERVAL
+            if not flush and self._log_flusher is None and not self._log_closed.is_set():
+                self._log_flusher = threading.Thread(target=self.__flush_logs_periodically)
+                self._log_flusher.daemon = True
+                self._log_flusher.start()
+        if flush or level == 'error':
+            self.flush_logs()
+
+    def __flush_logs_periodically(self):
+        while not self._log_closed.wait(self.LOG_FLUSH_INTERVAL):
+            with self._log_lock:
+                if not self._log_buffer:
+                    # started again by the next buffered log
+                    self._log_flusher = None
+                    return
+            # the background thread never waits for the server, the reply belongs to the script thread
+            self.flush_logs(block=False)
+        self._log_flusher = None
+
+    def flush_logs(self, wait=False, block=True):
+        """ Send the buffered logs to the server in a single message """
+        with self._log_lock:
+            if not self._log_buffer:
+                return
+            if not block and self._log_pending_batches >= self.LOG_MAX_PENDING_BATCHES:
+                return
+            logs, self._log_buffer = self._log_buffer, []
+            self._log_flushed_at = time.time()
+            self._log_pending_batches += 1
+            if not wait and self._log_pending_batches <= self.LOG_MAX_PENDING_BATCHES:
+                self.__write({'type': 'logBatch', 'args': {'logs': logs}})
+                return
+        # the server did not reply since too many batches, wait for it to process this one
+        self.__do({'type': 'logBatch', 'args': {'logs': logs, 'ack': True}})
+
+    def close_logs(self):
+        """ Stop the background flushing and send the buffered logs and results, when the script is done """
+        self._log_closed.set()
+        flusher = self._log_flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush_logs()
+        self.flushResults()
+
+    def startResultsBatch(self):
+        """ Buffer the results until flushResults, to send them in a single message """
+        with self._write_lock:
+            if self._results_batch is None:
+                self._results_batch = []
+
+    def flushResults(self):
+        """ Send the buffered results in a single message and stop buffering them """
+        with self._write_lock:
+            self.__write_results_batch()
+            self._results_batch = None
+
+    def __write_results_batch(self):
+        # called with the write lock held
+        if self._results_batch:
+            results, self._results_batch = self._results_batch, []
+            globals()['__writeMessage']({'type': 'result', 'results': results})
+
+    def __write(self, cmd):
+        with self._write_lock:
+            # the buffered results are sent before any other message, so they keep their order
+            self.__write_results_batch()
+            globals()['__writeMessage'](cmd)
+
     def __do(self, cmd):
         # Watch out there is another defintion like this
-        # prepare command to send to server
-        json.dump(cmd, sys.stdout)
-        sys.stdout.write('\\n')
+        # send the pending logs first so they keep their order with the command
+        self.flush_logs()
 
         # send command to Demisto server
-        sys.stdout.flush()
+        self.__write(cmd)
 
         # wait to receive response from Demisto server
         data = globals()['__readWhileAvailable']()
+        # the server handles messages in order, so all the log batches sent so far were processed
+        self._log_pending_batches = 0
         if data.find('$$##') > -1:
             raise ValueError(data[4:])
         return json.loads(data)
@@ -182,6 +373,7 @@ class Demisto:
 
 
     def results(self, results):
+        self.flush_logs()
         res = []
         converted = self.convert(results)
         if type(converted) is list:
@@ -189,9 +381,11 @@ class Demisto:
         else:
             res.append(converted)
 
-        json.dump({'type': 'result', 'results': res}, sys.stdout)
-        sys.stdout.write('\\n')
-        sys.stdout.flush()
+        with self._write_lock:
+            if self._results_batch is not None:
+                self._results_batch.extend(res)
+                return
+        self.__write({'type': 'result', 'results': res})
 
 demisto = Demisto(context)
 
@@ -222,21 +416,37 @@ from __future__ import print_function
 import json
 import uuid
 import sys
+import time
+import threading
 
 class Demisto:
     """Wrapper class to interface with the Demisto server via stdin, stdout"""
 
+    # when the server supports it, info/debug/error logs are buffered and sent in batches without waiting for
+    # the server reply. The buffer is flushed by a background thread every LOG_FLUSH_INTERVAL seconds
+    LOG_BATCH_SIZE = 100
+    LOG_FLUSH_INTERVAL = 1
+    # number of batches that can be sent without a reply before waiting for the server to catch up
+    LOG_MAX_PENDING_BATCHES = 10
+
     def __init__(self, context):
         self.callingContext = context
+        self._log_buffer = []
+        self._log_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._log_flushed_at = time.time()
+        self._log_pending_batches = 0
+        self._log_flusher = None
+        self._log_closed = threading.Event()
+        self._results_batch = None
         args = self.args()
         if 'demisto_machine_learning_magic_key' in  args:
             import os
             os.environ['DEMISTO_MACHINE_LEARNING_MAGIC_KEY'] = args['demisto_machine_learning_magic_key']
 
     def log(self, msg):
-        json.dump({'type': 'entryLog', 'args': {'message': 'Integration log: ' + msg}}, sys.stdout)
-        sys.stdout.write('\\n')
-        sys.stdout.flush()
+        self.flush_logs()
+        self.__write({'type': 'entryLog', 'args': {'message': 'Integration log: ' + msg}})
 
     def investigation(self):
         return self.callingContext[u'context'][u'Inv']
@@ -297,19 +507,13 @@ class Demisto:
         return self.__do({'type': 'demistoUrls'})
 
     def info(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'info', 'args': argsObj})
+        self.__log('info', args)
 
     def error(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'error', 'args': argsObj})
+        self.__log('error', args)
 
     def debug(self, *args):
-        argsObj = {}
-        argsObj["args"] = list(args)
-        self.__do({'type': 'log', 'command': 'debug', 'args': argsObj})
+        self.__log('debug', args)
 
     def gets(self, obj, field):
         return str(self.get(obj, field))
@@ -323,12 +527,89 @@ class Demisto:
     def dt(self, data, q):
         return self.__do({'type': 'dt', 'name': q, 'value': data})['result']
 
+    def __log(self, level, args):
+        if not globals().get('__logBatch'):
+            self.__do({'type': 'log', 'command': level, 'args': {'args': list(args)}})
+            return
+        with self._log_lock:
+            self._log_buffer.append({'command': level, 'args': {'args': list(args)}})
+            flush = len(self._log_buffer) >= self.LOG_BATCH_SIZE \\
+                or time.time() - self._log_flushed_at >= self.LOG_FLUSH_INTERVAL
+            if not flush and self._log_flusher is None and not self._log_closed.is_set():
+                self._log_flusher = threading.Thread(target=self.__flush_logs_periodically)
+                self._log_flusher.daemon = True
+                self._log_flusher.start()
+        if flush or level == 'error':
+            self.flush_logs()
+
+    def __flush_logs_periodically(self):
+        while not self._log_closed.wait(self.LOG_FLUSH_INTERVAL):
+            with self._log_lock:
+                if not self._log_buffer:
+                    # started again by the next buffered log
+                    self._log_flusher = None
+                    return
+            # the background thread never waits for the server, the reply belongs to the script thread
+            self.flush_logs(block=False)
+        self._log_flusher = None
+
+    def flush_logs(self, wait=False, block=True):
+        """ Send the buffered logs to the server in a single message """
+        with self._log_lock:
+            if not self._log_buffer:
+                return
+            if not block and self._log_pending_batches >= self.LOG_MAX_PENDING_BATCHES:
+                return
+            logs, self._log_buffer = self._log_buffer, []
+            self._log_flushed_at = time.time()
+            self._log_pending_batches += 1
+            if not wait and self._log_pending_batches <= self.LOG_MAX_PENDING_BATCHES:
+                self.__write({'type': 'logBatch', 'args': {'logs': logs}})
+                return
+        # the server did not reply since too many batches, wait for it to process this one
+        self.__do({'type': 'logBatch', 'args': {'logs': logs, 'ack': True}})
+
+    def close_logs(self):
+        """ Stop the background flushing and send the buffered logs and results, when the script is done """
+        self._log_closed.set()
+        flusher = self._log_flusher
+        if flusher is not None:
+            flusher.join()
+        self.flush_logs()
+        self.flushResults()
+
+    def startResultsBatch(self):
+        """ Buffer the results until flushResults, to send them in a single message """
+        with self._write_lock:
+            if self._results_batch is None:
+                self._results_batch = []
+
+    def flushResults(self):
+        """ Send the buffered results in a single message and stop buffering them """
+        with self._write_lock:
+            self.__write_results_batch()
+            self._results_batch = None
+
+    def __write_results_batch(self):
+        # called with the write lock held
+        if self._results_batch:
+            results, self._results_batch = self._results_batch, []
+            globals()['__writeMessage']({'type': 'result', 'results': results})
+
+    def __write(self, cmd):
+        with self._write_lock:
+            # the buffered results are sent before any other message, so they keep their order
+            self.__write_results_batch()
+            globals()['__writeMessage'](cmd)
+
     def __do(self, cmd):
         # Watch out there is another defintion like this
-        json.dump(cmd, sys.stdout)
-        sys.stdout.write('\\n')
-        sys.stdout.flush()
+        # send the pending logs first so they keep their order with the command
+        self.flush_logs()
+        self.__write(cmd)
         data = globals()['__readWhileAvailable']()
+        # the server handles messages in order, so all the log batches sent so far were processed
+        self._log_pending_batches = 0
         if data.find('$$##') > -1:
             raise ValueError(data[4:])
         return json.loads(data)
@@ -350,15 +631,18 @@ class Demisto:
         return {'Type': 1, 'Contents': str(results), 'ContentsFormat': 'text'}
 
     def results(self, results):
+        self.flush_logs()
         res = []
         converted = self.__convert(results)
         if type(converted) is list:
             res = converted
         else:
             res.append(converted)
-        json.dump({'type': 'result', 'results': res}, sys.stdout)
-        sys.stdout.write('\\n')
-        sys.stdout.flush()
+        with self._write_lock:
+            if self._results_batch is not None:
+                self._results_batch.extend(res)
+                return
+        self.__write({'type': 'result', 'results': res})
 
     def incidents(self, incidents):
         self.results({'Type': 1, 'Contents': json.dumps(incidents), 'ContentsFormat': 'json'})
@@ -394,8 +678,14 @@ print = demisto_print
 
 # notifies demisto server that the current executed script is completed
 # and the process is ready to execute the next script
-def send_script_completed():
-    json.dump({'type': 'completed'}, sys.stdout)
+def send_script_completed(compile_stats=None, startup_stats=None):
+    completed = {'type': 'completed'}
+    if compile_stats:
+        completed['args'] = {'compileStats': compile_stats, 'startupStats': startup_stats}
+    if FRAMED_PROTOCOL:
+        write_message(completed)
+        return
+    json.dump(completed, sys.stdout)
     sys.stdout.write('\\n')
     sys.stdout.flush()
 
@@ -405,12 +695,18 @@ def send_script_exception(exc_type, exc_value, exc_traceback):
     if ex_string == 'None\n':
         ex_string = str(ex)
 
+    if FRAMED_PROTOCOL:
+        write_message({'type': 'exception', 'args': {'exception': ex_string}})
+        return
     json.dump({'type': 'exception', 'args': {'exception': ex_string}}, sys.stdout)
     sys.stdout.write('\\n')
     sys.stdout.flush()
 
 
 def send_pong():
+    if FRAMED_PROTOCOL:
+        write_message({'type': 'pong'})
+        return
     json.dump({'type': 'pong'}, sys.stdout)
     sys.stdout.write('\\n')
     sys.stdout.flush()
@@ -421,12 +717,150 @@ def send_pong():
 def do_ping_pong():
     while True:
         ping = __readWhileAvailable()
-        if ping == 'ping\n':
+        if ping == 'ping\n' or (FRAMED_PROTOCOL and ping == 'ping'):
             send_pong()  # return pong to server to indicate that everything is fine
         else:
             return ping
 
 
+# returns the code object of a source part, compiling it only if it is not cached
+# and adds the lookup to the stats reported back to the server
+def get_compiled_code(key, code_string, build_source, compile_stats):
+    start = time.time()
+    code = __code_cache.get(key)
+    cache_hit = code is not None
+    if cache_hit:
+        __code_cache_stats['hits'] += 1
+        # move to the end to mark as recently used
+        del __code_cache[key]
+    else:
+        __code_cache_stats['misses'] += 1
+        # the script code may be compiled apart from the template, keep the template's print function for it
+        code = compile(build_source(code_string), '<string>', 'exec', __future__.print_function.compiler_flag, True)
+        while len(__code_cache) >= CODE_CACHE_SIZE:
+            __code_cache.popitem(last=False)
+    __code_cache[key] = code
+
+    compile_stats['cacheHit'] = compile_stats.get('cacheHit', True) and cache_hit
+    compile_stats['hits'] = __code_cache_stats['hits']
+    compile_stats['misses'] = __code_cache_stats['misses']
+    compile_stats['compileTimeMs'] = round(compile_stats.get('compileTimeMs', 0) + (time.time() - start) * 1000, 3)
+    return code
+
+
+def source_digest(code_string):
+    return hashlib.sha256(code_string.encode('utf-8')).hexdigest()
+
+
+def wrap_in_template(code_string, is_integ_script):
+    template = integ_template_code if is_integ_script else template_code
+    return template.replace('###CODE_HERE###', code_string)
+
+
+# splits the script source to the CommonServerPython part, up to its end marker line, and the script code
+def split_common_server_code(code_string):
+    index = code_string.find(COMMON_SERVER_END_MARKER)
+    if index == -1:
+        return None, code_string
+    index += len(COMMON_SERVER_END_MARKER)
+    return code_string[:index], code_string[index:]
+
+
+# returns the globals and the code object to execute the script with.
+# in warm start mode, when the source contains CommonServerPython, it is executed apart from the script code
+# so its namespace can be reused by the next executions. Otherwise the whole source is executed at once
+def prepare_execution(context_json, code_string, compile_stats, startup_stats):
+    is_integ_script = context_json['integration']
+    kind = 'integration' if is_integ_script else 'script'
+    sub_globals = {
+        '__readWhileAvailable': __readWhileAvailable,
+        '__writeMessage': write_message,
+        '__logBatch': LOG_BATCH,
+        'context': context_json,
+        'win': win
+    }
+
+    common_code, script_code = split_common_server_code(code_string) if WARM_START else (None, code_string)
+    if common_code is None:
+        code = get_compiled_code(
+            (kind, source_digest(code_string)), code_string,
+            lambda c: wrap_in_template(c, is_integ_script), compile_stats
+        )
+        return sub_globals, code
+
+    common_digest = source_digest(common_code)
+    common = get_compiled_code(
+        (kind + '-common', common_digest), common_code,
+        lambda c: wrap_in_template(c, is_integ_script), compile_stats
+    )
+    # pad the script code so its line numbers are the same as when running the whole source at once
+    line_offset = wrap_in_template(common_code, is_integ_script).count('\n') - 1
+    script = get_compiled_code(
+        (kind + '-code', line_offset, source_digest(script_code)), script_code,
+        lambda c: '\n' * line_offset + c, compile_stats
+    )
+
+    namespace_key = (kind, common_digest)
+    warm_namespace = __warm_namespaces.get(namespace_key)
+    if warm_namespace is None:
+        exec(common, sub_globals, sub_globals)  # guardrails-disable-line
+        while len(__warm_namespaces) >= WARM_NAMESPACES_SIZE:
+            __warm_namespaces.popitem(last=False)
+        __warm_namespaces[namespace_key] = (sub_globals, dict(sub_globals))
+        return sub_globals, script
+
+    # the functions of CommonServerPython are bound to the namespace dict, so it is restored in place
+    namespace, snapshot = warm_namespace
+    namespace.clear()
+    namespace.update(snapshot)
+    namespace.update(sub_globals)
+    namespace['demisto'] = namespace['Demisto'](context_json)
+    reinitialize_module_state = namespace.get('reinitialize_module_state')
+    if callable(reinitialize_module_state):
+        reinitialize_module_state()
+    startup_stats['warmStart'] = True
+    return namespace, script
+
+
+# stops the module state of CommonServerPython that the execution started, such as its requests debug logger,
+# so it does not outlive the execution in a namespace that is reused in warm start mode
+def reset_script_state(sub_globals):
+    reset_module_state = sub_globals.get('reset_module_state')
+    if callable(reset_module_state):
+        try:
+            reset_module_state()
+        except Exception:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            send_script_exception(exc_type, exc_value, exc_traceback)
+
+
+# stops the background flushing of the script logs, and sends the logs it buffered and did not flush before it finished
+def flush_script_logs(sub_globals):
+    demisto_instance = sub_globals.get('demisto')
+    if hasattr(demisto_instance, 'close_logs'):
+        try:
+            demisto_instance.close_logs()
+        except Exception:
+            exc_type, exc_value, exc_traceback = sys.exc_info()
+            send_script_exception(exc_type, exc_value, exc_traceback)
+
+
+def import_warm_modules():
+    for module_name in os.environ.get('DEMISTO_PYTHON_WARM_MODULES', '').split(','):
+        module_name = module_name.strip()
+        if not module_name:
+            continue
+        try:
+            __import__(module_name)
+        except Exception:
+            # a missing module will fail the script that needs it, not the loop
+            if sys.version_info[0] < 3:
+                sys.exc_clear()
+
+
+if WARM_START:
+    import_warm_modules()
+
 backup_env_vars = {}
 for key in os.environ.keys():
     backup_env_vars[key] = os.environ[key]
@@ -444,40 +878,40 @@ while True:
         # finish executing python
         break
 
+    execution_start = time.time()
     contextJSON = json.loads(contextString)
 
     code_string = contextJSON['script']
     contextJSON.pop('script', None)
 
-    is_integ_script = contextJSON['integration']
-    complete_code = ''
-    if is_integ_script:
-        complete_code = integ_template_code.replace('###CODE_HERE###', code_string)
-    else:
-        complete_code = template_code.replace('###CODE_HERE###', code_string)
+    compile_stats = {}
+    startup_stats = {'warmStart': False}
 
-    try:
-        code = compile(complete_code, '<string>', 'exec')
+    sub_globals = {}
 
-        sub_globals = {
-            '__readWhileAvailable': __readWhileAvailable,
-            'context': contextJSON,
-            'win': win
-        }
+    try:
+        sub_globals, code = prepare_execution(contextJSON, code_string, compile_stats, startup_stats)
+        # time from receiving the execution until the script code starts running
+        startup_stats['startupTimeMs'] = round((time.time() - execution_start) * 1000, 3)
 
         exec(code, sub_globals, sub_globals)  # guardrails-disable-line
 
     except Exception as ex:
         exc_type, exc_value, exc_traceback = sys.exc_info()
+        flush_script_logs(sub_globals)
         send_script_exception(exc_type, exc_value, exc_traceback)
     except SystemExit:
         # print 'Will not stop on sys.exit(0)'
         pass
 
+    if WARM_START:
+        reset_script_state(sub_globals)
+    flush_script_logs(sub_globals)
+
     rollback_system()
 
     # ping back to Demisto server that script is completed
-    send_script_completed()
+    send_script_completed(compile_stats, startup_stats)
 
     # if the script running on native python then terminate the process after finished the script
     is_python_native = contextJSON['native']